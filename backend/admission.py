@@ -0,0 +1,339 @@
+import os
+import re
+import math
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Tuple
+from backend.metrics import inc_counter, observe, set_gauge, STAGE_LATENCY
+from backend.web_search import normalize_query
+from backend.tasks import enqueue_durable, register_durable_handler
+from backend.memory import register_memory_component, estimate_size, evict_lru
+
+logger = logging.getLogger(__name__)
+
+# Admission control for the LLM-bound endpoints. Waiting happens on the event loop,
+# so queued requests don't hold threadpool threads while the LLM is slow.
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+# Longest a request may wait for admission; also the bound on estimated queue wait
+ADMISSION_SLO_SECONDS = float(os.getenv("ADMISSION_SLO_SECONDS", "10"))
+# Per-session token bucket: the sustained rate, and how many messages may be sent back to
+# back before it applies (a quick exchange with the receptionist easily sends 5-10)
+SESSION_RATE_PER_MINUTE = float(os.getenv("SESSION_RATE_PER_MINUTE", "20"))
+SESSION_RATE_BURST = int(os.getenv("SESSION_RATE_BURST", "20"))
+# Urgent messages draw on a separate, more generous bucket, so a patient reporting an
+# emergency isn't turned away but a client can't bypass the limit by naming symptoms
+URGENT_RATE_PER_MINUTE = float(os.getenv("URGENT_RATE_PER_MINUTE", "60"))
+URGENT_RATE_BURST = int(os.getenv("URGENT_RATE_BURST", "20"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+
+PRIORITY_URGENT = 0
+PRIORITY_NORMAL = 1
+
+# Emergency symptoms from the receptionist prompt; matched locally, without the LLM
+URGENT_KEYWORDS = [
+    "chest pain", "shortness of breath", "can't breathe", "cannot breathe", "difficulty breathing",
+    "confusion", "confused", "unconscious", "fainted", "fainting", "seizure", "no urine",
+    "not urinating", "coughing blood", "vomiting blood", "severe bleeding", "stroke",
+]
+# Confusion counts unless it is about something ("confused about my dose")
+_URGENT_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(k) for k in URGENT_KEYWORDS if not k.startswith("confus")) + r")\b"
+    r"|\bconfus(?:ed|ion)\b(?!\s+(?:about|by|with|over|regarding|as to|whether|why|how|what|which|if)\b)",
+    re.IGNORECASE)
+# A symptom is not reported when negated earlier in its clause ("no chest pain", "denies shortness of breath")
+_NEGATION_RE = re.compile(
+    r"\b(?:no|not|never|none|nor|without|deny|denies|denied|denying|negative for|free of|absence of|"
+    r"don't|dont|doesn't|doesnt|didn't|didnt|haven't|havent|hasn't|hasnt|no longer)\b", re.IGNORECASE)
+# ... or said to be over ("the chest pain has gone")
+_RESOLVED_RE = re.compile(r"^\s*(?:is|has|have|had)?\s*(?:gone|resolved|stopped|went away|settled)\b", re.IGNORECASE)
+# Words the negation window looks back over, within the clause
+URGENT_NEGATION_WINDOW = 5
+_CLAUSE_BREAK_RE = re.compile(r"[,;:]|\b(?:but|however|although|though|except|yet)\b", re.IGNORECASE)
+_SENTENCE_RE = re.compile(r"[^.!?\n]+[.!?]*")
+_QUESTION_START_RE = re.compile(
+    r"^\s*(?:what|what's|whats|how|why|when|which|who|is|are|does|do|can|could|should|would|will|may)\b(?!')",
+    re.IGNORECASE)
+# A question still reports a symptom when it says someone has it ("I have chest pain, is that bad?")
+_REPORTED_RE = re.compile(
+    r"\b(?:i|i'm|im|i've|ive|we|we're|he|he's|she|she's|my \w+|(?:my|her|his) (?:husband|wife|mother|father|son|daughter))\s+"
+    r"(?:(?:am|is|are|was|were|has|have|had|been|just|now|still|suddenly|keep|kept|started|'m|'ve)\s+)*"
+    r"(?:having|have|has|had|feel|feeling|felt|experiencing|getting|got|developed|fainted|passed out|can't|cannot|confused)\b",
+    re.IGNORECASE)
+
+URGENT_TRIAGE_RESPONSE = (
+    "Your symptoms may need urgent medical attention. Please call emergency services "
+    "or go to the nearest emergency room now."
+)
+
+def _is_negated(sentence: str, start: int, end: int) -> bool:
+    clauses = _CLAUSE_BREAK_RE.split(sentence[:start])
+    before = clauses[-1].split()[-URGENT_NEGATION_WINDOW:]
+    if before and _NEGATION_RE.search(" ".join(before)):
+        return True
+    after = _CLAUSE_BREAK_RE.split(sentence[end:])[0]
+    return _RESOLVED_RE.match(after) is not None
+
+def is_urgent(text: Optional[str]) -> bool:
+    """
+    True when the text reports an emergency symptom. Negated mentions ("I have no chest
+    pain") and general questions ("what is a stroke risk?") don't count.
+    """
+    if not text:
+        return False
+    for sentence in _SENTENCE_RE.findall(text):
+        matches = list(_URGENT_RE.finditer(sentence))
+        if not matches:
+            continue
+        question = sentence.rstrip().endswith("?") or _QUESTION_START_RE.match(sentence) is not None
+        if question and not _REPORTED_RE.search(sentence):
+            continue
+        if any(not _is_negated(sentence, m.start(), m.end()) for m in matches):
+            return True
+    return False
+
+def report_urgent_event(session_id: str, message: str, degraded: bool = False):
+    """
+    Records an urgent triage event. It is committed to the durable task queue, and the
+    URGENT EVENT log entry is written from there, so it survives a crash after the response.
+    """
+    inc_counter("assistant_urgent_events_total")
+    enqueue_durable("urgent_event", {"session_id": session_id, "message": message,
+                                     "degraded": degraded, "reported_at": time.time()})
+
+def log_urgent_event(event: Dict[str, Any]):
+    mode = " (degraded)" if event.get("degraded") else ""
+    logger.warning(f"URGENT EVENT{mode}: Session {event['session_id']} - {event['message']}",
+                   extra={"session_id": event['session_id']})
+
+register_durable_handler("urgent_event", log_urgent_event)
+
+class Overloaded(Exception):
+    """
+    Raised when a request is not admitted; retry_after is a hint in seconds.
+    """
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Overloaded ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Bounded priority admission for one endpoint. At most max_concurrency requests run;
+    the rest wait in a priority queue (urgent first, then arrival order). A request is
+    rejected up front if the queue is full or its estimated wait exceeds the SLO, and
+    dropped if it waits longer than the SLO. When the queue is full, an urgent request
+    takes the place of the newest non-urgent waiter.
+    Must be used from the event loop thread.
+    """
+
+    def __init__(self, name: str, max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+                 max_queue: int = ADMISSION_MAX_QUEUE, slo_seconds: float = ADMISSION_SLO_SECONDS):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.slo_seconds = slo_seconds
+        self._in_flight = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        # Moving average of time a request holds its slot, for wait estimates
+        self._service_time = 1.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _estimated_wait(self, ahead: int) -> float:
+        return (ahead + 1) / self.max_concurrency * self._service_time
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self._estimated_wait(len(self._waiters))))
+
+    def _reject(self, reason: str) -> Overloaded:
+        inc_counter("assistant_requests_shed_total", endpoint=self.name, reason=reason)
+        return Overloaded(reason, self._retry_after())
+
+    def _update_gauges(self):
+        set_gauge("assistant_admission_in_flight", self._in_flight, endpoint=self.name)
+        set_gauge("assistant_admission_queue_depth", len(self._waiters), endpoint=self.name)
+
+    def _remove_waiter(self, future: asyncio.Future):
+        self._waiters = [w for w in self._waiters if w[2] is not future]
+        heapq.heapify(self._waiters)
+        self._update_gauges()
+
+    def _shed_newest_normal(self) -> bool:
+        candidates = [w for w in self._waiters if w[0] > PRIORITY_URGENT]
+        if not candidates:
+            return False
+        victim = max(candidates)
+        self._remove_waiter(victim[2])
+        victim[2].set_exception(self._reject("shed_for_urgent"))
+        return True
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL):
+        if self._in_flight < self.max_concurrency and not self._waiters:
+            self._in_flight += 1
+            self._update_gauges()
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            if priority > PRIORITY_URGENT or not self._shed_newest_normal():
+                raise self._reject("queue_full")
+        else:
+            ahead = sum(1 for w in self._waiters if w[0] <= priority)
+            if self._estimated_wait(ahead) > self.slo_seconds:
+                raise self._reject("slo")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._update_gauges()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, timeout=self.slo_seconds)
+        except asyncio.TimeoutError:
+            # A slot handed over just as the timeout fired is kept
+            if not future.done() or future.cancelled():
+                self._remove_waiter(future)
+                raise self._reject("queue_timeout")
+        except asyncio.CancelledError:
+            # Client went away: give back a slot that was already handed over
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release(0.0)
+            else:
+                self._remove_waiter(future)
+            raise
+        finally:
+            observe(STAGE_LATENCY, time.perf_counter() - start, stage="admission_wait", endpoint=self.name)
+
+    def release(self, service_time: float):
+        if service_time > 0:
+            self._service_time = 0.8 * self._service_time + 0.2 * service_time
+        # Hand the slot directly to the next waiter so it can't be taken by a newcomer
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                self._update_gauges()
+                return
+        self._in_flight -= 1
+        self._update_gauges()
+
+    @asynccontextmanager
+    async def admit(self, priority: int = PRIORITY_NORMAL):
+        await self.acquire(priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+class SessionRateLimiter:
+    """
+    Token bucket per session: `rate_per_minute` sustained with bursts up to `burst`.
+    Buckets for idle sessions are dropped beyond max_sessions.
+    """
+
+    def __init__(self, rate_per_minute: float = SESSION_RATE_PER_MINUTE, burst: int = SESSION_RATE_BURST,
+                 max_sessions: int = 10000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_sessions = max_sessions
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, session_id: str) -> float:
+        """
+        Takes a token for the session. Returns 0 if allowed, else seconds until one is available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(session_id, (float(self.burst), now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate if self.rate > 0 else float("inf")
+            self._buckets[session_id] = (tokens, now)
+            self._buckets.move_to_end(session_id)
+            while len(self._buckets) > self.max_sessions:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def size_bytes(self) -> int:
+        return estimate_size(self._buckets, self._lock)
+
+class AnswerCache:
+    """
+    Recent clinical answers keyed by (KB, diagnosis, normalized question), served in
+    degraded mode when the LLM is saturated.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(question: str, diagnosis: Optional[str], kb: Optional[str] = None) -> Tuple:
+        return (kb or "", (diagnosis or "").lower(), normalize_query(question))
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            answer = self._entries.get(key)
+            if answer is not None:
+                self._entries.move_to_end(key)
+        inc_counter("assistant_cache_hits_total" if answer else "assistant_cache_misses_total", cache="answer")
+        return answer
+
+    def put(self, key: Tuple, answer: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = answer
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def size_bytes(self) -> int:
+        return estimate_size(self._entries, self._lock)
+
+    def evict(self, n_bytes: int) -> int:
+        return evict_lru(self._entries, self._lock, n_bytes)
+
+_controllers: Dict[str, AdmissionController] = {}
+_rate_limiter = None
+_urgent_rate_limiter = None
+_answer_cache = None
+
+def get_admission_controller(endpoint: str) -> AdmissionController:
+    controller = _controllers.get(endpoint)
+    if controller is None:
+        controller = _controllers[endpoint] = AdmissionController(endpoint)
+    return controller
+
+def get_rate_limiter(urgent: bool = False) -> SessionRateLimiter:
+    global _rate_limiter, _urgent_rate_limiter
+    if urgent:
+        if _urgent_rate_limiter is None:
+            _urgent_rate_limiter = SessionRateLimiter(URGENT_RATE_PER_MINUTE, URGENT_RATE_BURST)
+            register_memory_component("urgent_rate_limiter", _urgent_rate_limiter.size_bytes)
+        return _urgent_rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = SessionRateLimiter()
+        # Bounded by session count rather than evicted for memory
+        register_memory_component("rate_limiter", _rate_limiter.size_bytes)
+    return _rate_limiter
+
+def get_answer_cache() -> AnswerCache:
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = AnswerCache()
+        # Only a degraded-mode fallback, so it goes before speculation and sessions
+        register_memory_component("answer_cache", _answer_cache.size_bytes, _answer_cache.evict, priority=30)
+    return _answer_cache
@@ -0,0 +1,170 @@
+import os
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Set
+from backend.patient_db import get_patient_by_id
+from backend.patient_context import get_context_bundle
+from backend.rag import retrieve_many, kb_for_diagnosis, list_kbs
+from backend.langgraph_agents import build_clinical_query, answer_clinical_question
+from backend.topics import diagnosis_topics
+from backend.codec import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Server-side checkpoints for batch jobs submitted with a job_id
+BATCH_JOBS_DIR = os.getenv("BATCH_JOBS_DIR", "./batch_jobs")
+# Questions embedded and searched together; bounds memory for very large inputs
+BATCH_WINDOW_SIZE = int(os.getenv("BATCH_WINDOW_SIZE", "64"))
+
+def item_id(item: Dict[str, Any]) -> str:
+    """
+    Stable id for a (patient_id, question) pair, used to skip completed items on resume.
+    """
+    if item.get("id"):
+        return str(item["id"])
+    key = f"{item.get('patient_id', '')}\n{item.get('question', '')}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+def parse_jsonl(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = loads(line)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON on line {line_no}: {e}")
+        if not item.get("patient_id") or not item.get("question"):
+            raise ValueError(f"Line {line_no} must have 'patient_id' and 'question'")
+        yield item
+
+def load_completed(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Reads a results JSONL (checkpoint) and returns successful results by id.
+    A truncated trailing line from an interrupted run is ignored.
+    """
+    completed = {}
+    if not os.path.exists(path):
+        return completed
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                result = loads(line)
+            except ValueError:
+                continue
+            if not result.get("error"):
+                completed[result["id"]] = result
+    return completed
+
+def job_checkpoint_path(job_id: str) -> str:
+    safe_id = "".join(c for c in job_id if c.isalnum() or c in "-_")
+    if not safe_id:
+        raise ValueError("job_id must contain letters, digits, '-' or '_'")
+    return os.path.join(BATCH_JOBS_DIR, f"{safe_id}.jsonl")
+
+def _compact_sources(sources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Bulk results drop chunk text; page/chunk_id are enough to cite or look it up
+    return [{k: v for k, v in s.items() if k != "text"} for s in sources]
+
+def _answer_item(item: Dict[str, Any], retrieved: List[Dict[str, Any]]) -> Dict[str, Any]:
+    result = answer_clinical_question(item["question"], retrieved)
+    return {
+        "id": item_id(item),
+        "patient_id": item["patient_id"],
+        "question": item["question"],
+        "answer_text": result["answer_text"],
+        "sources": _compact_sources(result.get("sources", [])),
+        "source_type": result.get("source_type", "KB"),
+    }
+
+def _windows(items: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    window = []
+    for item in items:
+        window.append(item)
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+def run_clinical_batch(items: Iterable[Dict[str, Any]], concurrency: int = 4,
+                       skip_ids: Optional[Set[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Answers (patient_id, question) items in bulk. Within each window, questions that
+    share a KB and diagnosis topic set are embedded in one batch and searched with one
+    multi-query Chroma call; LLM calls run with bounded concurrency.
+    Results are yielded as they complete (not in input order).
+    """
+    skip_ids = skip_ids or set()
+    patients: Dict[str, Optional[Dict[str, Any]]] = {}
+    known_kbs = set(list_kbs())
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="clinical-batch") as pool:
+        for window in _windows((i for i in items if item_id(i) not in skip_ids), BATCH_WINDOW_SIZE):
+            # Each patient is fetched once per batch, not once per question
+            for item in window:
+                if item["patient_id"] not in patients:
+                    bundle = get_context_bundle(item["patient_id"])
+                    patients[item["patient_id"]] = bundle['patient'] if bundle else get_patient_by_id(item["patient_id"])
+
+            answerable = []
+            for item in window:
+                if patients[item["patient_id"]] is None:
+                    yield {"id": item_id(item), "patient_id": item["patient_id"], "question": item["question"],
+                           "error": "Patient not found"}
+                elif item.get("kb") and item["kb"] not in known_kbs:
+                    yield {"id": item_id(item), "patient_id": item["patient_id"], "question": item["question"],
+                           "error": f"Unknown knowledge base: {item['kb']}"}
+                else:
+                    answerable.append(item)
+            if not answerable:
+                continue
+
+            # One multi-query search per (KB, diagnosis topic set) in the window;
+            # an item may name its KB, otherwise it is chosen by diagnosis
+            groups: Dict[tuple, List[Dict[str, Any]]] = {}
+            for item in answerable:
+                diagnosis = patients[item["patient_id"]].get('primary_diagnosis')
+                key = (item.get("kb") or kb_for_diagnosis(diagnosis), tuple(diagnosis_topics(diagnosis)))
+                groups.setdefault(key, []).append(item)
+
+            futures = {}
+            for (kb, topics), group in groups.items():
+                if topics:
+                    queries = [i["question"] for i in group]
+                else:
+                    queries = [build_clinical_query(i["question"], patients[i["patient_id"]]) for i in group]
+                for item, retrieved in zip(group, retrieve_many(queries, topics=list(topics), kb=kb)):
+                    futures[pool.submit(_answer_item, item, retrieved)] = item
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    yield future.result()
+                except Exception as e:
+                    logger.error(f"Batch item {item_id(item)} failed: {e}")
+                    yield {"id": item_id(item), "patient_id": item["patient_id"], "question": item["question"],
+                           "error": str(e)}
+
+def run_checkpointed_batch(items: Iterable[Dict[str, Any]], checkpoint_path: str, concurrency: int = 4,
+                           replay_completed: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Runs a batch whose results are appended to checkpoint_path as they complete.
+    Re-running with the same checkpoint skips items that already succeeded.
+    """
+    completed = load_completed(checkpoint_path)
+    if replay_completed:
+        yield from completed.values()
+    if os.path.dirname(checkpoint_path):
+        os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+
+    with open(checkpoint_path, "a+") as out:
+        # Terminate a partial line left by an interrupted run before appending
+        if out.tell() > 0:
+            out.seek(out.tell() - 1)
+            if out.read(1) != "\n":
+                out.write("\n")
+        for result in run_clinical_batch(items, concurrency, skip_ids=set(completed)):
+            out.write(dumps(result) + "\n")
+            out.flush()
+            yield result
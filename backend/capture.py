@@ -0,0 +1,246 @@
+import os
+import re
+import time
+import queue
+import hashlib
+import logging
+import threading
+from logging.handlers import RotatingFileHandler
+from urllib.parse import parse_qsl
+from typing import Dict, Any, List, Optional
+from backend.log_store import request_id_var, session_id_var
+from backend.metrics import inc_counter, register_metric
+from backend.codec import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Opt-in traffic capture for replay (benchmarks/replay.py). Each agent request and
+# each LLM call is written as one JSON line; PII is redacted on the writer thread.
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "false").lower() == "true"
+CAPTURE_FILE = os.getenv("CAPTURE_FILE", "./captures/traffic.jsonl")
+CAPTURE_MAX_BYTES = int(os.getenv("CAPTURE_MAX_BYTES", str(10 * 1024 * 1024)))
+CAPTURE_BACKUP_COUNT = int(os.getenv("CAPTURE_BACKUP_COUNT", "10"))
+CAPTURE_PATHS = (
+    "/session/start", "/patient", "/agent/receptionist",
+    "/agent/clinical", "/agent/clinical/stream",
+)
+# Request bodies beyond this are truncated (and not replayable)
+CAPTURE_MAX_BODY_BYTES = 64 * 1024
+# Records waiting to be written; beyond this they are dropped rather than slowing requests
+CAPTURE_QUEUE_SIZE = 10000
+# How often the patient-name list used for redaction is reloaded
+CAPTURE_NAME_REFRESH_SECONDS = 300
+
+register_metric("assistant_capture_dropped_total", "counter", "Capture records dropped because the writer queue was full.")
+
+PATIENT_PLACEHOLDER_RE = re.compile(r"\[\[patient:([^\]]+)\]\]")
+_PII_PATTERNS = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "[EMAIL]"),
+    (re.compile(r"(?<!\w)\+?\d[\d\s().-]{8,}\d(?!\w)"), "[PHONE]"),
+    (re.compile(r"\b\d{3}-\d{2}-\d{4}\b"), "[SSN]"),
+]
+
+def prompt_digest(prompt: str) -> str:
+    """
+    Key used to match replayed LLM prompts to recorded responses.
+    """
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+class Redactor:
+    """
+    Replaces patient names with [[patient:<patient_id>]] placeholders (so replay can
+    restore them from its own patient DB) and masks emails, phone and SSN-like numbers.
+    """
+
+    def __init__(self, refresh_seconds: float = CAPTURE_NAME_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._name_re = None
+        self._ids_by_name: Dict[str, str] = {}
+        self._loaded_at = 0.0
+
+    def _load_names(self):
+        from backend.patient_db import list_patients
+        patients = list_patients()
+        self._ids_by_name = {p['patient_name'].lower(): p['patient_id'] for p in patients if p.get('patient_name')}
+        # Longest names first so "John Smith Jr" wins over "John Smith"
+        names = sorted(self._ids_by_name, key=len, reverse=True)
+        self._name_re = re.compile(r"\b(" + "|".join(re.escape(n) for n in names) + r")\b", re.IGNORECASE) if names else None
+        self._loaded_at = time.time()
+
+    def redact_text(self, text: str) -> str:
+        if time.time() - self._loaded_at > self.refresh_seconds:
+            try:
+                self._load_names()
+            except Exception as e:
+                logger.error(f"Capture could not load patient names for redaction: {e}")
+        if self._name_re is not None:
+            text = self._name_re.sub(lambda m: f"[[patient:{self._ids_by_name[m.group(0).lower()]}]]", text)
+        for pattern, replacement in _PII_PATTERNS:
+            text = pattern.sub(replacement, text)
+        return text
+
+    def redact(self, value: Any) -> Any:
+        if isinstance(value, str):
+            return self.redact_text(value)
+        if isinstance(value, dict):
+            return {k: self.redact(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.redact(v) for v in value]
+        return value
+
+def rehydrate(value: Any, names_by_id: Dict[str, str]) -> Any:
+    """
+    Restores [[patient:<id>]] placeholders using a patient_id -> name mapping.
+    """
+    if isinstance(value, str):
+        return PATIENT_PLACEHOLDER_RE.sub(lambda m: names_by_id.get(m.group(1), m.group(0)), value)
+    if isinstance(value, dict):
+        return {k: rehydrate(v, names_by_id) for k, v in value.items()}
+    if isinstance(value, list):
+        return [rehydrate(v, names_by_id) for v in value]
+    return value
+
+class CaptureWriter:
+    """
+    Bounded queue drained by a background thread into a rotating JSONL file.
+    """
+
+    def __init__(self, path: str = CAPTURE_FILE, max_bytes: int = CAPTURE_MAX_BYTES,
+                 backup_count: int = CAPTURE_BACKUP_COUNT):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._redactor = Redactor()
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(CAPTURE_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, daemon=True, name="traffic-capture")
+        self._thread.start()
+
+    def write(self, record: Dict[str, Any]):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            inc_counter("assistant_capture_dropped_total")
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            try:
+                line = dumps(self._redactor.redact(record))
+                self._handler.emit(logging.makeLogRecord({"msg": line}))
+            except Exception as e:
+                logger.error(f"Failed to write capture record: {e}")
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._handler.close()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_capture_writer() -> CaptureWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = CaptureWriter()
+    return _writer
+
+def capture_llm_call(prompt: str, text: str, latency: float, outcome: str, stream: bool = False):
+    """
+    Records an LLM call (prompt digest and response) for the replay LLM stub. No-op unless capture is on.
+    """
+    if not CAPTURE_ENABLED:
+        return
+    get_capture_writer().write({
+        "kind": "llm",
+        "ts": time.time(),
+        "request_id": request_id_var.get(),
+        "session_id": session_id_var.get(),
+        "prompt_sha256": prompt_digest(prompt),
+        "text": text,
+        "latency_ms": round(latency * 1000, 3),
+        "outcome": outcome,
+        "stream": stream,
+    })
+
+def _decode_body(body: bytes) -> Any:
+    if not body:
+        return None
+    try:
+        return loads(body)
+    except ValueError:
+        return body.decode("utf-8", errors="replace")
+
+class TrafficCaptureMiddleware:
+    """
+    Records method, path, query, payload, status and timing of requests to the agent
+    endpoints. The /session/start response is kept so replay can map session ids.
+    """
+
+    def __init__(self, app, paths=CAPTURE_PATHS, max_body_bytes: int = CAPTURE_MAX_BODY_BYTES):
+        self.app = app
+        self.paths = set(paths)
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        body = bytearray()
+        response_body = bytearray()
+        keep_response = scope["path"] == "/session/start"
+        state = {"status": None, "request_id": None, "first_byte": None, "truncated": False}
+        ts = time.time()
+        start = time.perf_counter()
+
+        async def capture_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                if len(body) + len(chunk) <= self.max_body_bytes:
+                    body.extend(chunk)
+                else:
+                    state["truncated"] = True
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"x-request-id":
+                        state["request_id"] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                if state["first_byte"] is None:
+                    state["first_byte"] = time.perf_counter()
+                if keep_response:
+                    response_body.extend(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            payload = _decode_body(bytes(body))
+            record = {
+                "kind": "http",
+                "ts": ts,
+                "request_id": state["request_id"],
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"))),
+                "session_id": payload.get("session_id") if isinstance(payload, dict) else None,
+                "payload": payload,
+                "truncated": state["truncated"],
+                "status": state["status"],
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                "ttfb_ms": round((state["first_byte"] - start) * 1000, 3) if state["first_byte"] else None,
+            }
+            if keep_response:
+                response = _decode_body(bytes(response_body))
+                if isinstance(response, dict):
+                    record["session_id"] = response.get("session_id")
+            get_capture_writer().write(record)
@@ -0,0 +1,177 @@
+import os
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from starlette.websockets import WebSocket
+from backend.patient_context import get_context_bundle
+from backend.langgraph_agents import retrieve_clinical_context, load_patient
+from backend.web_search import normalize_query
+from backend.records import PatientRecord, Chunk
+from backend.codec import dumps
+from backend.metrics import inc_counter, set_gauge, register_metric
+
+logger = logging.getLogger(__name__)
+
+# WebSocket chat (/ws/chat/{session_id}). A connection pins its session's state for its
+# lifetime: history, the identified patient, that patient's context bundle and recent
+# retrievals. Turns then skip the per-request session, patient and bundle lookups.
+# Outbound events go through a bounded queue drained by one sender task, so a slow
+# client holds back the turn producing them instead of growing a buffer.
+WS_SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", "64"))
+# A client that doesn't take an event within this long is disconnected
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+WS_RETRIEVAL_CACHE_SIZE = int(os.getenv("WS_RETRIEVAL_CACHE_SIZE", "32"))
+
+register_metric("assistant_ws_connections", "gauge", "Open WebSocket chat connections.")
+register_metric("assistant_ws_slow_consumers_total", "counter", "WebSocket chat connections closed for not reading events.")
+
+_connections = 0
+_connections_lock = threading.Lock()
+
+def _count_connection(delta: int):
+    global _connections
+    with _connections_lock:
+        _connections += delta
+        set_gauge("assistant_ws_connections", _connections)
+
+class ChannelClosed(Exception):
+    """
+    Raised to a turn producing events for a connection that has gone away or fallen behind.
+    """
+
+class ChatContext:
+    """
+    Session state pinned for one connection.
+    """
+
+    def __init__(self, session_id: str, session: Dict[str, Any]):
+        self.session_id = session_id
+        self.session = session
+        self.history = session["history"]
+        self.patient: Optional[PatientRecord] = None
+        # {} when the patient has no precomputed bundle, so it isn't looked up again
+        self.bundle: Optional[Dict[str, Any]] = None
+        self._retrieved: "OrderedDict[tuple, List[Chunk]]" = OrderedDict()
+
+    @property
+    def patient_id(self) -> Optional[str]:
+        return self.patient['patient_id'] if self.patient else None
+
+    def resume(self):
+        # A patient identified by an earlier REST turn is pinned on connect
+        if self.session.get("patient_id"):
+            self.pin_patient(load_patient(self.session["patient_id"]))
+
+    def pin_patient(self, patient: Optional[PatientRecord]):
+        if patient is None or patient['patient_id'] == self.patient_id:
+            return
+        self.patient = patient
+        self.bundle = get_context_bundle(patient['patient_id']) or {}
+        self._retrieved.clear()
+
+    def retrieve(self, question: str, patient_record: Optional[PatientRecord], kb: Optional[str]) -> List[Chunk]:
+        """
+        retrieve_clinical_context with the pinned bundle and a per-connection cache of recent questions.
+        """
+        key = (kb, normalize_query(question))
+        retrieved = self._retrieved.get(key)
+        if retrieved is not None:
+            self._retrieved.move_to_end(key)
+            inc_counter("assistant_cache_hits_total", cache="ws_retrieval")
+            return retrieved
+        inc_counter("assistant_cache_misses_total", cache="ws_retrieval")
+        retrieved = retrieve_clinical_context(question, patient_record, kb, bundle=self.bundle)
+        self._retrieved[key] = retrieved
+        while len(self._retrieved) > WS_RETRIEVAL_CACHE_SIZE:
+            self._retrieved.popitem(last=False)
+        return retrieved
+
+class EventChannel:
+    """
+    Outbound events for one connection. send() is used from the event loop and put()
+    from worker threads; both wait while the queue is full. The sender closes the
+    connection if the client takes longer than WS_SEND_TIMEOUT to accept an event.
+    """
+
+    def __init__(self, websocket: WebSocket, maxsize: int = WS_SEND_QUEUE):
+        self.websocket = websocket
+        self.closed = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._loop = asyncio.get_running_loop()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+        _count_connection(1)
+
+    async def send(self, event: Dict[str, Any]):
+        if self.closed:
+            raise ChannelClosed()
+        try:
+            await asyncio.wait_for(self._queue.put(event), WS_SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            await self._slow_consumer()
+            raise ChannelClosed()
+
+    def put(self, event: Dict[str, Any]):
+        if self.closed:
+            raise ChannelClosed()
+        future = asyncio.run_coroutine_threadsafe(self.send(event), self._loop)
+        try:
+            future.result()
+        except ChannelClosed:
+            raise
+        except Exception as e:
+            future.cancel()
+            raise ChannelClosed() from e
+
+    async def _run(self):
+        try:
+            while True:
+                event = await self._queue.get()
+                if event is None:
+                    return
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(dumps(event)), WS_SEND_TIMEOUT)
+                except asyncio.TimeoutError:
+                    await self._slow_consumer()
+                    return
+        except Exception as e:
+            # Client went away mid-send
+            logger.info(f"WebSocket send failed: {e}")
+        finally:
+            self.closed = True
+
+    async def _slow_consumer(self):
+        if self.closed:
+            return
+        self.closed = True
+        inc_counter("assistant_ws_slow_consumers_total")
+        logger.warning("Closing WebSocket chat: client is not reading events")
+        try:
+            await self.websocket.close(code=1008, reason="Client too slow")
+        except Exception:
+            pass
+
+    async def close(self):
+        if self._task is None:
+            return
+        if self.closed:
+            # A dead or slow client gets nothing more
+            self._task.cancel()
+        else:
+            # Queued events are flushed, within one send timeout
+            try:
+                await asyncio.wait_for(self._queue.put(None), WS_SEND_TIMEOUT)
+                await asyncio.wait_for(asyncio.shield(self._task), WS_SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self.closed = True
+        self._task = None
+        _count_connection(-1)
@@ -0,0 +1,178 @@
+import os
+import time
+import math
+import itertools
+import logging
+import threading
+from collections import deque
+from typing import Optional
+from backend.metrics import inc_counter, set_gauge
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker over the last LLM_BREAKER_WINDOW calls: trips when the error rate or
+# the share of calls slower than LLM_BREAKER_SLOW_SECONDS crosses its threshold.
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_SLOW_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_SECONDS", "8"))
+LLM_BREAKER_SLOW_RATE = float(os.getenv("LLM_BREAKER_SLOW_RATE", "0.5"))
+# Time the circuit stays open before a single probe call is let through
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# Hedging: a second attempt is sent once the first has run longer than the observed p95
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Upper bound on hedged attempts as a fraction of calls, so hedging can't double the load
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+class CircuitBreaker:
+    """
+    closed -> open when the recent error or slow-call rate crosses its threshold;
+    open -> half_open after the cooldown, letting one probe through;
+    half_open -> closed on a successful probe, back to open on a failed one.
+    allow() hands out a ticket that the call passes back to record(); while half_open only
+    the probe's ticket counts, so late results from calls admitted before the trip are ignored.
+    """
+
+    def __init__(self, name: str = "llm", window: int = LLM_BREAKER_WINDOW, min_calls: int = LLM_BREAKER_MIN_CALLS,
+                 error_rate: float = LLM_BREAKER_ERROR_RATE, slow_seconds: float = LLM_BREAKER_SLOW_SECONDS,
+                 slow_rate: float = LLM_BREAKER_SLOW_RATE, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.cooldown = cooldown
+        self._calls = deque(maxlen=window)  # (ok, slow) per completed call
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_ticket = None
+        self._tickets = itertools.count(1)
+        self._lock = threading.Lock()
+        self._set_state(CLOSED)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _set_state(self, state: str):
+        if state != self._state:
+            logger.warning(f"Circuit '{self.name}' {self._state} -> {state}")
+            inc_counter("assistant_circuit_transitions_total", circuit=self.name, state=state)
+        self._state = state
+        set_gauge("assistant_circuit_state", _STATE_VALUES[state], circuit=self.name)
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+            self._set_state(HALF_OPEN)
+            self._probe_in_flight = False
+            self._probe_ticket = None
+
+    def allow(self) -> Optional[int]:
+        """
+        A ticket for a call that may go out now, or None. In half_open only one probe is
+        allowed at a time.
+        """
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return next(self._tickets)
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self._probe_ticket = next(self._tickets)
+                return self._probe_ticket
+            return None
+
+    def record(self, ok: bool, latency: float, ticket: Optional[int] = None):
+        slow = latency >= self.slow_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                # Only the probe decides; anything else was admitted before the trip
+                if ticket is None or ticket != self._probe_ticket:
+                    return
+                self._probe_in_flight = False
+                self._probe_ticket = None
+                if ok and not slow:
+                    self._calls.clear()
+                    self._set_state(CLOSED)
+                else:
+                    self._trip()
+                return
+            self._calls.append((ok, slow))
+            if self._state == CLOSED and len(self._calls) >= self.min_calls:
+                n = len(self._calls)
+                errors = sum(1 for c_ok, _ in self._calls if not c_ok)
+                slow_calls = sum(1 for _, c_slow in self._calls if c_slow)
+                if errors / n >= self.error_rate or slow_calls / n >= self.slow_rate:
+                    self._trip()
+
+    def _trip(self):
+        self._opened_at = time.monotonic()
+        self._set_state(OPEN)
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self._probe_in_flight = False
+            self._probe_ticket = None
+            self._set_state(CLOSED)
+
+class HedgePolicy:
+    """
+    Tracks successful call latencies and decides when (and whether) to send a hedged attempt.
+    """
+
+    def __init__(self, enabled: bool = LLM_HEDGE_ENABLED, min_delay: float = LLM_HEDGE_MIN_DELAY,
+                 min_samples: int = LLM_HEDGE_MIN_SAMPLES, max_ratio: float = LLM_HEDGE_MAX_RATIO,
+                 window: int = 200):
+        self.enabled = enabled
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self._latencies = deque(maxlen=window)
+        self._calls = 0
+        self._hedges = 0
+        self._lock = threading.Lock()
+
+    def record_latency(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def delay(self) -> Optional[float]:
+        """
+        Seconds to wait before hedging: the p95 of recent successful calls, at least
+        min_delay. None when disabled or there aren't enough samples yet.
+        """
+        with self._lock:
+            self._calls += 1
+            if not self.enabled or len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        p95 = ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)]
+        return max(self.min_delay, p95)
+
+    def try_hedge(self) -> bool:
+        # Budget: hedges stay within max_ratio of calls (plus one so the first slow call can hedge)
+        with self._lock:
+            if self._hedges >= self.max_ratio * self._calls + 1:
+                return False
+            self._hedges += 1
+        inc_counter("assistant_llm_hedges_total")
+        return True
+
+    def reset(self):
+        with self._lock:
+            self._latencies.clear()
+            self._calls = 0
+            self._hedges = 0
@@ -0,0 +1,39 @@
+import json
+import dataclasses
+from typing import Any
+
+# JSON codec for responses, stored JSON columns, caches and logs. Uses orjson when
+# installed (several times faster than json, and serializes the slotted records in
+# backend/records.py natively); falls back to the standard library otherwise.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(obj: Any) -> Any:
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj, default=_default, option=_OPTIONS).decode("utf-8")
+
+    def loads(data) -> Any:
+        return orjson.loads(data)
+else:
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps_bytes(obj: Any) -> bytes:
+        return _encoder.encode(obj).encode("utf-8")
+
+    def dumps(obj: Any) -> str:
+        return _encoder.encode(obj)
+
+    def loads(data) -> Any:
+        return json.loads(data)
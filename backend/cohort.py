@@ -0,0 +1,92 @@
+import os
+import logging
+import threading
+from typing import Dict, List, Optional
+import pandas as pd
+from backend.patient_db import get_db_connection, medication_name, warning_sign_key, parse_json_list
+from backend.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# Columnar (Parquet) snapshot of the patients table for analytics and cohort scans
+SNAPSHOT_PATH = os.getenv("PATIENT_SNAPSHOT_PATH", "./snapshots/patients.parquet")
+
+_snapshot = None
+_snapshot_mtime = None
+_snapshot_lock = threading.Lock()
+
+@timed("cohort", op="export_snapshot")
+def export_snapshot(path: str = SNAPSHOT_PATH) -> int:
+    """
+    Writes the patients table to Parquet. medications/warning_signs are stored as
+    list columns, plus normalized medication_names/warning_sign_keys for filtering.
+    Returns the number of rows written.
+    """
+    conn = get_db_connection()
+    try:
+        df = pd.read_sql_query("SELECT * FROM patients", conn)
+    finally:
+        conn.close()
+
+    df["medications"] = df["medications"].map(parse_json_list)
+    df["warning_signs"] = df["warning_signs"].map(parse_json_list)
+    df["medication_names"] = df["medications"].map(lambda meds: [medication_name(m) for m in meds])
+    df["warning_sign_keys"] = df["warning_signs"].map(lambda signs: [warning_sign_key(w) for w in signs])
+    df["discharge_date"] = pd.to_datetime(df["discharge_date"], errors="coerce")
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename so readers never see a partial file
+    tmp_path = f"{path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    logger.info(f"Exported {len(df)} patients to {path}")
+    return len(df)
+
+def load_snapshot(path: str = SNAPSHOT_PATH) -> Dict[str, pd.DataFrame]:
+    """
+    Loads the snapshot (cached until the file changes) with exploded lookup frames
+    for medication and warning-sign filters.
+    """
+    global _snapshot, _snapshot_mtime
+    mtime = os.path.getmtime(path)
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot_mtime != mtime:
+            patients = pd.read_parquet(path)
+            patients["diagnosis_key"] = patients["primary_diagnosis"].str.lower()
+            _snapshot = {
+                "patients": patients,
+                "medications": patients[["patient_id", "medication_names"]].explode("medication_names").dropna(),
+                "warning_signs": patients[["patient_id", "warning_sign_keys"]].explode("warning_sign_keys").dropna(),
+            }
+            _snapshot_mtime = mtime
+        return _snapshot
+
+@timed("cohort", op="query_snapshot")
+def query_snapshot(diagnosis: Optional[str] = None, medication: Optional[str] = None,
+                   warning_sign: Optional[str] = None, discharged_since: Optional[str] = None,
+                   discharged_until: Optional[str] = None, limit: int = 100, offset: int = 0,
+                   path: str = SNAPSHOT_PATH) -> List[Dict]:
+    """
+    Same filters as patient_db.query_cohort, evaluated as vectorized scans over the snapshot.
+    """
+    snapshot = load_snapshot(path)
+    patients = snapshot["patients"]
+    mask = pd.Series(True, index=patients.index)
+    if diagnosis:
+        mask &= patients["diagnosis_key"] == diagnosis.lower()
+    if discharged_since:
+        mask &= patients["discharge_date"] >= pd.Timestamp(discharged_since)
+    if discharged_until:
+        mask &= patients["discharge_date"] <= pd.Timestamp(discharged_until)
+    if medication:
+        meds = snapshot["medications"]
+        mask &= patients["patient_id"].isin(meds.loc[meds["medication_names"] == medication_name(medication), "patient_id"])
+    if warning_sign:
+        signs = snapshot["warning_signs"]
+        mask &= patients["patient_id"].isin(signs.loc[signs["warning_sign_keys"] == warning_sign_key(warning_sign), "patient_id"])
+
+    result = patients.loc[mask, ["patient_id", "patient_name", "discharge_date", "primary_diagnosis"]]
+    result = result.sort_values(["discharge_date", "patient_id"], ascending=[False, True]).iloc[offset:offset + limit]
+    result = result.assign(discharge_date=result["discharge_date"].dt.strftime("%Y-%m-%d"))
+    return result.to_dict(orient="records")
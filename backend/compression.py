@@ -0,0 +1,32 @@
+import logging
+from starlette.middleware.gzip import GZipMiddleware
+
+logger = logging.getLogger(__name__)
+
+try:
+    # Optional: brotli-asgi adds br and falls back to gzip for clients without it
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+# Streaming endpoints are sent uncompressed so tokens aren't held in the compressor
+UNCOMPRESSED_PATHS = ("/agent/clinical/stream",)
+
+class CompressionMiddleware:
+    """
+    Compresses responses (br if available, else gzip) above minimum_size bytes,
+    except for streaming endpoints.
+    """
+    def __init__(self, app, minimum_size: int = 1000, exclude_paths=UNCOMPRESSED_PATHS):
+        self.app = app
+        self.exclude_paths = set(exclude_paths)
+        if BrotliMiddleware is not None:
+            self.compressed_app = BrotliMiddleware(app, minimum_size=minimum_size, gzip_fallback=True)
+        else:
+            self.compressed_app = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] not in self.exclude_paths:
+            await self.compressed_app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
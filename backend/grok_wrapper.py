@@ -1,22 +1,133 @@
 import os
+import time
 import requests
-import json
+from requests.adapters import HTTPAdapter
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Iterator, Optional
+from backend.metrics import timer, inc_counter, count_tokens, register_metric
+from backend.circuit_breaker import CircuitBreaker, HedgePolicy, CLOSED
+from backend.capture import capture_llm_call
+from backend.codec import loads
 
 logger = logging.getLogger(__name__)
 
 GROK_API_KEY = os.getenv("GROK_API_KEY")
-GROK_API_URL = "https://api.grok.example/v1/generate"  # Mock URL as per prompt example
+GROK_API_URL = os.getenv("GROK_API_URL", "https://api.grok.example/v1/generate")  # Mock URL as per prompt example
+# Overall deadline for a call, hedged attempts included
+GROK_TIMEOUT = float(os.getenv("GROK_TIMEOUT", "10"))
+
+register_metric("assistant_circuit_state", "gauge", "Circuit breaker state (0 closed, 1 open, 2 half-open).")
+register_metric("assistant_circuit_transitions_total", "counter", "Circuit breaker state changes.")
+register_metric("assistant_llm_hedges_total", "counter", "Hedged second attempts sent for slow LLM calls.")
+
+# Outcomes of an LLM call
+LLM_OK = "ok"
+LLM_MOCK = "mock"                  # no API key / example URL: the mock is the intended backend
+LLM_ERROR = "error"
+LLM_TIMEOUT = "timeout"
+LLM_CIRCUIT_OPEN = "circuit_open"  # failed fast without calling the API
+
+class LLMResult:
+    """
+    Result of an LLM call. `text` is always usable: when the call fails or the circuit
+    is open it holds the local fallback (mock) response, and `outcome` says why.
+    """
+    __slots__ = ("text", "outcome", "error", "hedged")
+
+    def __init__(self, text: str, outcome: str, error: Optional[str] = None, hedged: bool = False):
+        self.text = text
+        self.outcome = outcome
+        self.error = error
+        self.hedged = hedged
+
+    @property
+    def ok(self) -> bool:
+        return self.outcome in (LLM_OK, LLM_MOCK)
+
+    def __repr__(self):
+        return f"LLMResult(outcome={self.outcome!r}, hedged={self.hedged}, error={self.error!r})"
+
+_breaker = None
+_hedge_policy = None
+_http = None
+_pool = None
+
+def get_circuit_breaker() -> CircuitBreaker:
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker("grok")
+    return _breaker
+
+def get_hedge_policy() -> HedgePolicy:
+    global _hedge_policy
+    if _hedge_policy is None:
+        _hedge_policy = HedgePolicy()
+    return _hedge_policy
+
+def get_http_session() -> requests.Session:
+    # Keep-alive connections shared by primary and hedged attempts
+    global _http
+    if _http is None:
+        _http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=32)
+        _http.mount("http://", adapter)
+        _http.mount("https://", adapter)
+    return _http
+
+def get_llm_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm")
+    return _pool
+
+def _use_mock() -> bool:
+    return not GROK_API_KEY or "example" in GROK_API_URL
 
 def grok_generate(prompt: str, max_tokens: int = 512) -> str:
+    """
+    Generates text using the Grok API and returns just the text
+    (the fallback response if the call failed). Use grok_complete for the outcome.
+    """
+    return grok_complete(prompt, max_tokens).text
+
+def grok_complete(prompt: str, max_tokens: int = 512) -> LLMResult:
     """
     Generates text using the Grok API.
-    If GROK_API_KEY is not set, returns a mock response.
+    If GROK_API_KEY is not set, returns a mock response. Otherwise the call goes through
+    the circuit breaker (failing fast to the mock while open) and is hedged when slow.
     """
-    if not GROK_API_KEY:
-        logger.warning("GROK_API_KEY not found. Returning mock response.")
-        return mock_grok_response(prompt)
+    start = time.perf_counter()
+    with timer("llm"):
+        result = _grok_complete(prompt, max_tokens)
+    capture_llm_call(prompt, result.text, time.perf_counter() - start, result.outcome)
+    inc_counter("assistant_llm_calls_total", outcome=result.outcome)
+    inc_counter("assistant_llm_tokens_total", count_tokens(prompt), direction="prompt")
+    inc_counter("assistant_llm_tokens_total", count_tokens(result.text), direction="completion")
+    return result
+
+def _grok_complete(prompt: str, max_tokens: int) -> LLMResult:
+    if _use_mock():
+        if not GROK_API_KEY:
+            logger.warning("GROK_API_KEY not found. Returning mock response.")
+        return LLMResult(mock_grok_response(prompt), LLM_MOCK)
+
+    ticket = get_circuit_breaker().allow()
+    if ticket is None:
+        return LLMResult(mock_grok_response(prompt), LLM_CIRCUIT_OPEN)
+    try:
+        text, hedged = _hedged_request(prompt, max_tokens, ticket)
+        return LLMResult(text, LLM_OK, hedged=hedged)
+    except Exception as e:
+        logger.error(f"Error calling Grok API: {e}")
+        outcome = LLM_TIMEOUT if isinstance(e, (TimeoutError, requests.Timeout)) else LLM_ERROR
+        return LLMResult(mock_grok_response(prompt), outcome, error=str(e))
 
+def _attempt(prompt: str, max_tokens: int, timeout: float, ticket: Optional[int] = None) -> str:
+    """
+    One HTTP call to the API; its outcome and latency feed the breaker (under the
+    breaker ticket it was admitted with) and the hedge policy.
+    """
     headers = {
         "Authorization": f"Bearer {GROK_API_KEY}",
         "Content-Type": "application/json"
@@ -25,41 +136,133 @@ def grok_generate(prompt: str, max_tokens: int = 512) -> str:
         "prompt": prompt,
         "max_tokens": max_tokens
     }
-
+    start = time.perf_counter()
     try:
-        # In a real scenario, we would make the request here.
-        # Since the URL is example.com, this will likely fail or return 404 if actually called.
-        # For the purpose of this POC, if the key is present, we'll try to call it, 
-        # but handle errors gracefully by falling back to mock or raising.
-        # However, the prompt implies we should implement the call.
-        
-        # response = requests.post(GROK_API_URL, headers=headers, json=payload, timeout=10)
-        # response.raise_for_status()
-        # return response.json().get("text", "")
-        
-        # Since we don't have a real endpoint, we will simulate the behavior
-        # strictly for the POC unless a real URL is provided. 
-        # But the prompt says "Example HTTP POST... mockable if key absent".
-        # I will implement the request logic but comment it out or wrap it to fail safe
-        # if the URL is unreachable, effectively mocking it for now if the URL is invalid.
-        
-        # For this assignment, I will assume if the key is provided, the user expects a real call 
-        # to a real endpoint. But I only have an example URL. 
-        # I will return a mock response even if key is present for now to ensure stability,
-        # unless I can confirm the URL.
-        # actually, let's just return the mock response if the URL is the example one.
-        
-        if "example" in GROK_API_URL:
-             return mock_grok_response(prompt)
-             
-        response = requests.post(GROK_API_URL, headers=headers, json=payload, timeout=10)
+        response = get_http_session().post(GROK_API_URL, headers=headers, json=payload, timeout=timeout)
         response.raise_for_status()
-        data = response.json()
-        return data.get("text", "")
+        text = response.json().get("text", "")
+    except Exception:
+        get_circuit_breaker().record(False, time.perf_counter() - start, ticket)
+        raise
+    latency = time.perf_counter() - start
+    get_circuit_breaker().record(True, latency, ticket)
+    get_hedge_policy().record_latency(latency)
+    return text
+
+def _hedged_request(prompt: str, max_tokens: int, ticket: Optional[int] = None):
+    """
+    Sends the request and, if it hasn't finished by the hedge delay (recent p95),
+    a second identical one. Returns (text, hedged) from the first success.
+    The slower attempt is left to finish in the background.
+    """
+    pool = get_llm_pool()
+    policy = get_hedge_policy()
+    deadline = time.monotonic() + GROK_TIMEOUT
+    primary = pool.submit(_attempt, prompt, max_tokens, GROK_TIMEOUT, ticket)
+    attempts = [primary]
+
+    delay = policy.delay()
+    if delay is not None and delay < GROK_TIMEOUT:
+        done, _ = wait(attempts, timeout=delay)
+        if not done and get_circuit_breaker().state == CLOSED and policy.try_hedge():
+            remaining = max(0.1, deadline - time.monotonic())
+            attempts.append(pool.submit(_attempt, prompt, max_tokens, remaining, ticket))
+
+    pending = set(attempts)
+    last_error = None
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result(), future is not primary
+            last_error = future.exception()
+    if pending:
+        raise TimeoutError(f"Grok API call exceeded {GROK_TIMEOUT}s")
+    raise last_error
+
+def grok_generate_stream(prompt: str, max_tokens: int = 512, outcome: Optional[Dict] = None) -> Iterator[str]:
+    """
+    Streams generated text in pieces as they arrive.
+    The mock and example-URL paths stream the mock response word by word. If the call
+    fails (or the circuit is open) before any text arrives, the fallback response is
+    streamed instead. The LLMResult is stored in `outcome["result"]` when given.
+    """
+    pieces = []
+    result = None
+    start = time.perf_counter()
+    with timer("llm", mode="stream"):
+        for piece in _grok_generate_stream(prompt, max_tokens):
+            if isinstance(piece, LLMResult):
+                result = piece
+                continue
+            pieces.append(piece)
+            yield piece
+    text = "".join(pieces)
+    capture_llm_call(prompt, text, time.perf_counter() - start, result.outcome, stream=True)
+    if outcome is not None:
+        outcome["result"] = LLMResult(text, result.outcome, result.error)
+    inc_counter("assistant_llm_calls_total", outcome=result.outcome)
+    inc_counter("assistant_llm_tokens_total", count_tokens(prompt), direction="prompt")
+    inc_counter("assistant_llm_tokens_total", count_tokens(text), direction="completion")
 
+def _stream_words(text: str) -> Iterator[str]:
+    for i, word in enumerate(text.split(" ")):
+        yield word if i == 0 else f" {word}"
+
+def _grok_generate_stream(prompt: str, max_tokens: int) -> Iterator:
+    # Yields text pieces, then a final LLMResult (text unset) carrying the outcome
+    if _use_mock():
+        yield from _stream_words(mock_grok_response(prompt))
+        yield LLMResult("", LLM_MOCK)
+        return
+
+    breaker = get_circuit_breaker()
+    ticket = breaker.allow()
+    if ticket is None:
+        yield from _stream_words(mock_grok_response(prompt))
+        yield LLMResult("", LLM_CIRCUIT_OPEN)
+        return
+
+    headers = {
+        "Authorization": f"Bearer {GROK_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "prompt": prompt,
+        "max_tokens": max_tokens,
+        "stream": True
+    }
+    start = time.perf_counter()
+    streamed = False
+    try:
+        with get_http_session().post(GROK_API_URL, headers=headers, json=payload, timeout=GROK_TIMEOUT, stream=True) as response:
+            response.raise_for_status()
+            # Accepts newline-delimited JSON or SSE ("data: {...}") chunks with a "text" field
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                if line.startswith("data:"):
+                    line = line[len("data:"):].strip()
+                if line == "[DONE]":
+                    break
+                text = loads(line).get("text", "")
+                if text:
+                    streamed = True
+                    yield text
     except Exception as e:
-        logger.error(f"Error calling Grok API: {e}")
-        return f"Error generating response: {e}"
+        breaker.record(False, time.perf_counter() - start, ticket)
+        logger.error(f"Error streaming from Grok API: {e}")
+        # Text already sent can't be taken back; fall back only if nothing was streamed
+        if not streamed:
+            yield from _stream_words(mock_grok_response(prompt))
+        outcome = LLM_TIMEOUT if isinstance(e, requests.Timeout) else LLM_ERROR
+        yield LLMResult("", outcome, error=str(e))
+        return
+    breaker.record(True, time.perf_counter() - start, ticket)
+    yield LLMResult("", LLM_OK)
 
 def mock_grok_response(prompt: str) -> str:
     """
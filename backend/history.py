@@ -0,0 +1,201 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional, Callable
+from backend.grok_wrapper import grok_complete
+from backend.prompts import HISTORY_SUMMARY_PROMPT_TEMPLATE
+from backend.tasks import run_in_background
+from backend.memory import estimate_size, deep_sizeof
+from backend.metrics import inc_counter, set_gauge, register_metric
+
+logger = logging.getLogger(__name__)
+
+# Number of recent turns (user + assistant pair) kept verbatim per session
+HISTORY_RECENT_TURNS = int(os.getenv("HISTORY_RECENT_TURNS", "4"))
+# Hard cap on the rolling summary so it can't grow with the conversation
+HISTORY_SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", "1200"))
+# Turns waiting to be folded; if the summarizer falls behind, oldest are dropped
+HISTORY_MAX_PENDING_TURNS = int(os.getenv("HISTORY_MAX_PENDING_TURNS", "8"))
+# Sessions kept in memory; beyond this the least recently used is dropped
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+# Sessions used more recently than this are not evicted to meet the memory budget
+SESSION_MIN_IDLE_SECONDS = float(os.getenv("SESSION_MIN_IDLE_SECONDS", "60"))
+
+register_metric("assistant_sessions", "gauge", "Sessions held in memory.")
+register_metric("assistant_sessions_evicted_total", "counter", "Sessions dropped by reason (max_sessions, memory).")
+
+class SessionHistory:
+    """
+    Bounded conversation memory for one session.
+    The last N turns are kept verbatim; older turns are folded into a rolling
+    summary by a background worker. Memory and prompt size stay constant.
+    """
+
+    def __init__(self, recent_turns: int = HISTORY_RECENT_TURNS):
+        self._recent = deque(maxlen=recent_turns * 2)
+        self._pending = deque(maxlen=HISTORY_MAX_PENDING_TURNS * 2)
+        self._summary = ""
+        self._lock = threading.Lock()
+        self._summarizing = False
+
+    @property
+    def summary(self) -> str:
+        return self._summary
+
+    def append_turn(self, user_message: str, assistant_message: str):
+        with self._lock:
+            # Messages about to fall out of the verbatim window go to the summarizer
+            overflow = len(self._recent) + 2 - self._recent.maxlen
+            for _ in range(max(0, overflow)):
+                self._pending.append(self._recent.popleft())
+            self._recent.append({"role": "user", "content": user_message})
+            self._recent.append({"role": "assistant", "content": assistant_message})
+            schedule = bool(self._pending) and not self._summarizing
+            if schedule:
+                self._summarizing = True
+        # Folded on the background task queue so summarization never runs on the request thread
+        if schedule and not run_in_background(self._fold_pending, task_name="history_summary"):
+            # Queue full; the pending turns are picked up by the next append
+            with self._lock:
+                self._summarizing = False
+
+    def _fold_pending(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._summarizing = False
+                    return
+                batch = list(self._pending)
+                self._pending.clear()
+                summary = self._summary
+            try:
+                new_summary = summarize_messages(summary, batch)
+            except Exception as e:
+                logger.error(f"Error summarizing history: {e}")
+                with self._lock:
+                    # Put the batch back ahead of turns that arrived meanwhile; the next append
+                    # retries. If that overflows the pending cap, the oldest are dropped as usual.
+                    requeued = batch + list(self._pending)
+                    self._pending.clear()
+                    self._pending.extend(requeued)
+                    self._summarizing = False
+                return
+            with self._lock:
+                self._summary = new_summary
+
+    def as_messages(self) -> List[Dict[str, str]]:
+        """
+        Returns a copy of the bounded history for the agent state:
+        the rolling summary (if any) followed by the recent verbatim turns.
+        """
+        with self._lock:
+            messages = []
+            if self._summary:
+                messages.append({"role": "system", "content": f"Conversation summary: {self._summary}"})
+            messages.extend(dict(m) for m in self._recent)
+            return messages
+
+def summarize_messages(summary: str, messages: List[Dict[str, str]]) -> str:
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = HISTORY_SUMMARY_PROMPT_TEMPLATE.format(
+        summary=summary or "(none)",
+        transcript=transcript,
+        max_chars=HISTORY_SUMMARY_MAX_CHARS
+    )
+    result = grok_complete(prompt, max_tokens=256)
+    new_summary = result.text.strip()
+    if not result.ok or not new_summary:
+        # Keep something useful even if the LLM is unavailable
+        new_summary = f"{summary} {transcript}".strip()
+    # Keep the most recent part if the summary overflows the budget
+    return new_summary[-HISTORY_SUMMARY_MAX_CHARS:]
+
+class SessionStore:
+    """
+    Sessions by id, least recently used first, with dict-style access (reads count as use).
+    Beyond max_sessions the least recently used session is dropped; evict() drops sessions
+    idle for at least min_idle seconds when the memory budget needs room. on_evict(session_id)
+    is called for every session dropped either way.
+    """
+
+    def __init__(self, max_sessions: int = SESSION_MAX, min_idle: float = SESSION_MIN_IDLE_SECONDS,
+                 on_evict: Optional[Callable[[str], None]] = None):
+        self.max_sessions = max_sessions
+        self.min_idle = min_idle
+        self.on_evict = on_evict
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def __getitem__(self, session_id: str) -> Dict[str, Any]:
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __setitem__(self, session_id: str, session: Dict[str, Any]):
+        evicted = []
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            self._used[session_id] = time.monotonic()
+            while len(self._sessions) > self.max_sessions:
+                oldest, _ = self._sessions.popitem(last=False)
+                del self._used[oldest]
+                evicted.append(oldest)
+            set_gauge("assistant_sessions", len(self._sessions))
+        for oldest in evicted:
+            self._evicted(oldest, "max_sessions")
+
+    def get(self, session_id: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return default
+            self._sessions.move_to_end(session_id)
+            self._used[session_id] = time.monotonic()
+        return session
+
+    def pop(self, session_id: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._used.pop(session_id, None)
+            session = self._sessions.pop(session_id, default)
+            set_gauge("assistant_sessions", len(self._sessions))
+        return session
+
+    def size_bytes(self) -> int:
+        return estimate_size(self._sessions, self._lock)
+
+    def evict(self, n_bytes: int) -> int:
+        """
+        Drops idle sessions, least recently used first, until about n_bytes are freed.
+        """
+        freed = 0
+        cutoff = time.monotonic() - self.min_idle
+        while freed < n_bytes:
+            with self._lock:
+                if not self._sessions:
+                    break
+                session_id = next(iter(self._sessions))
+                # Sessions are in order of use, so the rest are all more recent
+                if self._used[session_id] > cutoff:
+                    break
+                session = self._sessions.pop(session_id)
+                del self._used[session_id]
+                set_gauge("assistant_sessions", len(self._sessions))
+            freed += deep_sizeof((session_id, session))
+            self._evicted(session_id, "memory")
+        return freed
+
+    def _evicted(self, session_id: str, reason: str):
+        inc_counter("assistant_sessions_evicted_total", reason=reason)
+        if self.on_evict is not None:
+            self.on_evict(session_id)
@@ -0,0 +1,239 @@
+import os
+import json
+import mmap
+import time
+import struct
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional, Sequence
+import numpy as np
+from backend.metrics import inc_counter
+from backend.codec import loads
+from backend.records import Chunk
+
+logger = logging.getLogger(__name__)
+
+# Prebuilt, read-only KB artifact ("<kb>.kbpack"): one file holding the chunk
+# embeddings as a contiguous float32 matrix plus offset-indexed text and metadata
+# blobs. It is memory-mapped read-only, so worker processes share it through the
+# page cache and opening it costs a header parse rather than a PDF ingest or index load.
+#
+# Layout (little-endian):
+#   magic (8 bytes) | format version (uint32) | header length (uint32) | JSON header
+#   sections, each 64-byte aligned, at the offsets listed in the header:
+#     vectors      float32[count, dim]
+#     norms        float32[count]        squared L2 norm per vector
+#     topics       uint64[count]         bit i set = chunk tagged with header topics[i]
+#     text_offsets uint64[count + 1]     into text (UTF-8)
+#     meta_offsets uint64[count + 1]     into meta (one JSON object per chunk)
+#     text, meta
+# The header carries the SHA-256 of everything after it.
+MAGIC = b"KBPACK\x00\x01"
+FORMAT_VERSION = 1
+ARTIFACT_SUFFIX = ".kbpack"
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGN = 64
+
+class ArtifactError(Exception):
+    """
+    Raised for an unreadable, corrupt or incompatible KB artifact.
+    """
+
+def artifact_path(directory: str, kb: str) -> str:
+    return os.path.join(directory, f"{kb}{ARTIFACT_SUFFIX}")
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+def _offsets(blobs: List[bytes]) -> np.ndarray:
+    offsets = np.zeros(len(blobs) + 1, dtype="<u8")
+    np.cumsum([len(b) for b in blobs], out=offsets[1:])
+    return offsets
+
+def write_artifact(path: str, kb: str, embedding_model: str, ids: Sequence[str], texts: Sequence[str],
+                   metadatas: Sequence[Dict[str, Any]], embeddings) -> Dict[str, Any]:
+    """
+    Writes an artifact atomically (temp file + rename) and returns its header.
+    metadatas are the stored Chroma metadata; topic_* flags become the topic bitmask.
+    """
+    count = len(ids)
+    vectors = np.ascontiguousarray(embeddings, dtype="<f4") if count else np.zeros((0, 0), dtype="<f4")
+    if vectors.ndim != 2 or vectors.shape[0] != count or len(texts) != count or len(metadatas) != count:
+        raise ArtifactError("ids, texts, metadatas and embeddings must have the same length")
+
+    topic_names = sorted({k[len("topic_"):] for m in metadatas for k, v in m.items() if k.startswith("topic_") and v})
+    if len(topic_names) > 64:
+        raise ArtifactError(f"At most 64 topics are supported, got {len(topic_names)}")
+    bits = {t: 1 << i for i, t in enumerate(topic_names)}
+    topics = np.array([sum(bits[t] for t in topic_names if m.get(f"topic_{t}")) for m in metadatas], dtype="<u8")
+
+    text_blobs = [t.encode("utf-8") for t in texts]
+    meta_blobs = [json.dumps(dict(m, chunk_id=i), separators=(",", ":")).encode("utf-8")
+                  for i, m in zip(ids, metadatas)]
+    sections = [
+        ("vectors", vectors.tobytes()),
+        ("norms", np.einsum("ij,ij->i", vectors, vectors).astype("<f4").tobytes()),
+        ("topics", topics.tobytes()),
+        ("text_offsets", _offsets(text_blobs).tobytes()),
+        ("meta_offsets", _offsets(meta_blobs).tobytes()),
+        ("text", b"".join(text_blobs)),
+        ("meta", b"".join(meta_blobs)),
+    ]
+
+    # Section offsets are relative to the start of the body (the first aligned byte after the header)
+    layout = {}
+    body_len = 0
+    for name, data in sections:
+        body_len = _align(body_len)
+        layout[name] = [body_len, len(data)]
+        body_len += len(data)
+
+    digest = hashlib.sha256()
+    body = bytearray(body_len)
+    for name, data in sections:
+        start = layout[name][0]
+        body[start:start + len(data)] = data
+    digest.update(body)
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "kb": kb,
+        "embedding_model": embedding_model,
+        "dim": int(vectors.shape[1]) if count else 0,
+        "count": count,
+        "topics": topic_names,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "sections": layout,
+        "sha256": digest.hexdigest(),
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    preamble = _PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes))
+    body_start = _align(len(preamble) + len(header_bytes))
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(preamble)
+        f.write(header_bytes)
+        f.write(b"\x00" * (body_start - len(preamble) - len(header_bytes)))
+        f.write(body)
+    os.replace(tmp_path, path)
+    return header
+
+class KBArtifact:
+    """
+    Read-only view over a memory-mapped artifact. Vectors, norms and offsets are
+    numpy views into the mapping (no copies); texts and metadata are decoded per hit.
+    """
+
+    def __init__(self, path: str, verify: bool = True):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise ArtifactError(f"{path}: empty or unreadable artifact") from e
+        if len(self._mm) < _PREAMBLE.size:
+            raise ArtifactError(f"{path}: truncated artifact")
+        magic, version, header_len = _PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ArtifactError(f"{path}: not a KB artifact")
+        if version != FORMAT_VERSION:
+            raise ArtifactError(f"{path}: format version {version}, expected {FORMAT_VERSION}")
+        header_end = _PREAMBLE.size + header_len
+        self.header = json.loads(self._mm[_PREAMBLE.size:header_end])
+        self._body = _align(header_end)
+        if verify:
+            self.verify()
+
+        self.kb = self.header["kb"]
+        self.embedding_model = self.header["embedding_model"]
+        self.count = self.header["count"]
+        self.dim = self.header["dim"]
+        self.topics = self.header["topics"]
+        self.vectors = self._array("vectors", "<f4").reshape(self.count, self.dim)
+        self.norms = self._array("norms", "<f4")
+        self.topic_bits = self._array("topics", "<u8")
+        self._text_offsets = self._array("text_offsets", "<u8")
+        self._meta_offsets = self._array("meta_offsets", "<u8")
+        self._ids: Optional[Dict[str, int]] = None
+
+    @property
+    def mapped_bytes(self) -> int:
+        return len(self._mm)
+
+    def _section(self, name: str):
+        start, length = self.header["sections"][name]
+        return self._body + start, length
+
+    def _array(self, name: str, dtype: str) -> np.ndarray:
+        start, length = self._section(name)
+        return np.frombuffer(self._mm, dtype=dtype, count=length // np.dtype(dtype).itemsize, offset=start)
+
+    def _blob(self, name: str, offsets: np.ndarray, i: int) -> bytes:
+        start, _ = self._section(name)
+        return self._mm[start + int(offsets[i]):start + int(offsets[i + 1])]
+
+    def verify(self):
+        digest = hashlib.sha256()
+        digest.update(memoryview(self._mm)[self._body:])
+        if digest.hexdigest() != self.header["sha256"]:
+            raise ArtifactError(f"{self.path}: checksum mismatch")
+
+    def text(self, i: int) -> str:
+        return self._blob("text", self._text_offsets, i).decode("utf-8")
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        return loads(self._blob("meta", self._meta_offsets, i))
+
+    def chunk(self, i: int, score: Optional[float] = None) -> Chunk:
+        meta = self.metadata(i)
+        return Chunk(self.text(i), meta['source'], meta['page'], meta['chunk_id'], score)
+
+    def index_of(self, chunk_id: str) -> Optional[int]:
+        if self._ids is None:
+            # Built on first id lookup only; retrieval does not need it
+            self._ids = {self.metadata(i)['chunk_id']: i for i in range(self.count)}
+        return self._ids.get(chunk_id)
+
+    def topic_mask(self, topics: List[str]) -> int:
+        return sum(1 << self.topics.index(t) for t in topics if t in self.topics)
+
+    def search(self, query_embeddings: List[List[float]], k: int,
+               topics: Optional[List[str]] = None) -> List[List[Chunk]]:
+        """
+        Exact nearest neighbours by squared L2 distance (Chroma's default metric).
+        With topics, tagged chunks rank first and the rest of k is filled from all chunks,
+        matching rag's scoped-then-global retrieval.
+        """
+        if not self.count:
+            return [[] for _ in query_embeddings]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim != 2 or queries.shape[1] != self.dim:
+            raise ArtifactError(f"Query dimension {queries.shape[-1]} does not match artifact dimension {self.dim}")
+        distances = self.norms[None, :] - 2 * (queries @ self.vectors.T) + np.einsum("ij,ij->i", queries, queries)[:, None]
+        scoped_rows = None
+        if topics:
+            mask = self.topic_mask(topics)
+            scoped_rows = np.flatnonzero(self.topic_bits & np.uint64(mask)) if mask else np.array([], dtype=np.int64)
+
+        results = []
+        for q in range(len(queries)):
+            picked = []
+            if scoped_rows is not None:
+                picked = list(scoped_rows[_top_k(distances[q, scoped_rows], k)])
+            if len(picked) < k:
+                if scoped_rows is not None:
+                    inc_counter("assistant_retrieval_fallbacks_total")
+                seen = set(picked)
+                picked.extend(i for i in _top_k(distances[q], k + len(picked)) if i not in seen)
+                picked = picked[:k]
+            results.append([self.chunk(int(i), float(distances[q, i])) for i in picked])
+        return results
+
+def _top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    if k >= len(distances):
+        return np.argsort(distances, kind="stable")
+    candidates = np.argpartition(distances, k)[:k]
+    return candidates[np.argsort(distances[candidates], kind="stable")]
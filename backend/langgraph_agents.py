@@ -1,11 +1,24 @@
+import os
 import logging
 import json
-from typing import Dict, Any, List, Optional, TypedDict
+import sqlite3
+from typing import Dict, Any, List, Optional, TypedDict, Iterator, Callable, Tuple
 from langgraph.graph import StateGraph, END
-from backend.patient_db import find_patient_by_name, create_patient
-from backend.rag import retrieve, generate_answer
-from backend.grok_wrapper import grok_generate
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from backend.patient_db import find_patient_by_name, get_patient_by_id
+from backend.rag import retrieve, generate_answer, build_rag_prompt, kb_for_diagnosis, starts_with_web_search_marker
+from backend.patient_context import get_context_bundle, retrieve_for_patient
+from backend.topics import diagnosis_topics
+from backend.web_search import search_web
+from backend.grok_wrapper import grok_complete, grok_generate_stream
+from backend.admission import is_urgent, report_urgent_event
 from backend.prompts import RECEPTIONIST_SYSTEM_PROMPT, CLINICAL_SYSTEM_PROMPT
+from backend.metrics import timed, inc_counter
+from backend.profiling import profiled
+from backend.speculation import speculate, speculative_answer
+from backend.codec import dumps
+from backend.records import PatientRecord, Chunk
 
 logger = logging.getLogger(__name__)
 
@@ -15,23 +28,19 @@ class AgentState(TypedDict):
     messages: List[Dict[str, str]]  # role, content
     user_input: str
     patient_id: Optional[str]
-    patient_record: Optional[Dict[str, Any]]
+    patient_record: Optional[PatientRecord]
     agent_response: Optional[Dict[str, Any]]
     next_step: Optional[str] # 'clinical', 'end', 'web_search'
+    entry_point: Optional[str] # 'receptionist' or 'clinical'
+    kb: Optional[str] # KB requested for this turn; None selects by diagnosis
 
-# Mock Web Search Tool
+# Web Search Tool (provider and result cache configured in backend.web_search)
 def search_web_tool(query: str) -> List[Dict[str, Any]]:
-    # In a real app, this would call Google/Bing API
-    # For POC, we return a stub as requested
-    return [
-        {
-            "title": "Latest Guidelines on Post-Discharge Nephrology Care",
-            "snippet": "Recent studies suggest monitoring weight daily is crucial...",
-            "url": "https://medical-journal.example.com/nephrology"
-        }
-    ]
+    return search_web(query)
 
 # Nodes
+@profiled
+@timed("node", node="receptionist")
 def receptionist_node(state: AgentState) -> AgentState:
     user_input = state['user_input']
     messages = state['messages']
@@ -66,17 +75,20 @@ def receptionist_node(state: AgentState) -> AgentState:
         
         # Using Grok to decide action
         try:
-            llm_response = grok_generate(prompt)
+            llm_result = grok_complete(prompt)
+            llm_response = llm_result.text
             # Attempt to parse JSON. Grok might not return perfect JSON. 
             # We'll add a fallback.
             # For the POC, let's try to be robust.
-            if "{" in llm_response and "}" in llm_response:
+            if llm_result.ok and "{" in llm_response and "}" in llm_response:
                 json_str = llm_response[llm_response.find("{"):llm_response.rfind("}")+1]
                 decision = json.loads(json_str)
             else:
                 # Fallback logic
                 if len(user_input.split()) < 5:
                     decision = {"action": "lookup_patient", "name": user_input}
+                elif not llm_result.ok:
+                    decision = {"action": "chat", "response_text": "Could you please tell me the patient's name?"}
                 else:
                     decision = {"action": "chat", "response_text": llm_response}
         except:
@@ -90,6 +102,8 @@ def receptionist_node(state: AgentState) -> AgentState:
                 patient = patients[0] # Take first for now
                 state['patient_record'] = patient
                 state['patient_id'] = patient['patient_id']
+                # The next question is likely about this patient; start answering it now
+                speculate(state['session_id'], patient, speculative_clinical_answer)
                 
                 summary = f"Found report dated {patient['discharge_date']}. Diagnosis: {patient['primary_diagnosis']}. Meds: {patient['medications']}."
                 follow_up = "Are you experiencing swelling or reduced urine output?"
@@ -121,25 +135,28 @@ def receptionist_node(state: AgentState) -> AgentState:
         # If user says "swelling", "pain", etc -> Triage or Clinical.
         # Receptionist handles triage (urgent vs non-urgent) then hands off if clinical question.
         
-        prompt = f"{RECEPTIONIST_SYSTEM_PROMPT}\n\nPatient Context: {json.dumps(patient_record)}\nUser Input: {user_input}\n\nDetermine if this is an urgent triage situation, a general clinical question, or small talk. Return JSON: {{'type': 'urgent'|'clinical'|'chat', 'response': '...'}}"
+        prompt = f"{RECEPTIONIST_SYSTEM_PROMPT}\n\nPatient Context: {dumps(patient_record)}\nUser Input: {user_input}\n\nDetermine if this is an urgent triage situation, a general clinical question, or small talk. Return JSON: {{'type': 'urgent'|'clinical'|'chat', 'response': '...'}}"
         
         try:
-            llm_response = grok_generate(prompt)
-            if "{" in llm_response:
+            llm_result = grok_complete(prompt)
+            llm_response = llm_result.text
+            if llm_result.ok and "{" in llm_response:
                 json_str = llm_response[llm_response.find("{"):llm_response.rfind("}")+1]
                 analysis = json.loads(json_str)
             else:
-                # Fallback
-                if "swelling" in user_input.lower() or "pain" in user_input.lower():
+                # Fallback (also used when the LLM failed or its circuit is open): local triage rules
+                if is_urgent(user_input):
+                    analysis = {"type": "urgent"}
+                elif "swelling" in user_input.lower() or "pain" in user_input.lower():
                     analysis = {"type": "clinical"}
                 else:
-                    analysis = {"type": "chat", "response": llm_response}
+                    analysis = {"type": "chat", "response": llm_response if llm_result.ok else "I see."}
         except:
             analysis = {"type": "chat", "response": "I see."}
             
         if analysis.get('type') == 'urgent':
-            # Log urgent
-            logger.warning(f"URGENT EVENT: Session {state['session_id']} - {user_input}")
+            # Log urgent (durably, off the request path)
+            report_urgent_event(state['session_id'], user_input)
             state['agent_response'] = {
                 "answer_text": analysis.get('response', "Please go to the nearest emergency room immediately."),
                 "source_type": "System",
@@ -156,39 +173,86 @@ def receptionist_node(state: AgentState) -> AgentState:
 
     return state
 
-def clinical_node(state: AgentState) -> AgentState:
-    user_input = state['user_input']
-    patient_record = state.get('patient_record')
-    
-    # 1. Retrieve
+def build_clinical_query(user_input: str, patient_record: Optional[PatientRecord]) -> str:
     # Construct query with patient context if possible
-    query = user_input
     if patient_record:
-        query = f"{user_input} (Patient Diagnosis: {patient_record.get('primary_diagnosis')})"
-        
-    retrieved = retrieve(query)
-    
-    # 2. Generate
+        return f"{user_input} (Patient Diagnosis: {patient_record.get('primary_diagnosis')})"
+    return user_input
+
+def answer_clinical_question(user_input: str, retrieved: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Generates the clinical answer from retrieved chunks, falling back to web search
+    when the LLM signals the KB lacks the answer.
+    """
     result = generate_answer(user_input, retrieved, CLINICAL_SYSTEM_PROMPT)
     
-    # 3. Check for web search
     if result['source_type'] == 'Web':
-        # Perform web search
+        result = apply_web_fallback(user_input, result)
+    
+    return result
+
+def apply_web_fallback(user_input: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    # Perform web search
+    inc_counter("assistant_web_fallbacks_total")
+    try:
         web_results = search_web_tool(user_input)
-        
-        # Re-generate with web results
-        # We append web results to context
-        web_context = "\n".join([f"Web Source: {r['title']} - {r['snippet']}" for r in web_results])
-        
-        # Simple re-prompting logic
-        prompt = f"User asked: {user_input}. KB provided no results. Web search found:\n{web_context}\n\nAnswer the user based on these web results. Disclaimer: educational only."
-        new_answer = grok_generate(prompt)
-        
-        result['answer_text'] = new_answer
-        result['sources'] = web_results # Adjust structure if needed
-        result['source_type'] = 'Web'
-        
-    state['agent_response'] = result
+    except Exception as e:
+        logger.error(f"Web search failed: {e}")
+        web_results = []
+    
+    # Re-generate with web results
+    # We append web results to context
+    web_context = "\n".join([f"Web Source: {r['title']} - {r['snippet']}" for r in web_results])
+    
+    # Simple re-prompting logic
+    prompt = f"User asked: {user_input}. KB provided no results. Web search found:\n{web_context}\n\nAnswer the user based on these web results. Disclaimer: educational only."
+    llm_result = grok_complete(prompt)
+    
+    result['answer_text'] = llm_result.text
+    # The answer now comes from this call, so its outcome decides whether it may be cached
+    result['llm_outcome'] = llm_result.outcome
+    result['sources'] = web_results # Adjust structure if needed
+    result['source_type'] = 'Web'
+    return result
+
+def retrieve_clinical_context(user_input: str, patient_record: Optional[PatientRecord],
+                              kb: Optional[str] = None, bundle: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    # Uses the patient's precomputed context bundle when available (and built against the requested KB);
+    # callers already holding it pass bundle ({} for a patient without one)
+    if bundle is None and patient_record:
+        bundle = get_context_bundle(patient_record['patient_id'])
+    diagnosis = patient_record.get('primary_diagnosis') if patient_record else None
+    if bundle and (kb is None or kb == bundle.get('kb')):
+        return retrieve_for_patient(user_input, bundle)
+    kb = kb or kb_for_diagnosis(diagnosis)
+    topics = diagnosis_topics(diagnosis)
+    if topics:
+        # Scope the search to the diagnosis topics instead of appending it to the query text
+        return retrieve(user_input, topics=topics, kb=kb)
+    return retrieve(build_clinical_query(user_input, patient_record), kb=kb)
+
+def speculative_clinical_answer(question: str, patient_record: PatientRecord) -> Dict[str, Any]:
+    # Runs on a speculation worker; same retrieval and generation as clinical_node
+    return answer_clinical_question(question, retrieve_clinical_context(question, patient_record))
+
+@profiled
+@timed("node", node="clinical")
+def clinical_node(state: AgentState) -> AgentState:
+    user_input = state['user_input']
+    patient_record = state.get('patient_record')
+    
+    # 0. Answered ahead of time when the patient was identified
+    if state.get('kb') is None:
+        speculated = speculative_answer(state['session_id'], state.get('patient_id'), user_input)
+        if speculated:
+            state['agent_response'] = speculated
+            return state
+    
+    # 1. Retrieve
+    retrieved = retrieve_clinical_context(user_input, patient_record, state.get('kb'))
+    
+    # 2. Generate (3. web search fallback if needed)
+    state['agent_response'] = answer_clinical_question(user_input, retrieved)
     return state
 
 # Build Graph
@@ -196,8 +260,16 @@ workflow = StateGraph(AgentState)
 workflow.add_node("receptionist", receptionist_node)
 workflow.add_node("clinical", clinical_node)
 
-workflow.set_entry_point("receptionist")
+@timed("routing", edge="entry")
+def route_entry(state: AgentState):
+    # /agent/clinical enters the graph directly at the clinical node
+    if state.get('entry_point') == 'clinical':
+        return "clinical"
+    return "receptionist"
+
+workflow.set_conditional_entry_point(route_entry)
 
+@timed("routing", edge="receptionist")
 def route_receptionist(state: AgentState):
     if state.get('next_step') == 'clinical':
         return "clinical"
@@ -206,48 +278,186 @@ def route_receptionist(state: AgentState):
 workflow.add_conditional_edges("receptionist", route_receptionist)
 workflow.add_edge("clinical", END)
 
-app_graph = workflow.compile()
+# Durable checkpointer: each session_id is a LangGraph thread, so patient
+# context found on an earlier turn is resumed instead of rebuilt.
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "checkpoints.db")
+
+# Record types held in graph state, allowed through the checkpoint serializer
+CHECKPOINT_RECORD_TYPES = [(cls.__module__, cls.__name__) for cls in (PatientRecord, Chunk)]
+
+def get_checkpointer():
+    conn = sqlite3.connect(CHECKPOINT_DB_PATH, check_same_thread=False)
+    return SqliteSaver(conn, serde=JsonPlusSerializer(allowed_msgpack_modules=CHECKPOINT_RECORD_TYPES))
+
+checkpointer = get_checkpointer()
+app_graph = workflow.compile(checkpointer=checkpointer)
+
+def _thread_config(session_id: str) -> Dict:
+    return {"configurable": {"thread_id": session_id}}
+
+def prune_thread(session_id: str):
+    """
+    Drops all but the latest checkpoint (per namespace) of a session thread, with their
+    pending writes. Turns only resume from the latest one, and no channel in this graph
+    is a delta channel, so the older ones are never read.
+    """
+    with checkpointer.cursor() as cur:
+        cur.execute(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id NOT IN "
+            "(SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? GROUP BY checkpoint_ns)",
+            (session_id, session_id))
+        cur.execute(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_id NOT IN "
+            "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ?)",
+            (session_id, session_id))
 
-def run_receptionist_flow(session_id: str, message: str, patient_record: Optional[Dict] = None, history: List = []) -> Dict:
-    initial_state = {
+def delete_thread(session_id: str):
+    """
+    Removes a session thread's checkpoints once the session has ended or been evicted.
+    """
+    checkpointer.delete_thread(session_id)
+
+def get_thread_state(session_id: str) -> Dict[str, Any]:
+    """
+    Returns the stored state for a session thread (empty dict if none yet).
+    """
+    snapshot = app_graph.get_state(_thread_config(session_id))
+    return dict(snapshot.values) if snapshot and snapshot.values else {}
+
+def run_receptionist_flow(session_id: str, message: str, patient_record: Optional[PatientRecord] = None, history: Optional[List] = None) -> Dict:
+    # Only per-turn fields are passed in; patient context is resumed from the checkpoint.
+    turn_input = {
         "session_id": session_id,
-        "messages": history,
+        "messages": list(history or []),
         "user_input": message,
-        "patient_record": patient_record,
-        "patient_id": patient_record['patient_id'] if patient_record else None,
+        "entry_point": "receptionist",
+        "kb": None,
         "next_step": None,
         "agent_response": None
     }
+    if patient_record:
+        turn_input["patient_record"] = patient_record
+        turn_input["patient_id"] = patient_record['patient_id']
     
-    # We want to start at receptionist
-    # Since we compiled the graph, we can invoke it.
-    # However, the graph is stateless between runs unless we persist.
-    # Here we pass the full state in.
-    
-    final_state = app_graph.invoke(initial_state)
-    return final_state['agent_response']
+    final_state = app_graph.invoke(turn_input, _thread_config(session_id))
+    prune_thread(session_id)
+    response = dict(final_state['agent_response'])
+    # Return the resolved patient so callers don't need a second lookup
+    if final_state.get('patient_record'):
+        response['patient'] = final_state['patient_record']
+    return response
 
-def run_clinical_flow(session_id: str, message: str, patient_id: str, history: List = []) -> Dict:
-    # Fetch patient if not provided
-    from backend.patient_db import get_patient_by_id
-    patient_record = get_patient_by_id(patient_id)
-    
-    initial_state = {
+def load_patient(patient_id: str) -> Optional[PatientRecord]:
+    # Prefers the precomputed context bundle over a DB read
+    bundle = get_context_bundle(patient_id)
+    return bundle['patient'] if bundle else get_patient_by_id(patient_id)
+
+def _resolve_patient(session_id: str, patient_id: str) -> Tuple[bool, Optional[PatientRecord]]:
+    """
+    Returns (changed, record): changed is False if the session thread already holds this
+    patient's record. Otherwise record is the looked-up patient, or None if there is none,
+    which must still replace the thread's record for another patient.
+    """
+    cached = get_thread_state(session_id).get('patient_record')
+    if cached and cached.get('patient_id') == patient_id:
+        return False, None
+    return True, load_patient(patient_id)
+
+def run_clinical_flow(session_id: str, message: str, patient_id: str, history: Optional[List] = None,
+                      kb: Optional[str] = None) -> Dict:
+    turn_input = {
         "session_id": session_id,
-        "messages": history,
+        "messages": list(history or []),
         "user_input": message,
-        "patient_record": patient_record,
         "patient_id": patient_id,
+        "entry_point": "clinical",
+        "kb": kb,
         "next_step": None,
         "agent_response": None
     }
     
-    # We want to force run clinical. 
-    # But our graph starts at receptionist.
-    # We can create a subgraph or just call the node function directly for this specific endpoint requirement.
-    # The prompt says "POST /agent/clinical ... Runs RAG retrieval ...".
-    # So we can just call clinical_node directly or a specific graph that starts there.
+    changed, patient_record = _resolve_patient(session_id, patient_id)
+    if changed:
+        turn_input["patient_record"] = patient_record
     
-    # Let's just call the node logic directly to ensure we meet the endpoint requirement strictly.
-    final_state = clinical_node(initial_state)
+    final_state = app_graph.invoke(turn_input, _thread_config(session_id))
+    prune_thread(session_id)
     return final_state['agent_response']
+
+def stream_clinical_flow(session_id: str, message: str, patient_id: str, history: Optional[List] = None,
+                         kb: Optional[str] = None, patient_record: Optional[PatientRecord] = None,
+                         retrieve_fn: Optional[Callable[..., List[Chunk]]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming variant of run_clinical_flow. Yields events:
+    {"type": "token", "text"} while the answer is generated, then
+    {"type": "done", "answer_text", "sources", "source_type"} with the final answer.
+    The opening of the answer is held back until it can't be the web-search marker,
+    so a web fallback doesn't stream the marker first; the marker is only honoured there. A ready speculative answer
+    is sent as a single token event. Callers holding the patient (the WebSocket chat)
+    pass patient_record and their own retrieve_fn.
+    """
+    config = _thread_config(session_id)
+    if not patient_record or patient_record.get('patient_id') != patient_id:
+        patient_record = get_thread_state(session_id).get('patient_record')
+    if not patient_record or patient_record.get('patient_id') != patient_id:
+        patient_record = load_patient(patient_id)
+    result = speculative_answer(session_id, patient_id, message) if kb is None else None
+    if result:
+        yield {"type": "token", "text": result['answer_text']}
+    else:
+        result = yield from _stream_answer(message, patient_record, kb, retrieve_fn or retrieve_clinical_context)
+
+    # Record the turn in the session thread as if the clinical node had run
+    update = {
+        "session_id": session_id,
+        "messages": list(history or []),
+        "user_input": message,
+        "patient_id": patient_id,
+        "entry_point": "clinical",
+        "kb": kb,
+        "next_step": None,
+        "agent_response": result,
+        # None when patient_id has no record, so another patient's record isn't resumed
+        "patient_record": patient_record
+    }
+    app_graph.update_state(config, update, as_node="clinical")
+    prune_thread(session_id)
+
+    yield {"type": "done", **result}
+
+def _stream_answer(message: str, patient_record: Optional[PatientRecord], kb: Optional[str],
+                   retrieve_fn: Callable[..., List[Chunk]]) -> Iterator[Dict[str, Any]]:
+    """
+    Yields token events for a freshly generated answer and returns the result dict.
+    """
+    retrieved = retrieve_fn(message, patient_record, kb)
+    prompt = build_rag_prompt(message, retrieved, CLINICAL_SYSTEM_PROMPT)
+
+    pieces = []
+    pending = ""
+    holding = True
+    web = False
+    llm = {}
+    for piece in grok_generate_stream(prompt, outcome=llm):
+        pieces.append(piece)
+        if holding:
+            pending += piece
+            web = starts_with_web_search_marker(pending)
+            if web is None:
+                continue
+            holding = False
+            if not web:
+                yield {"type": "token", "text": pending}
+        elif not web:
+            yield {"type": "token", "text": piece}
+
+    answer_text = "".join(pieces)
+    result = {"answer_text": answer_text, "sources": retrieved, "source_type": "KB", "llm_outcome": llm["result"].outcome}
+    # Only honoured at the start: once the answer has been streamed it can't be taken back
+    if web or (holding and starts_with_web_search_marker(answer_text)):
+        result['source_type'] = 'Web'
+        result = apply_web_fallback(message, result)
+        yield {"type": "token", "text": result['answer_text']}
+    elif holding and pending:
+        yield {"type": "token", "text": pending}
+    return result
@@ -0,0 +1,318 @@
+import os
+import sys
+import queue
+import atexit
+import time
+import sqlite3
+import logging
+import threading
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from typing import List, Dict, Optional, Any
+from backend.codec import dumps
+from backend.memory import register_memory_component, estimate_items
+
+LOG_FILE = os.getenv("LOG_FILE", "./logs/app.log")
+LOG_DB_PATH = os.getenv("LOG_DB_PATH", "./logs/logs.db")
+# Retention for the SQLite log store: rows older than LOG_DB_RETENTION_DAYS, and the oldest
+# rows beyond LOG_DB_MAX_ROWS, are deleted every LOG_DB_PRUNE_SECONDS (0 disables either limit)
+LOG_DB_RETENTION_DAYS = float(os.getenv("LOG_DB_RETENTION_DAYS", "7"))
+LOG_DB_MAX_ROWS = int(os.getenv("LOG_DB_MAX_ROWS", "1000000"))
+LOG_DB_PRUNE_SECONDS = float(os.getenv("LOG_DB_PRUNE_SECONDS", "600"))
+# Inserts are committed in batches: every LOG_DB_COMMIT_EVERY records, or after at most
+# LOG_DB_COMMIT_SECONDS, so a burst of records doesn't pay for a commit each
+LOG_DB_COMMIT_EVERY = int(os.getenv("LOG_DB_COMMIT_EVERY", "100"))
+LOG_DB_COMMIT_SECONDS = float(os.getenv("LOG_DB_COMMIT_SECONDS", "1"))
+# Rows deleted per statement when pruning, so the listener isn't held up for long
+LOG_DB_PRUNE_CHUNK = 5000
+
+# Request-scoped fields attached to every log record emitted while handling a request
+session_id_var = contextvars.ContextVar("session_id", default=None)
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+_listener = None
+
+def bind_log_context(session_id: Optional[str] = None, request_id: Optional[str] = None):
+    if session_id is not None:
+        session_id_var.set(session_id)
+    if request_id is not None:
+        request_id_var.set(request_id)
+
+class ContextFilter(logging.Filter):
+    """
+    Copies session_id/request_id from the request context onto the record.
+    Runs on the emitting thread, before the record is queued.
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "session_id", None) is None:
+            record.session_id = session_id_var.get()
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return dumps(record_to_dict(record))
+
+def record_to_dict(record: logging.LogRecord) -> Dict[str, Any]:
+    entry = {
+        "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+        "level": record.levelname,
+        "logger": record.name,
+        "message": record.getMessage(),
+        "session_id": getattr(record, "session_id", None),
+        "request_id": getattr(record, "request_id", None),
+    }
+    if record.exc_text:
+        entry["exc_info"] = record.exc_text
+    return entry
+
+class SQLiteLogHandler(logging.Handler):
+    """
+    Writes log records to an indexed SQLite table.
+    Only used behind the QueueListener, so inserts happen off the request thread.
+    Inserts are committed in batches; a maintenance thread commits stragglers and
+    prunes rows past the retention limits.
+    """
+    def __init__(self, db_path: str = LOG_DB_PATH, retention_days: float = LOG_DB_RETENTION_DAYS,
+                 max_rows: int = LOG_DB_MAX_ROWS, commit_every: int = LOG_DB_COMMIT_EVERY):
+        super().__init__()
+        self.db_path = db_path
+        self.retention_days = retention_days
+        self.max_rows = max_rows
+        self.commit_every = commit_every
+        self._conn = None
+        self._uncommitted = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _get_conn(self):
+        if self._conn is None:
+            self._conn = get_log_db_connection(self.db_path)
+            init_log_db(self._conn)
+        return self._conn
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            conn = self._get_conn()
+            conn.execute(
+                "INSERT INTO logs (ts, level, logger, message, session_id, request_id) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    record.created,
+                    record.levelname,
+                    record.name,
+                    record.getMessage(),
+                    getattr(record, "session_id", None),
+                    getattr(record, "request_id", None),
+                )
+            )
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self._commit()
+        except Exception:
+            self.handleError(record)
+
+    def _commit(self):
+        self._conn.commit()
+        self._uncommitted = 0
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self._conn is not None and self._uncommitted:
+                self._commit()
+        finally:
+            self.release()
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """
+        Deletes rows older than the retention period and the oldest rows beyond max_rows.
+        Returns the number of rows deleted.
+        """
+        now = time.time() if now is None else now
+        deleted = 0
+        if self.retention_days > 0:
+            cutoff = now - self.retention_days * 86400
+            deleted += self._delete_chunked(
+                "DELETE FROM logs WHERE id IN (SELECT id FROM logs WHERE ts < ? LIMIT ?)", (cutoff,))
+        if self.max_rows > 0:
+            # ids only increase, so everything at or below max(id) - max_rows is the oldest excess
+            deleted += self._delete_chunked(
+                "DELETE FROM logs WHERE id IN (SELECT id FROM logs WHERE id <= "
+                "(SELECT MAX(id) FROM logs) - ? LIMIT ?)", (self.max_rows,))
+        return deleted
+
+    def _delete_chunked(self, sql: str, params: tuple) -> int:
+        deleted = 0
+        while True:
+            # The lock is released between chunks so queued records keep being written
+            self.acquire()
+            try:
+                conn = self._get_conn()
+                count = conn.execute(sql, params + (LOG_DB_PRUNE_CHUNK,)).rowcount
+                self._commit()
+            finally:
+                self.release()
+            deleted += count
+            if count < LOG_DB_PRUNE_CHUNK:
+                return deleted
+
+    def start_maintenance(self, commit_seconds: float = LOG_DB_COMMIT_SECONDS,
+                          prune_seconds: float = LOG_DB_PRUNE_SECONDS):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._maintain, args=(commit_seconds, prune_seconds),
+                                        daemon=True, name="log-store-maintenance")
+        self._thread.start()
+
+    def _maintain(self, commit_seconds: float, prune_seconds: float):
+        # Prune once at startup, then every prune_seconds
+        next_prune = time.monotonic()
+        while not self._stop.wait(commit_seconds):
+            try:
+                self.flush()
+                if prune_seconds > 0 and time.monotonic() >= next_prune:
+                    next_prune = time.monotonic() + prune_seconds
+                    self.prune()
+            except Exception as e:
+                # Logging from here would queue back into this handler
+                print(f"Log store maintenance failed: {e}", file=sys.stderr)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.acquire()
+        try:
+            if self._conn is not None:
+                if self._uncommitted:
+                    self._commit()
+                self._conn.close()
+                self._conn = None
+        finally:
+            self.release()
+        super().close()
+
+def get_log_db_connection(db_path: str = LOG_DB_PATH):
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def init_log_db(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL,
+            level TEXT,
+            logger TEXT,
+            message TEXT,
+            session_id TEXT,
+            request_id TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_session_ts ON logs (session_id, ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs (ts)")
+    conn.commit()
+
+def setup_logging(level: int = logging.INFO):
+    """
+    Routes all logging through a queue. A background listener thread writes
+    JSON lines to the rotating log file, the console and the SQLite log store.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    os.makedirs(os.path.dirname(LOG_DB_PATH), exist_ok=True)
+
+    json_formatter = JsonFormatter()
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=1000000, backupCount=5)
+    file_handler.setFormatter(json_formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(json_formatter)
+    db_handler = SQLiteLogHandler(LOG_DB_PATH)
+
+    log_queue = queue.Queue(-1)
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers = [queue_handler]
+
+    _listener = QueueListener(log_queue, file_handler, stream_handler, db_handler, respect_handler_level=True)
+    _listener.start()
+    db_handler.start_maintenance()
+    atexit.register(shutdown_logging)
+    register_memory_component("log_queue", log_queue_bytes)
+
+def log_queue_bytes() -> int:
+    """
+    Records waiting for the listener thread.
+    """
+    listener = _listener
+    if listener is None:
+        return 0
+    return estimate_items(list(listener.queue.queue))
+
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        # Flushes queued records before the handlers are closed
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+def query_logs(session_id: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+               limit: int = 100, offset: int = 0) -> List[Dict]:
+    """
+    Returns log entries newest first, filtered by session and time range (epoch seconds).
+    """
+    clauses = []
+    params = []
+    if session_id:
+        clauses.append("session_id = ?")
+        params.append(session_id)
+    if since is not None:
+        clauses.append("ts >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("ts < ?")
+        params.append(until)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    params.extend([limit, offset])
+
+    conn = get_log_db_connection()
+    try:
+        init_log_db(conn)
+        rows = conn.execute(
+            f"SELECT ts, level, logger, message, session_id, request_id FROM logs {where} ORDER BY ts DESC LIMIT ? OFFSET ?",
+            params
+        ).fetchall()
+    finally:
+        conn.close()
+
+    results = []
+    for row in rows:
+        res = dict(row)
+        res['timestamp'] = datetime.fromtimestamp(res.pop('ts'), tz=timezone.utc).isoformat()
+        results.append(res)
+    return results
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """
+    Accepts epoch seconds or an ISO-8601 timestamp; naive timestamps are treated as UTC.
+    """
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
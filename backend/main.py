@@ -1,30 +1,52 @@
+import os
 import logging
-from logging.handlers import RotatingFileHandler
 import uuid
-import os
-from typing import Optional, List, Dict
-from fastapi import FastAPI, HTTPException, Query
+import threading
+import math
+import time
+from datetime import date, timedelta
+from typing import Any, Optional, List, Dict, Union
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from backend.patient_db import find_patient_by_name, list_patients
-from backend.langgraph_agents import run_receptionist_flow, run_clinical_flow, search_web_tool
-
-# Setup Logging
-LOG_FILE = "./logs/app.log"
-os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        RotatingFileHandler(LOG_FILE, maxBytes=1000000, backupCount=5),
-        logging.StreamHandler()
-    ]
+from fastapi.responses import PlainTextResponse, StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
+from starlette.websockets import WebSocketState
+from pydantic import BaseModel, ValidationError
+from backend.log_store import setup_logging, bind_log_context, query_logs, parse_time, request_id_var
+from backend.metrics import observe, inc_counter, render_metrics, start_trace, end_trace, server_timing_header, HTTP_LATENCY
+from backend.patient_db import find_patient_by_name, list_patients, query_cohort
+from backend.cohort import query_snapshot
+from backend.langgraph_agents import run_receptionist_flow, run_clinical_flow, stream_clinical_flow, load_patient, delete_thread
+from backend.web_search import asearch_web
+from backend.history import SessionHistory, SessionStore
+from backend.grok_wrapper import LLM_OK, LLM_MOCK
+from backend.admission import (
+    Overloaded, AnswerCache, PRIORITY_URGENT, PRIORITY_NORMAL, URGENT_TRIAGE_RESPONSE,
+    is_urgent, report_urgent_event, get_admission_controller, get_rate_limiter, get_answer_cache
 )
+from backend.compression import CompressionMiddleware
+from backend.capture import TrafficCaptureMiddleware, CAPTURE_ENABLED
+from backend.profiling import profile_trigger, start_profile, finish_profile, profiled, get_profile_store
+from backend.rag import get_chunk, list_kbs, warm_kb, DEFAULT_KB
+from backend.batch import parse_jsonl, run_clinical_batch, run_checkpointed_batch, job_checkpoint_path
+from backend.codec import dumps, dumps_bytes, loads
+from backend.records import Record, PatientRecord, ReceptionistResponse, ClinicalResponse
+from backend.chat_socket import ChatContext, EventChannel, ChannelClosed
+from backend.speculation import cancel_speculation
+from backend.tasks import run_in_background, get_durable_queue
+from backend.memory import get_memory_budget, register_memory_component, format_memory_report
+
+# Setup Logging (JSON records written by a background queue listener)
+setup_logging()
 logger = logging.getLogger("api")
 
 app = FastAPI(title="Post-Discharge Medical AI Assistant")
 
+# Comma-separated KBs whose indexes are loaded at startup
+KB_PRELOAD = [kb.strip() for kb in os.getenv("KB_PRELOAD", "").split(",") if kb.strip()]
+
+app.add_middleware(CompressionMiddleware, minimum_size=1000)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -33,6 +55,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Registered before request_context so it runs inside it, with the request id bound
+@app.middleware("http")
+async def request_profiling(request: Request, call_next):
+    trigger = profile_trigger(request.url.path, request.headers.get("X-Profile") or request.query_params.get("profile"))
+    if trigger is None:
+        return await call_next(request)
+    profile = start_profile(request_id_var.get() or uuid.uuid4().hex, request.url.path, trigger)
+    try:
+        response = await call_next(request)
+    finally:
+        await run_in_threadpool(finish_profile, profile)
+    response.headers["X-Profile-ID"] = profile.profile_id
+    return response
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    bind_log_context(request_id=request_id)
+    # Opt-in tracing: spans from each instrumented stage are returned as Server-Timing
+    spans = start_trace() if request.headers.get("X-Trace") == "1" else None
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        end_trace()
+    route = request.scope.get("route")
+    observe(HTTP_LATENCY, time.perf_counter() - start, route=route.path if route else "unmatched")
+    response.headers["X-Request-ID"] = request_id
+    if spans:
+        response.headers["Server-Timing"] = server_timing_header(spans)
+        logger.info(f"Trace {request_id}: {dumps(spans)}")
+    return response
+
+# Opt-in traffic capture for replay; outermost so it sees the final status and X-Request-ID
+if CAPTURE_ENABLED:
+    app.add_middleware(TrafficCaptureMiddleware)
+
 # Models
 class SessionStartResponse(BaseModel):
     session_id: str
@@ -46,24 +105,56 @@ class ClinicalRequest(BaseModel):
     session_id: str
     patient_id: str
     question: str
+    # Named KB to answer from; by default chosen from the patient's diagnosis
+    kb: Optional[str] = None
+    # Response shaping: chunk text is omitted unless requested (fetch lazily via /kb/chunk/{chunk_id})
+    include_text: bool = False
+    fields: Optional[List[str]] = None
+    sources_offset: int = 0
+    sources_limit: Optional[int] = None
 
-class AgentResponse(BaseModel):
-    answer_text: str
-    sources: List[Dict] = []
-    source_type: str
-    session_id: str
-    timestamp: Optional[str] = None
+class FastJSONResponse(Response):
+    """
+    JSON response encoded by backend.codec straight from dicts and records,
+    skipping FastAPI's jsonable_encoder pass.
+    """
+    media_type = "application/json"
 
-# In-memory session store for history (simple)
-sessions = {}
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
+
+def release_session(session_id: str):
+    """
+    Drops what a session holds outside the session store: background answers and its
+    graph checkpoints.
+    """
+    cancel_speculation(session_id)
+    try:
+        delete_thread(session_id)
+    except Exception as e:
+        logger.error(f"Could not delete checkpoints for session {session_id}: {e}")
+
+# In-memory session store, bounded by SESSION_MAX and the memory budget
+sessions = SessionStore(on_evict=release_session)
+# Evicted last: dropping a session loses its conversation
+register_memory_component("sessions", sessions.size_bytes, sessions.evict, priority=90)
 
 @app.post("/session/start", response_model=SessionStartResponse)
 def start_session():
     session_id = str(uuid.uuid4())
-    sessions[session_id] = {"history": [], "patient_id": None}
+    sessions[session_id] = {"history": SessionHistory(), "patient_id": None}
+    bind_log_context(session_id=session_id)
     logger.info(f"Session started: {session_id}")
     return {"session_id": session_id, "message": "Session initialized."}
 
+@app.delete("/session/{session_id}")
+def end_session(session_id: str):
+    if sessions.pop(session_id, None) is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    release_session(session_id)
+    logger.info(f"Session ended: {session_id}")
+    return {"session_id": session_id, "message": "Session ended."}
+
 @app.get("/patient")
 def get_patient(name: str = Query(...)):
     logger.info(f"Searching for patient: {name}")
@@ -72,80 +163,520 @@ def get_patient(name: str = Query(...)):
         raise HTTPException(status_code=404, detail="Patient not found")
     if len(results) > 1:
         # For simplicity, return list but warn
-        return {"status": "multiple_matches", "matches": results}
-    return results[0]
+        return FastJSONResponse({"status": "multiple_matches", "matches": results})
+    return FastJSONResponse(results[0])
+
+@app.get("/cohort")
+def get_cohort(
+    diagnosis: Optional[str] = None,
+    medication: Optional[str] = None,
+    warning_sign: Optional[str] = None,
+    discharged_since: Optional[str] = None,
+    discharged_until: Optional[str] = None,
+    last_days: Optional[int] = Query(None, ge=0),
+    source: str = Query("db", pattern="^(db|snapshot)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Cohort filters, e.g. ?diagnosis=Acute kidney injury&last_days=30 or ?medication=Furosemide.
+    source=db uses indexed SQLite queries; source=snapshot scans the Parquet export.
+    """
+    if last_days is not None:
+        discharged_since = (date.today() - timedelta(days=last_days)).isoformat()
+    filters = dict(diagnosis=diagnosis, medication=medication, warning_sign=warning_sign,
+                   discharged_since=discharged_since, discharged_until=discharged_until,
+                   limit=limit, offset=offset)
+    if source == "snapshot":
+        try:
+            patients = query_snapshot(**filters)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="No patient snapshot. Run scripts/export_patient_snapshot.py first.")
+    else:
+        patients = query_cohort(**filters)
+    return {"patients": patients, "count": len(patients), "limit": limit, "offset": offset}
+
+def check_rate_limit(session_id: str, endpoint: str, urgent: bool):
+    # Urgent triage has its own, more generous bucket
+    wait = get_rate_limiter(urgent).check(session_id)
+    if wait > 0:
+        inc_counter("assistant_requests_shed_total", endpoint=endpoint,
+                    reason="urgent_rate_limit" if urgent else "rate_limit")
+        raise HTTPException(status_code=429, detail="Too many requests for this session",
+                            headers={"Retry-After": str(max(1, math.ceil(wait)))})
+
+def overloaded_error(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=503, detail="Assistant is overloaded, please retry",
+                         headers={"Retry-After": str(e.retry_after)})
+
+def get_session(session_id: str) -> Dict[str, Any]:
+    """
+    The session, looked up once per request: handlers pass it on rather than indexing
+    the store again, since the memory budget may evict it in between.
+    """
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
+
+def triage_rule_response(session: Dict[str, Any], session_id: str, message: str, endpoint: str) -> Dict:
+    """
+    Degraded-mode answer for an urgent message when the LLM is saturated.
+    """
+    report_urgent_event(session_id, message, degraded=True)
+    inc_counter("assistant_degraded_responses_total", endpoint=endpoint, source="triage_rules")
+    session["history"].append_turn(message, URGENT_TRIAGE_RESPONSE)
+    return {"answer_text": URGENT_TRIAGE_RESPONSE, "sources": [], "source_type": "System", "degraded": True}
+
+@profiled
+def receptionist_turn(req: MessageRequest, session: Dict[str, Any]) -> ReceptionistResponse:
+    history = session["history"]
+    
+    # Patient context is resumed from the session's graph checkpoint
+    response = run_receptionist_flow(req.session_id, req.message, history=history.as_messages())
+    
+    # Remember the patient resolved by the receptionist for this session
+    patient = response.get('patient')
+    if patient:
+        session["patient_id"] = patient['patient_id']
+    
+    # Update history (older turns are summarized in the background)
+    history.append_turn(req.message, response['answer_text'])
+    
+    return ReceptionistResponse(
+        answer_text=response['answer_text'],
+        sources=response.get('sources', []),
+        source_type=response.get('source_type', 'System'),
+        patient=patient,
+        session_id=req.session_id,
+        timestamp="2025-11-20T12:00:00+05:30" # Mock timestamp
+    )
 
 @app.post("/agent/receptionist")
-def agent_receptionist(req: MessageRequest):
+async def agent_receptionist(req: MessageRequest):
+    bind_log_context(session_id=req.session_id)
     logger.info(f"Receptionist Agent called. Session: {req.session_id}, Message: {req.message}")
     
-    if req.session_id not in sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
-        
-    history = sessions[req.session_id]["history"]
+    session = get_session(req.session_id)
+    urgent = is_urgent(req.message)
+    check_rate_limit(req.session_id, "receptionist", urgent)
     
-    # Get current patient context if any
-    patient_id = sessions[req.session_id].get("patient_id")
-    patient_record = None
-    if patient_id:
-        from backend.patient_db import get_patient_by_id
-        patient_record = get_patient_by_id(patient_id)
+    try:
+        async with get_admission_controller("receptionist").admit(PRIORITY_URGENT if urgent else PRIORITY_NORMAL):
+            return FastJSONResponse(await run_in_threadpool(receptionist_turn, req, session))
+    except Overloaded as e:
+        if not urgent:
+            raise overloaded_error(e)
+        triage = triage_rule_response(session, req.session_id, req.message, "receptionist")
+        return FastJSONResponse(ReceptionistResponse(**triage, session_id=req.session_id))
+
+@app.on_event("startup")
+def start_durable_tasks():
+    # Delivers durable tasks left over from a previous run
+    try:
+        get_durable_queue().start()
+    except Exception as e:
+        logger.error(f"Failed to start durable task queue: {e}")
 
-    response = run_receptionist_flow(req.session_id, req.message, patient_record, history)
+@app.on_event("startup")
+def start_memory_budget():
+    logger.info(f"Memory at startup: {format_memory_report(get_memory_budget().report())}")
+    get_memory_budget().start()
+
+@app.on_event("startup")
+def preload_kbs():
+    # Warm in the background so startup isn't blocked on loading indexes
+    def warm():
+        for kb in KB_PRELOAD:
+            try:
+                warm_kb(kb)
+            except Exception as e:
+                logger.error(f"Failed to warm KB '{kb}': {e}")
+        # The model and indexes are loaded now
+        logger.info(f"Memory after KB preload: {format_memory_report(get_memory_budget().report())}")
+    if KB_PRELOAD:
+        threading.Thread(target=warm, daemon=True, name="kb-preload").start()
+
+def check_kb(kb: Optional[str]):
+    # Unknown names are rejected rather than creating an empty collection
+    if kb and kb not in list_kbs():
+        raise HTTPException(status_code=404, detail=f"Unknown knowledge base: {kb}")
+
+@app.get("/kb")
+def get_kbs():
+    return {"kbs": list_kbs(), "default": DEFAULT_KB}
+
+def answer_cache_key(req: ClinicalRequest, patient: Optional[PatientRecord] = None) -> tuple:
+    patient = patient or load_patient(req.patient_id)
+    return AnswerCache.key(req.question, patient.get('primary_diagnosis') if patient else None, req.kb)
+
+def cache_clinical_answer(req: ClinicalRequest, response: Dict, patient: Optional[PatientRecord] = None):
+    # Fallback answers from a failed LLM call are not kept for degraded mode
+    if response.get('llm_outcome') not in (LLM_OK, LLM_MOCK):
+        return
+    get_answer_cache().put(answer_cache_key(req, patient), {
+        "answer_text": response['answer_text'],
+        "sources": response.get('sources', []),
+        "source_type": response.get('source_type', 'KB'),
+    })
+
+def degraded_clinical_answer(req: ClinicalRequest, session: Dict[str, Any], urgent: bool, endpoint: str) -> Optional[Dict]:
+    """
+    Answer served when the clinical endpoint is saturated: triage rules for urgent
+    questions, else a cached answer to the same question for the same diagnosis.
+    """
+    if urgent:
+        return triage_rule_response(session, req.session_id, req.question, endpoint)
+    cached = get_answer_cache().get(answer_cache_key(req))
+    if cached is None:
+        return None
+    inc_counter("assistant_degraded_responses_total", endpoint=endpoint, source="answer_cache")
+    session["history"].append_turn(req.question, cached['answer_text'])
+    return dict(cached, degraded=True)
+
+@profiled
+def clinical_turn(req: ClinicalRequest, session: Dict[str, Any]) -> Union[ClinicalResponse, Dict]:
+    history = session["history"]
     
-    # Update history
-    history.append({"role": "user", "content": req.message})
-    history.append({"role": "assistant", "content": response['answer_text']})
+    response = run_clinical_flow(req.session_id, req.question, req.patient_id, history.as_messages(), req.kb)
+    session["patient_id"] = req.patient_id
     
+    history.append_turn(req.question, response['answer_text'])
+    run_in_background(cache_clinical_answer, req, response)
     
-    return {
-        "answer_text": response['answer_text'],
-        "sources": response.get('sources', []),
-        "source_type": response.get('source_type', 'System'),
-        "session_id": req.session_id,
-        "timestamp": "2025-11-20T12:00:00+05:30" # Mock timestamp
-    }
+    return shape_clinical_response(ClinicalResponse(
+        answer_text=response['answer_text'],
+        sources=response.get('sources', []),
+        source_type=response.get('source_type', 'KB'),
+        session_id=req.session_id,
+        timestamp="2025-11-20T12:00:00+05:30"
+    ), req)
 
 @app.post("/agent/clinical")
-def agent_clinical(req: ClinicalRequest):
-    logger.info(f"Clinical Agent called. Session: {req.session_id}, Patient: {req.patient_id}, Q: {req.question}")
+async def agent_clinical(req: ClinicalRequest):
+    bind_log_context(session_id=req.session_id)
+    logger.info(f"Clinical Agent called. Session: {req.session_id}, Patient: {req.patient_id}, KB: {req.kb}, Q: {req.question}")
     
-    if req.session_id not in sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
+    session = get_session(req.session_id)
+    await run_in_threadpool(check_kb, req.kb)
+    urgent = is_urgent(req.question)
+    check_rate_limit(req.session_id, "clinical", urgent)
+    
+    try:
+        async with get_admission_controller("clinical").admit(PRIORITY_URGENT if urgent else PRIORITY_NORMAL):
+            return FastJSONResponse(await run_in_threadpool(clinical_turn, req, session))
+    except Overloaded as e:
+        degraded = await run_in_threadpool(degraded_clinical_answer, req, session, urgent, "clinical")
+        if degraded is None:
+            raise overloaded_error(e)
+        return FastJSONResponse(shape_clinical_response(ClinicalResponse(**degraded, session_id=req.session_id), req))
+
+# Keys of a clinical result that are part of the response; others (llm_outcome) are internal
+CLINICAL_RESPONSE_FIELDS = frozenset(ClinicalResponse.__dataclass_fields__)
+
+def clinical_response(result: Dict, session_id: str) -> ClinicalResponse:
+    """
+    The response record for a clinical result dict (streamed "done" events, degraded answers),
+    so every endpoint returns the same fields as /agent/clinical.
+    """
+    return ClinicalResponse(**{k: v for k, v in result.items() if k in CLINICAL_RESPONSE_FIELDS and k != "session_id"},
+                            session_id=session_id)
+
+def shape_clinical_response(payload: Union[ClinicalResponse, Dict], req: ClinicalRequest) -> Union[ClinicalResponse, Dict]:
+    """
+    Applies the request's shaping options: drops chunk text unless include_text,
+    pages the sources list, and keeps only the requested top-level fields.
+    Works on a ClinicalResponse or a plain dict.
+    """
+    sources = payload.get("sources", [])
+    payload["sources_total"] = len(sources)
+    end = req.sources_offset + req.sources_limit if req.sources_limit is not None else None
+    sources = sources[req.sources_offset:end]
+    if not req.include_text:
+        sources = [{k: v for k, v in src.items() if k != "text"} for src in sources]
+    payload["sources"] = sources
+    if req.fields:
+        payload = {k: v for k, v in payload.items() if k in req.fields}
+    return payload
+
+@app.post("/agent/clinical/stream")
+async def agent_clinical_stream(req: ClinicalRequest):
+    """
+    Streams the clinical answer as JSONL events: {"type": "token", "text"} pieces,
+    then {"type": "done", ...} with the full answer, sources and source_type.
+    Shares the clinical endpoint's admission queue; the slot is held until the stream ends.
+    """
+    bind_log_context(session_id=req.session_id)
+    logger.info(f"Clinical Agent (stream) called. Session: {req.session_id}, Patient: {req.patient_id}, Q: {req.question}")
+    
+    session = get_session(req.session_id)
+    await run_in_threadpool(check_kb, req.kb)
+    urgent = is_urgent(req.question)
+    check_rate_limit(req.session_id, "clinical", urgent)
         
-    history = sessions[req.session_id]["history"]
+    history = session["history"]
+    controller = get_admission_controller("clinical")
     
-    response = run_clinical_flow(req.session_id, req.question, req.patient_id, history)
+    try:
+        await controller.acquire(PRIORITY_URGENT if urgent else PRIORITY_NORMAL)
+    except Overloaded as e:
+        degraded = await run_in_threadpool(degraded_clinical_answer, req, session, urgent, "clinical")
+        if degraded is None:
+            raise overloaded_error(e)
+        done = dict(shape_clinical_response(clinical_response(degraded, req.session_id), req), type="done")
+        lines = [dumps({"type": "token", "text": degraded['answer_text']}) + "\n", dumps(done) + "\n"]
+        return StreamingResponse(iter(lines), media_type="application/x-ndjson")
     
-    history.append({"role": "user", "content": req.question})
-    history.append({"role": "assistant", "content": response['answer_text']})
+    def events():
+        for event in stream_clinical_flow(req.session_id, req.question, req.patient_id, history.as_messages(), req.kb):
+            if event["type"] == "done":
+                history.append_turn(req.question, event['answer_text'])
+                session["patient_id"] = req.patient_id
+                run_in_background(cache_clinical_answer, req, event)
+                event = dict(shape_clinical_response(clinical_response(event, req.session_id), req), type="done")
+            yield dumps(event) + "\n"
     
-    return {
-        "answer_text": response['answer_text'],
-        "sources": response.get('sources', []),
-        "source_type": response.get('source_type', 'KB'),
-        "session_id": req.session_id,
-        "timestamp": "2025-11-20T12:00:00+05:30"
-    }
+    async def admitted_events():
+        start = time.perf_counter()
+        try:
+            async for line in iterate_in_threadpool(events()):
+                yield line
+        finally:
+            controller.release(time.perf_counter() - start)
+    
+    return StreamingResponse(admitted_events(), media_type="application/x-ndjson")
+
+# Per-turn request options accepted over the WebSocket chat, as in ClinicalRequest
+CHAT_CLINICAL_OPTIONS = ("kb", "include_text", "fields", "sources_offset", "sources_limit")
+
+def error_event(status: int, detail: str, retry_after: Optional[str] = None) -> Dict:
+    event = {"type": "error", "status": status, "detail": detail}
+    if retry_after:
+        event["retry_after"] = int(retry_after)
+    return event
+
+def http_error_event(e: HTTPException) -> Dict:
+    return error_event(e.status_code, e.detail, (e.headers or {}).get("Retry-After"))
+
+def done_event(agent: str, response: Union[Record, Dict]) -> Dict:
+    payload = response.to_dict() if isinstance(response, Record) else dict(response)
+    return dict(payload, type="done", agent=agent)
+
+def chat_receptionist_turn(chat: ChatContext, message: str) -> ReceptionistResponse:
+    response = receptionist_turn(MessageRequest(session_id=chat.session_id, message=message), chat.session)
+    chat.pin_patient(response.patient)
+    return response
+
+def chat_clinical_turn(chat: ChatContext, channel: EventChannel, req: ClinicalRequest) -> Union[ClinicalResponse, Dict]:
+    """
+    A streamed clinical turn using the connection's pinned patient, bundle and retrieval cache.
+    Token events are pushed as they arrive; the shaped final response is returned.
+    """
+    done = None
+    for event in stream_clinical_flow(req.session_id, req.question, req.patient_id, chat.history.as_messages(),
+                                      req.kb, patient_record=chat.patient, retrieve_fn=chat.retrieve):
+        if event["type"] == "done":
+            done = {k: v for k, v in event.items() if k != "type"}
+        else:
+            channel.put(event)
+    chat.history.append_turn(req.question, done['answer_text'])
+    chat.session["patient_id"] = req.patient_id
+    run_in_background(cache_clinical_answer, req, done, chat.patient)
+    return shape_clinical_response(clinical_response(done, req.session_id), req)
+
+async def chat_turn(chat: ChatContext, channel: EventChannel, data: Dict):
+    """
+    One WebSocket chat message: routed to the receptionist until a patient is identified
+    (and for urgent messages), else to the clinical agent, unless "agent" names one.
+    Goes through the same rate limits and admission queues as the REST endpoints.
+    """
+    message = data.get("message") if isinstance(data, dict) else None
+    if not isinstance(message, str) or not message.strip():
+        await channel.send(error_event(400, "Expected a JSON object with a non-empty \"message\""))
+        return
+    if chat.session_id not in sessions:
+        await channel.send(error_event(404, "Session not found"))
+        raise ChannelClosed()
+    logger.info(f"WebSocket chat message. Session: {chat.session_id}, Message: {message}")
+
+    urgent = is_urgent(message)
+    if urgent:
+        # Pushed before the agent runs; the full answer follows
+        await channel.send({"type": "alert", "level": "urgent", "text": URGENT_TRIAGE_RESPONSE})
+    agent = data.get("agent") or ("receptionist" if chat.patient is None or urgent else "clinical")
+    req = None
+    try:
+        if agent not in ("receptionist", "clinical"):
+            raise HTTPException(status_code=400, detail=f"Unknown agent: {agent}")
+        check_rate_limit(chat.session_id, agent, urgent)
+        if agent == "clinical":
+            if chat.patient is None:
+                raise HTTPException(status_code=400, detail="No patient identified in this session yet")
+            req = ClinicalRequest(session_id=chat.session_id, patient_id=chat.patient_id, question=message,
+                                  **{k: data[k] for k in CHAT_CLINICAL_OPTIONS if k in data})
+            await run_in_threadpool(check_kb, req.kb)
+    except HTTPException as e:
+        await channel.send(http_error_event(e))
+        return
+    except ValidationError as e:
+        await channel.send(error_event(400, str(e)))
+        return
+
+    try:
+        async with get_admission_controller(agent).admit(PRIORITY_URGENT if urgent else PRIORITY_NORMAL):
+            if agent == "receptionist":
+                response = await run_in_threadpool(chat_receptionist_turn, chat, message)
+            else:
+                response = await run_in_threadpool(chat_clinical_turn, chat, channel, req)
+    except Overloaded as e:
+        if agent == "receptionist":
+            if not urgent:
+                await channel.send(http_error_event(overloaded_error(e)))
+                return
+            triage = triage_rule_response(chat.session, chat.session_id, message, agent)
+            response = ReceptionistResponse(**triage, session_id=chat.session_id)
+        else:
+            degraded = await run_in_threadpool(degraded_clinical_answer, req, chat.session, urgent, agent)
+            if degraded is None:
+                await channel.send(http_error_event(overloaded_error(e)))
+                return
+            await channel.send({"type": "token", "text": degraded['answer_text']})
+            response = shape_clinical_response(ClinicalResponse(**degraded, session_id=chat.session_id), req)
+    await channel.send(done_event(agent, response))
+
+@app.websocket("/ws/chat/{session_id}")
+async def ws_chat(websocket: WebSocket, session_id: str):
+    """
+    Chat over one connection for the session's lifetime. Each message is a JSON object
+    {"message"[, "agent", "kb", "include_text", "fields", "sources_offset", "sources_limit"]}.
+    Events pushed back: {"type": "alert"} for urgent symptoms, {"type": "token"} pieces of a
+    clinical answer, {"type": "done", "agent", ...} with the response as the REST endpoints
+    return it, and {"type": "error", "status", "detail"[, "retry_after"]}.
+    """
+    session = sessions.get(session_id)
+    if session is None:
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    bind_log_context(session_id=session_id)
+    logger.info(f"WebSocket chat opened: {session_id}")
+
+    chat = ChatContext(session_id, session)
+    await run_in_threadpool(chat.resume)
+    channel = EventChannel(websocket)
+    channel.start()
+    try:
+        while not channel.closed:
+            text = await websocket.receive_text()
+            try:
+                data = loads(text)
+            except ValueError:
+                await channel.send(error_event(400, "Invalid JSON"))
+                continue
+            await chat_turn(chat, channel, data)
+    except (WebSocketDisconnect, ChannelClosed):
+        pass
+    finally:
+        await channel.close()
+        if websocket.application_state == WebSocketState.CONNECTED and websocket.client_state == WebSocketState.CONNECTED:
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+        logger.info(f"WebSocket chat closed: {session_id}")
+
+@app.post("/agent/clinical/batch")
+async def agent_clinical_batch(
+    request: Request,
+    job_id: Optional[str] = None,
+    concurrency: int = Query(4, ge=1, le=16)
+):
+    """
+    Bulk clinical Q&A. Body is JSONL of {"patient_id", "question"[, "id", "kb"]}; results stream back as JSONL.
+    With a job_id, results are checkpointed server-side and a resubmitted job skips completed items.
+    """
+    body = (await request.body()).decode("utf-8")
+    try:
+        items = list(parse_jsonl(body.splitlines()))
+        checkpoint_path = job_checkpoint_path(job_id) if job_id else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Clinical batch called. Items: {len(items)}, Job: {job_id}")
+
+    if checkpoint_path:
+        results = run_checkpointed_batch(items, checkpoint_path, concurrency, replay_completed=True)
+    else:
+        results = run_clinical_batch(items, concurrency)
+    return StreamingResponse((dumps(r) + "\n" for r in results), media_type="application/x-ndjson")
+
+@app.get("/kb/chunk/{chunk_id}")
+def get_kb_chunk(chunk_id: str, kb: Optional[str] = None):
+    check_kb(kb)
+    chunk = get_chunk(chunk_id, kb)
+    if chunk is None:
+        raise HTTPException(status_code=404, detail="Chunk not found")
+    return {k: v for k, v in chunk.items() if k != "score"}
 
 @app.post("/search/web")
-def search_web(query: str):
+async def search_web(query: str):
     logger.info(f"Web search requested: {query}")
-    results = search_web_tool(query)
+    try:
+        results = await asearch_web(query)
+    except Exception as e:
+        logger.error(f"Web search failed: {e}")
+        raise HTTPException(status_code=502, detail="Web search provider unavailable")
     return {"results": results, "source_type": "Web"}
 
 @app.get("/logs")
-def get_logs(session_id: Optional[str] = None):
-    # Read logs from file
+def get_logs(
+    session_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Structured log entries, newest first. `since`/`until` accept ISO-8601 or epoch seconds.
+    """
     try:
-        with open(LOG_FILE, "r") as f:
-            lines = f.readlines()
-        # Filter by session_id if provided (simple string match)
-        if session_id:
-            lines = [l for l in lines if session_id in l]
-        return {"logs": lines[-100:]} # Return last 100 lines
-    except Exception as e:
-        return {"error": str(e)}
+        logs = query_logs(session_id, parse_time(since), parse_time(until), limit, offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid time range: {e}")
+    return {
+        "logs": logs,
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + len(logs) if len(logs) == limit else None
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/memory")
+def memory_report():
+    """
+    Estimated resident bytes per component (model weights, vector index, sessions, caches),
+    process RSS and the memory budget for the evictable components.
+    """
+    return FastJSONResponse(get_memory_budget().report())
+
+@app.get("/profiles")
+def list_profiles(limit: int = Query(100, ge=1, le=1000)):
+    """
+    Stored request profiles, newest first.
+    """
+    return {"profiles": get_profile_store().list(limit)}
+
+@app.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def download_profile(profile_id: str):
+    """
+    A profile as collapsed stacks ("frame;frame;frame count" per line), for flamegraph.pl or speedscope.
+    """
+    collapsed = get_profile_store().read(profile_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(collapsed, headers={"Content-Disposition": f'attachment; filename="{profile_id}.collapsed"'})
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,249 @@
+import os
+import sys
+import time
+import types
+import random
+import logging
+import platform
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional, Callable, Mapping
+import numpy as np
+from backend.metrics import inc_counter, set_gauge, register_metric
+
+logger = logging.getLogger(__name__)
+
+# Memory accounting. Components holding state in the API process (model weights, vector
+# index, session store, caches) register a size function here; evictable ones also
+# register an evict function. Sizes are estimates: the deep size of a sample of entries
+# times the entry count. MEMORY_BUDGET_MB caps the evictable components together: when
+# they exceed it, entries are evicted least recently used first, starting with the
+# components cheapest to rebuild (lowest priority), until they are back under the budget.
+# Fixed components (model weights, vector index) are reported but not counted against it.
+MEMORY_BUDGET_MB = float(os.getenv("MEMORY_BUDGET_MB", "256"))
+# How often the budget is checked in the background
+MEMORY_CHECK_SECONDS = float(os.getenv("MEMORY_CHECK_SECONDS", "5"))
+# Entries deep-sized per component when estimating its size
+MEMORY_SAMPLE_SIZE = int(os.getenv("MEMORY_SAMPLE_SIZE", "32"))
+# Eviction frees down to this fraction of the budget, so it doesn't run on every check
+MEMORY_EVICT_TARGET = 0.9
+
+register_metric("assistant_memory_bytes", "gauge", "Estimated resident bytes by component.")
+register_metric("assistant_memory_rss_bytes", "gauge", "Resident set size of the API process.")
+register_metric("assistant_memory_evicted_bytes_total", "counter", "Estimated bytes evicted to stay within MEMORY_BUDGET_MB, by component.")
+
+# Not followed when sizing: shared by everything rather than owned by an entry
+_SKIP_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+def deep_sizeof(obj: Any) -> int:
+    """
+    Bytes held by obj and everything it references (containers, __dict__, __slots__,
+    numpy buffers), each object counted once. Classes, modules and functions are skipped.
+    """
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SKIP_TYPES):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj, 0)
+        if isinstance(obj, (str, bytes, bytearray, int, float, bool)) or obj is None:
+            continue
+        if isinstance(obj, np.ndarray):
+            # getsizeof covers owned data; a view's data belongs to its base
+            if obj.base is not None:
+                stack.append(obj.base)
+            continue
+        if isinstance(obj, Mapping):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        if hasattr(obj, "__dict__"):
+            stack.append(vars(obj))
+        for cls in type(obj).__mro__:
+            for slot in getattr(cls, "__slots__", ()):
+                if slot not in ("__dict__", "__weakref__") and hasattr(obj, slot):
+                    stack.append(getattr(obj, slot))
+    return total
+
+def estimate_size(entries: Mapping, lock: Optional[threading.Lock] = None, sample: int = MEMORY_SAMPLE_SIZE) -> int:
+    """
+    Estimated bytes held by a mapping: the mean deep size of up to `sample` entries times its length.
+    """
+    if lock is not None:
+        with lock:
+            items = list(entries.items())
+    else:
+        items = list(entries.items())
+    return sys.getsizeof(entries) + estimate_items(items, sample)
+
+def estimate_items(items: List[Any], sample: int = MEMORY_SAMPLE_SIZE) -> int:
+    if not items:
+        return 0
+    picked = items if len(items) <= sample else random.sample(items, sample)
+    return int(sum(deep_sizeof(item) for item in picked) / len(picked) * len(items))
+
+def evict_lru(entries: "OrderedDict", lock: threading.Lock, n_bytes: int,
+              on_evict: Optional[Callable[[Any, Any], None]] = None) -> int:
+    """
+    Pops least recently used entries until about n_bytes are freed; returns the bytes freed.
+    """
+    freed = 0
+    while freed < n_bytes:
+        with lock:
+            if not entries:
+                break
+            key, value = entries.popitem(last=False)
+        freed += deep_sizeof((key, value))
+        if on_evict is not None:
+            on_evict(key, value)
+    return freed
+
+def rss_bytes() -> int:
+    """
+    Resident set size of this process (Linux /proc), falling back to its peak RSS.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+class MemoryComponent:
+    __slots__ = ("name", "size_fn", "evict_fn", "priority")
+
+    def __init__(self, name: str, size_fn: Callable[[], int], evict_fn: Optional[Callable[[int], int]], priority: int):
+        self.name = name
+        self.size_fn = size_fn
+        self.evict_fn = evict_fn
+        self.priority = priority
+
+    @property
+    def evictable(self) -> bool:
+        return self.evict_fn is not None
+
+class MemoryBudget:
+    """
+    Registered components and the shared budget for the evictable ones. evict_fn(n_bytes)
+    frees about n_bytes from the component's least recently used end and returns the bytes freed.
+    """
+
+    def __init__(self, budget_mb: float = MEMORY_BUDGET_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._components: Dict[str, MemoryComponent] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, size_fn: Callable[[], int], evict_fn: Optional[Callable[[int], int]] = None,
+                 priority: int = 100):
+        with self._lock:
+            self._components[name] = MemoryComponent(name, size_fn, evict_fn, priority)
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._components.pop(name, None)
+
+    def _list(self) -> List[MemoryComponent]:
+        with self._lock:
+            return sorted(self._components.values(), key=lambda c: (c.priority, c.name))
+
+    def sizes(self, components: Optional[List[MemoryComponent]] = None) -> Dict[str, int]:
+        sizes = {}
+        for component in components if components is not None else self._list():
+            try:
+                sizes[component.name] = int(component.size_fn())
+            except Exception as e:
+                logger.error(f"Could not size memory component '{component.name}': {e}")
+                sizes[component.name] = 0
+            set_gauge("assistant_memory_bytes", sizes[component.name], component=component.name)
+        return sizes
+
+    def report(self) -> Dict[str, Any]:
+        components = self._list()
+        sizes = self.sizes(components)
+        rss = rss_bytes()
+        set_gauge("assistant_memory_rss_bytes", rss)
+        evictable = sum(sizes[c.name] for c in components if c.evictable)
+        return {
+            "rss_bytes": rss,
+            "budget_bytes": self.budget_bytes,
+            "evictable_bytes": evictable,
+            "fixed_bytes": sum(sizes[c.name] for c in components if not c.evictable),
+            # Interpreter, libraries, allocator overhead and anything not registered
+            "other_bytes": max(0, rss - sum(sizes.values())),
+            "components": {c.name: {"bytes": sizes[c.name], "evictable": c.evictable, "priority": c.priority}
+                           for c in components},
+        }
+
+    def enforce(self) -> int:
+        """
+        Evicts from evictable components, lowest priority first, while they exceed the budget.
+        Returns the estimated bytes freed.
+        """
+        if self.budget_bytes <= 0:
+            return 0
+        components = [c for c in self._list() if c.evictable]
+        sizes = self.sizes(components)
+        total = sum(sizes.values())
+        if total <= self.budget_bytes:
+            return 0
+        excess = total - int(self.budget_bytes * MEMORY_EVICT_TARGET)
+        freed_total = 0
+        for component in components:
+            if excess <= 0:
+                break
+            try:
+                freed = component.evict_fn(min(excess, sizes[component.name]))
+            except Exception as e:
+                logger.error(f"Eviction from memory component '{component.name}' failed: {e}")
+                continue
+            if freed:
+                inc_counter("assistant_memory_evicted_bytes_total", freed, component=component.name)
+                excess -= freed
+                freed_total += freed
+        logger.info(f"Memory budget exceeded ({total / 1024 / 1024:.1f} MB of "
+                    f"{self.budget_bytes / 1024 / 1024:.1f} MB); evicted ~{freed_total / 1024 / 1024:.1f} MB")
+        self.sizes(components)
+        return freed_total
+
+    def start(self, interval: float = MEMORY_CHECK_SECONDS):
+        with self._lock:
+            if self._thread is not None or self.budget_bytes <= 0:
+                return
+            self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True, name="memory-budget")
+            self._thread.start()
+
+    def _run(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.enforce()
+            except Exception as e:
+                logger.error(f"Memory budget check failed: {e}")
+
+_memory_budget = None
+
+def get_memory_budget() -> MemoryBudget:
+    global _memory_budget
+    if _memory_budget is None:
+        _memory_budget = MemoryBudget()
+    return _memory_budget
+
+def register_memory_component(name: str, size_fn: Callable[[], int], evict_fn: Optional[Callable[[int], int]] = None,
+                              priority: int = 100):
+    get_memory_budget().register(name, size_fn, evict_fn, priority)
+
+def format_memory_report(report: Dict[str, Any]) -> str:
+    parts = [f"{name} {info['bytes'] / 1024 / 1024:.1f} MB" for name, info in report["components"].items()]
+    return (f"RSS {report['rss_bytes'] / 1024 / 1024:.1f} MB "
+            f"(evictable {report['evictable_bytes'] / 1024 / 1024:.1f} of {report['budget_bytes'] / 1024 / 1024:.0f} MB budget): "
+            + ", ".join(parts))
@@ -0,0 +1,175 @@
+import time
+import bisect
+import threading
+import contextvars
+import functools
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Optional, Any
+
+# Lightweight in-process metrics rendered in Prometheus text format.
+# A single lock guards plain dicts; recording a sample is a dict lookup and a bisect.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_LATENCY = "assistant_stage_latency_seconds"
+HTTP_LATENCY = "assistant_http_request_duration_seconds"
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Tuple], float] = {}
+_gauges: Dict[Tuple[str, Tuple], float] = {}
+_histograms: Dict[Tuple[str, Tuple], List] = {}
+_metric_help: Dict[str, Tuple[str, str]] = {
+    STAGE_LATENCY: ("histogram", "Latency of backend stages (embedding, vector query, LLM, DB, graph nodes)."),
+    HTTP_LATENCY: ("histogram", "End-to-end HTTP request latency by route."),
+    "assistant_llm_tokens_total": ("counter", "Approximate LLM tokens (whitespace words) by direction."),
+    "assistant_llm_calls_total": ("counter", "LLM calls by outcome."),
+    "assistant_cache_hits_total": ("counter", "Cache hits by cache name."),
+    "assistant_cache_misses_total": ("counter", "Cache misses by cache name."),
+    "assistant_retrieval_fallbacks_total": ("counter", "Topic-scoped searches that fell back to a global search."),
+    "assistant_web_fallbacks_total": ("counter", "Clinical answers that fell back to web search."),
+    "assistant_urgent_events_total": ("counter", "Urgent triage events flagged by the receptionist."),
+    "assistant_admission_in_flight": ("gauge", "Requests currently admitted, by endpoint."),
+    "assistant_admission_queue_depth": ("gauge", "Requests waiting for admission, by endpoint."),
+    "assistant_requests_shed_total": ("counter", "Requests rejected by admission control or rate limits, by endpoint and reason."),
+    "assistant_degraded_responses_total": ("counter", "Responses served in degraded mode (cache or triage rules) under overload."),
+}
+
+# Active trace for the current request; None when tracing is off
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+def _label_key(labels: Dict[str, Any]) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def register_metric(name: str, metric_type: str, help_text: str):
+    _metric_help.setdefault(name, (metric_type, help_text))
+
+def inc_counter(name: str, value: float = 1, **labels):
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[(name, _label_key(labels))] = value
+
+def observe(name: str, value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **labels):
+    key = (name, _label_key(labels))
+    idx = bisect.bisect_left(buckets, value)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            # [bucket bounds, per-bucket counts (+Inf last), sum, count]
+            hist = [buckets, [0] * (len(buckets) + 1), 0.0, 0]
+            _histograms[key] = hist
+        hist[1][idx] += 1
+        hist[2] += value
+        hist[3] += 1
+
+def count_tokens(text: str) -> int:
+    # Whitespace approximation, consistent with chunk_text's word-based sizing
+    return len(text.split()) if text else 0
+
+# Tracing
+def start_trace() -> List[Dict[str, Any]]:
+    """
+    Starts collecting spans for the current context. Spans recorded by any
+    timer in this context (including LangGraph nodes) are appended to the list.
+    """
+    spans = []
+    _current_trace.set({"origin": time.perf_counter(), "spans": spans})
+    return spans
+
+def end_trace():
+    _current_trace.set(None)
+
+@contextmanager
+def timer(stage: str, **labels):
+    """
+    Times a block into the stage latency histogram and, if a trace is active, records a span.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe(STAGE_LATENCY, elapsed, stage=stage, **labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            name = ".".join([stage] + [str(v) for v in labels.values()])
+            trace["spans"].append({
+                "name": name,
+                "start_ms": round((start - trace["origin"]) * 1000, 3),
+                "duration_ms": round(elapsed * 1000, 3),
+            })
+
+def timed(stage: str, **labels):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(stage, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def server_timing_header(spans: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Aggregates spans into a Server-Timing header value (total ms per stage).
+    """
+    if not spans:
+        return None
+    totals: Dict[str, float] = {}
+    for span in spans:
+        totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration_ms"]
+    return ", ".join(f"{name};dur={dur:.1f}" for name, dur in totals.items())
+
+def _format_labels(label_key: Tuple, extra: Optional[Tuple] = None) -> str:
+    pairs = list(label_key) + list(extra or ())
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def render_metrics() -> str:
+    """
+    Renders all metrics in the Prometheus text exposition format (version 0.0.4).
+    """
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {k: (v[0], list(v[1]), v[2], v[3]) for k, v in _histograms.items()}
+
+    by_name: Dict[str, List] = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append(("counter", labels, value))
+    for (name, labels), value in gauges.items():
+        by_name.setdefault(name, []).append(("gauge", labels, value))
+    for (name, labels), value in histograms.items():
+        by_name.setdefault(name, []).append(("histogram", labels, value))
+
+    lines = []
+    for name in sorted(set(by_name) | set(_metric_help)):
+        metric_type, help_text = _metric_help.get(name, ("untyped", ""))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for kind, labels, value in sorted(by_name.get(name, []), key=lambda item: item[1]):
+            if kind in ("counter", "gauge"):
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+                continue
+            buckets, counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+def reset_metrics():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
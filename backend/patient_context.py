@@ -0,0 +1,202 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+import numpy as np
+from backend.patient_db import get_db_connection, get_patient_by_id, list_patients, medication_name
+from backend.rag import embed_query, retrieve_by_embedding, retrieve_many, get_chunks_by_id, kb_for_diagnosis
+from backend.metrics import inc_counter, timed
+from backend.memory import register_memory_component, estimate_size, evict_lru
+from backend.codec import dumps, loads
+from backend.records import PatientRecord
+from backend.topics import diagnosis_topics
+
+logger = logging.getLogger(__name__)
+
+# Precomputed per-patient context: parsed record, diagnosis embedding and
+# pre-retrieved KB chunk ids for the diagnosis and each medication, from the
+# patient's specialty KB.
+DIAGNOSIS_CHUNKS_K = 5
+MEDICATION_CHUNKS_K = 2
+# Weight of the diagnosis embedding when biasing a question's query vector.
+# Replaces appending "(Patient Diagnosis: ...)" to the query text.
+DIAGNOSIS_BLEND_WEIGHT = float(os.getenv("DIAGNOSIS_BLEND_WEIGHT", "0.3"))
+# Pre-retrieved diagnosis chunks added to each clinical turn's context (looked up by id)
+DIAGNOSIS_CONTEXT_CHUNKS = int(os.getenv("DIAGNOSIS_CONTEXT_CHUNKS", "2"))
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "256"))
+
+_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_cache_lock = threading.Lock()
+# Rebuilt from one SQLite row
+register_memory_component("context_cache", lambda: estimate_size(_cache, _cache_lock),
+                          lambda n: evict_lru(_cache, _cache_lock, n), priority=20)
+
+def init_context_table():
+    conn = get_db_connection()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS patient_context (
+            patient_id TEXT PRIMARY KEY,
+            patient_json TEXT,
+            diagnosis_embedding BLOB,
+            diagnosis_chunk_ids TEXT,
+            medication_chunk_ids TEXT,
+            updated_at REAL,
+            kb TEXT
+        )
+    ''')
+    # Bundles stored before named KBs were added have no kb column (they used the default KB)
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(patient_context)")}
+    if 'kb' not in columns:
+        conn.execute("ALTER TABLE patient_context ADD COLUMN kb TEXT")
+    conn.commit()
+    conn.close()
+
+@timed("context_bundle", op="build")
+def build_context_bundle(record: PatientRecord) -> Dict[str, Any]:
+    diagnosis = record.get('primary_diagnosis') or ""
+    topics = diagnosis_topics(diagnosis)
+    kb = kb_for_diagnosis(diagnosis)
+    diagnosis_embedding = embed_query(diagnosis) if diagnosis else []
+    diagnosis_chunks = retrieve_by_embedding(diagnosis_embedding, DIAGNOSIS_CHUNKS_K, topics, kb) if diagnosis else []
+
+    medications = [m for m in record.get('medications') or [] if isinstance(m, str)]
+    medication_chunks = retrieve_many(medications, k=MEDICATION_CHUNKS_K, kb=kb) if medications else []
+
+    return {
+        "patient": record,
+        "kb": kb,
+        "topics": topics,
+        "diagnosis_embedding": diagnosis_embedding,
+        "diagnosis_chunk_ids": [c['chunk_id'] for c in diagnosis_chunks],
+        "medication_chunk_ids": {
+            medication_name(m): [c['chunk_id'] for c in chunks]
+            for m, chunks in zip(medications, medication_chunks)
+        },
+    }
+
+def save_context_bundle(bundle: Dict[str, Any]):
+    patient_id = bundle['patient']['patient_id']
+    embedding = np.asarray(bundle['diagnosis_embedding'], dtype=np.float32).tobytes()
+    conn = get_db_connection()
+    try:
+        conn.execute('''
+            INSERT OR REPLACE INTO patient_context (
+                patient_id, patient_json, diagnosis_embedding,
+                diagnosis_chunk_ids, medication_chunk_ids, updated_at, kb
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            patient_id,
+            dumps(bundle['patient']),
+            embedding,
+            dumps(bundle['diagnosis_chunk_ids']),
+            dumps(bundle['medication_chunk_ids']),
+            time.time(),
+            bundle['kb']
+        ))
+        conn.commit()
+    finally:
+        conn.close()
+    _cache_put(patient_id, bundle)
+
+def refresh_context_bundle(patient_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Rebuilds and stores a patient's bundle. Called on create_patient and by the precompute script.
+    """
+    record = get_patient_by_id(patient_id)
+    if record is None:
+        return None
+    bundle = build_context_bundle(record)
+    save_context_bundle(bundle)
+    return bundle
+
+def refresh_all_context_bundles() -> int:
+    count = 0
+    for row in list_patients():
+        try:
+            if refresh_context_bundle(row['patient_id']):
+                count += 1
+        except Exception as e:
+            logger.error(f"Error precomputing context for {row['patient_id']}: {e}")
+    return count
+
+def get_context_bundle(patient_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the patient's bundle from the in-process LRU, then SQLite.
+    Returns None if no bundle was precomputed (callers fall back to the per-turn path).
+    """
+    with _cache_lock:
+        bundle = _cache.get(patient_id)
+        if bundle is not None:
+            _cache.move_to_end(patient_id)
+    if bundle is not None:
+        inc_counter("assistant_cache_hits_total", cache="patient_context")
+        return bundle
+    inc_counter("assistant_cache_misses_total", cache="patient_context")
+
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT * FROM patient_context WHERE patient_id = ?", (patient_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    patient = PatientRecord.from_dict(loads(row['patient_json']))
+    bundle = {
+        "patient": patient,
+        "kb": row['kb'],
+        # Topics are derived from the diagnosis on load so taxonomy changes apply without a rebuild
+        "topics": diagnosis_topics(patient.get('primary_diagnosis')),
+        "diagnosis_embedding": np.frombuffer(row['diagnosis_embedding'], dtype=np.float32).tolist(),
+        "diagnosis_chunk_ids": loads(row['diagnosis_chunk_ids']),
+        "medication_chunk_ids": loads(row['medication_chunk_ids']),
+    }
+    _cache_put(patient_id, bundle)
+    return bundle
+
+def _cache_put(patient_id: str, bundle: Dict[str, Any]):
+    with _cache_lock:
+        _cache[patient_id] = bundle
+        _cache.move_to_end(patient_id)
+        while len(_cache) > CONTEXT_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def blend_with_diagnosis(query_embedding: List[float], bundle: Dict[str, Any]) -> List[float]:
+    diagnosis_embedding = bundle.get('diagnosis_embedding')
+    if not diagnosis_embedding:
+        return query_embedding
+    q = np.asarray(query_embedding, dtype=np.float32)
+    d = np.asarray(diagnosis_embedding, dtype=np.float32)
+    blended = (1 - DIAGNOSIS_BLEND_WEIGHT) * q / (np.linalg.norm(q) or 1.0) + DIAGNOSIS_BLEND_WEIGHT * d / (np.linalg.norm(d) or 1.0)
+    # Keep the original magnitude so L2 distances stay comparable with unbiased queries
+    blended *= np.linalg.norm(q) / (np.linalg.norm(blended) or 1.0)
+    return blended.tolist()
+
+@timed("retrieve", mode="patient_context")
+def retrieve_for_patient(question: str, bundle: Dict[str, Any], k: int = 5) -> List[Dict[str, Any]]:
+    """
+    Retrieval using a precomputed bundle: the question is embedded alone and searched
+    within the diagnosis topics (global fallback). If the diagnosis maps to no topic,
+    the query vector is biased toward the stored diagnosis embedding instead.
+    The top DIAGNOSIS_CONTEXT_CHUNKS pre-retrieved diagnosis chunks, and those for
+    medications the question mentions, are added to the context by id, without a search.
+    Searches the KB the bundle was built against.
+    """
+    kb = bundle.get('kb')
+    topics = bundle.get('topics') or []
+    query_embedding = embed_query(question)
+    if not topics:
+        query_embedding = blend_with_diagnosis(query_embedding, bundle)
+    retrieved = retrieve_by_embedding(query_embedding, k, topics, kb)
+
+    question_lower = question.lower()
+    mentioned = [ids for name, ids in bundle.get('medication_chunk_ids', {}).items() if name and name in question_lower]
+    mentioned.append((bundle.get('diagnosis_chunk_ids') or [])[:DIAGNOSIS_CONTEXT_CHUNKS])
+    seen = {c['chunk_id'] for c in retrieved}
+    extra_ids = list(dict.fromkeys(cid for ids in mentioned for cid in ids if cid not in seen))
+    if extra_ids:
+        retrieved.extend(get_chunks_by_id(extra_ids, kb))
+    return retrieved
+
+init_context_table()
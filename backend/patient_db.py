@@ -1,7 +1,9 @@
 import sqlite3
-import json
 import logging
 from typing import List, Dict, Optional
+from backend.metrics import timed
+from backend.codec import dumps, loads
+from backend.records import PatientRecord
 
 logger = logging.getLogger(__name__)
 
@@ -28,10 +30,67 @@ def init_db():
             notes TEXT
         )
     ''')
+    # Normalized medication / warning-sign rows for cohort queries
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS patient_medications (
+            patient_id TEXT,
+            medication TEXT,
+            medication_name TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS patient_warning_signs (
+            patient_id TEXT,
+            warning_sign TEXT,
+            warning_sign_key TEXT
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_meds_name ON patient_medications (medication_name, patient_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_meds_patient ON patient_medications (patient_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_warnings_key ON patient_warning_signs (warning_sign_key, patient_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_warnings_patient ON patient_warning_signs (patient_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_patients_diagnosis ON patients (primary_diagnosis COLLATE NOCASE, discharge_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_patients_discharge ON patients (discharge_date)")
     conn.commit()
+
+    # Backfill normalized rows for databases created before these tables existed
+    has_patients = cursor.execute("SELECT 1 FROM patients LIMIT 1").fetchone()
+    has_meds = cursor.execute("SELECT 1 FROM patient_medications LIMIT 1").fetchone()
+    if has_patients and not has_meds:
+        for row in cursor.execute("SELECT patient_id, medications, warning_signs FROM patients").fetchall():
+            _write_normalized_rows(cursor, row['patient_id'], parse_json_list(row['medications']), parse_json_list(row['warning_signs']))
+        conn.commit()
     conn.close()
 
-def create_patient(record: Dict):
+def medication_name(medication: str) -> str:
+    # "Furosemide 40mg daily" -> "furosemide"
+    parts = medication.split()
+    return parts[0].lower() if parts else ""
+
+def warning_sign_key(warning_sign: str) -> str:
+    return " ".join(warning_sign.lower().split())
+
+def parse_json_list(value) -> List[str]:
+    try:
+        items = loads(value) if isinstance(value, str) else value
+    except ValueError:
+        return []
+    return [i for i in items or [] if isinstance(i, str)]
+
+def _write_normalized_rows(cursor, patient_id: str, medications: List[str], warning_signs: List[str]):
+    cursor.execute("DELETE FROM patient_medications WHERE patient_id = ?", (patient_id,))
+    cursor.execute("DELETE FROM patient_warning_signs WHERE patient_id = ?", (patient_id,))
+    cursor.executemany(
+        "INSERT INTO patient_medications (patient_id, medication, medication_name) VALUES (?, ?, ?)",
+        [(patient_id, m, medication_name(m)) for m in medications]
+    )
+    cursor.executemany(
+        "INSERT INTO patient_warning_signs (patient_id, warning_sign, warning_sign_key) VALUES (?, ?, ?)",
+        [(patient_id, w, warning_sign_key(w)) for w in warning_signs]
+    )
+
+@timed("db", op="create_patient")
+def create_patient(record: Dict, precompute_context: bool = True):
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
@@ -45,19 +104,30 @@ def create_patient(record: Dict):
             record['patient_name'],
             record['discharge_date'],
             record['primary_diagnosis'],
-            json.dumps(record['medications']),
+            dumps(record['medications']),
             record['follow_up'],
-            json.dumps(record['warning_signs']),
+            dumps(record['warning_signs']),
             record['discharge_instructions'],
             record['notes']
         ))
+        _write_normalized_rows(cursor, record['patient_id'], parse_json_list(record['medications']), parse_json_list(record['warning_signs']))
         conn.commit()
     except Exception as e:
         logger.error(f"Error creating patient: {e}")
+        return
     finally:
         conn.close()
 
-def find_patient_by_name(name: str) -> List[Dict]:
+    if precompute_context:
+        # Refresh the patient's precomputed context bundle (imported lazily: it needs the KB)
+        try:
+            from backend.patient_context import refresh_context_bundle
+            refresh_context_bundle(record['patient_id'])
+        except Exception as e:
+            logger.error(f"Error precomputing patient context: {e}")
+
+@timed("db", op="find_patient_by_name")
+def find_patient_by_name(name: str) -> List[PatientRecord]:
     conn = get_db_connection()
     cursor = conn.cursor()
     # Simple fuzzy search using LIKE
@@ -65,41 +135,19 @@ def find_patient_by_name(name: str) -> List[Dict]:
     rows = cursor.fetchall()
     conn.close()
     
-    results = []
-    for row in rows:
-        res = dict(row)
-        # Parse JSON fields
-        try:
-            res['medications'] = json.loads(res['medications'])
-        except:
-            pass
-        try:
-            res['warning_signs'] = json.loads(res['warning_signs'])
-        except:
-            pass
-        results.append(res)
-    return results
+    return [PatientRecord.from_row(row) for row in rows]
 
-def get_patient_by_id(patient_id: str) -> Optional[Dict]:
+@timed("db", op="get_patient_by_id")
+def get_patient_by_id(patient_id: str) -> Optional[PatientRecord]:
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM patients WHERE patient_id = ?", (patient_id,))
     row = cursor.fetchone()
     conn.close()
     
-    if row:
-        res = dict(row)
-        try:
-            res['medications'] = json.loads(res['medications'])
-        except:
-            pass
-        try:
-            res['warning_signs'] = json.loads(res['warning_signs'])
-        except:
-            pass
-        return res
-    return None
+    return PatientRecord.from_row(row) if row else None
 
+@timed("db", op="list_patients")
 def list_patients():
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -108,5 +156,46 @@ def list_patients():
     conn.close()
     return [dict(row) for row in rows]
 
+@timed("db", op="query_cohort")
+def query_cohort(diagnosis: Optional[str] = None, medication: Optional[str] = None,
+                 warning_sign: Optional[str] = None, discharged_since: Optional[str] = None,
+                 discharged_until: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[Dict]:
+    """
+    Cohort lookup over indexed columns. diagnosis matches case-insensitively,
+    medication matches by drug name ("furosemide" matches "Furosemide 40mg daily"),
+    warning_sign matches the full sign case-insensitively; dates are ISO (YYYY-MM-DD), inclusive.
+    """
+    clauses = []
+    params = []
+    if diagnosis:
+        clauses.append("p.primary_diagnosis = ? COLLATE NOCASE")
+        params.append(diagnosis)
+    if discharged_since:
+        clauses.append("p.discharge_date >= ?")
+        params.append(discharged_since)
+    if discharged_until:
+        clauses.append("p.discharge_date <= ?")
+        params.append(discharged_until)
+    if medication:
+        clauses.append("EXISTS (SELECT 1 FROM patient_medications m WHERE m.medication_name = ? AND m.patient_id = p.patient_id)")
+        params.append(medication_name(medication))
+    if warning_sign:
+        clauses.append("EXISTS (SELECT 1 FROM patient_warning_signs w WHERE w.warning_sign_key = ? AND w.patient_id = p.patient_id)")
+        params.append(warning_sign_key(warning_sign))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    params.extend([limit, offset])
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT p.patient_id, p.patient_name, p.discharge_date, p.primary_diagnosis
+        FROM patients p {where}
+        ORDER BY p.discharge_date DESC, p.patient_id
+        LIMIT ? OFFSET ?
+    ''', params)
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
 # Initialize DB on module load (or can be explicit)
 init_db()
@@ -0,0 +1,261 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import logging
+import threading
+import contextvars
+import functools
+from collections import Counter
+from typing import Dict, Any, List, Optional
+from backend.metrics import inc_counter, register_metric
+
+logger = logging.getLogger(__name__)
+
+# On-demand sampling profiles of agent requests. A request is profiled when it sends
+# "X-Profile: 1" (or ?profile=1), or at random at PROFILE_SAMPLE_RATE. While a profile
+# is active a sampler thread records the wall-clock stacks of the threads doing that
+# request's work; profiles are stored as collapsed stacks (flamegraph.pl / speedscope).
+# With no active profile there is no sampler thread and no per-call hook.
+PROFILE_ON_DEMAND = os.getenv("PROFILE_ON_DEMAND", "true").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+# Oldest profiles are deleted beyond this many
+PROFILE_MAX_PROFILES = int(os.getenv("PROFILE_MAX_PROFILES", "100"))
+PROFILE_PATHS = ("/agent/clinical", "/agent/receptionist")
+# Deepest stack kept per sample (outermost frames are dropped beyond it)
+PROFILE_MAX_DEPTH = 128
+
+TRIGGER_ON_DEMAND = "on_demand"
+TRIGGER_SAMPLED = "sampled"
+
+register_metric("assistant_profiles_total", "counter", "Request profiles captured, by trigger.")
+
+_PROFILE_ID_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+_UNSAFE_ID_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+# Profile of the current request; copied into threadpool workers with the context
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+class RequestProfile:
+    def __init__(self, request_id: str, endpoint: str, trigger: str):
+        self.request_id = request_id
+        self.endpoint = endpoint
+        self.trigger = trigger
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._threads: Dict[int, int] = {}  # thread ident -> nesting depth
+        self._lock = threading.Lock()
+
+    @property
+    def profile_id(self) -> str:
+        # Sortable by start time (ids are pruned oldest first); the request id is client-supplied
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(self.started_at))
+        millis = int(self.started_at * 1000) % 1000
+        request_id = _UNSAFE_ID_CHARS.sub("_", self.request_id)[:64]
+        return f"{stamp}{millis:03d}_{self.endpoint.strip('/').replace('/', '-')}_{request_id}"
+
+    def add_thread(self, ident: int):
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+
+    def remove_thread(self, ident: int):
+        with self._lock:
+            depth = self._threads.get(ident, 0) - 1
+            if depth > 0:
+                self._threads[ident] = depth
+            else:
+                self._threads.pop(ident, None)
+
+    def sample(self, frames: Dict[int, Any]):
+        with self._lock:
+            idents = list(self._threads)
+        for ident in idents:
+            frame = frames.get(ident)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "profile_id": self.profile_id,
+            "request_id": self.request_id,
+            "endpoint": self.endpoint,
+            "trigger": self.trigger,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": self.samples,
+            "interval_ms": PROFILE_INTERVAL_MS,
+        }
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None and len(names) < PROFILE_MAX_DEPTH:
+        names.append(_frame_name(frame).replace(";", ":"))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class Sampler:
+    """
+    One sampling thread shared by all active profiles; it exits when none are left.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self._active: List[RequestProfile] = []
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="profile-sampler")
+                self._thread.start()
+
+    def remove(self, profile: RequestProfile):
+        with self._lock:
+            if profile in self._active:
+                self._active.remove(profile)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active)
+            frames = sys._current_frames()
+            for profile in active:
+                profile.sample(frames)
+            del frames
+            time.sleep(self.interval)
+
+class ProfileStore:
+    """
+    Profiles on disk: <profile_id>.collapsed plus a <profile_id>.json summary, newest kept.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR, max_profiles: int = PROFILE_MAX_PROFILES):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id: str, ext: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.{ext}")
+
+    def save(self, profile: RequestProfile):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            with open(self._path(profile.profile_id, "collapsed"), "w") as f:
+                f.write(profile.collapsed())
+            with open(self._path(profile.profile_id, "json"), "w") as f:
+                json.dump(profile.summary(), f)
+            self._prune()
+
+    def _prune(self):
+        ids = sorted(f[:-len(".json")] for f in os.listdir(self.directory) if f.endswith(".json"))
+        for profile_id in ids[:max(0, len(ids) - self.max_profiles)]:
+            for ext in ("collapsed", "json"):
+                try:
+                    os.remove(self._path(profile_id, ext))
+                except FileNotFoundError:
+                    pass
+
+    def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.directory):
+            return []
+        ids = sorted((f[:-len(".json")] for f in os.listdir(self.directory) if f.endswith(".json")), reverse=True)
+        summaries = []
+        for profile_id in ids[:limit]:
+            try:
+                with open(self._path(profile_id, "json")) as f:
+                    summaries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return summaries
+
+    def read(self, profile_id: str) -> Optional[str]:
+        # Ids come from the URL, so only plain names are accepted
+        if not _PROFILE_ID_RE.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id, "collapsed")) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+_sampler = None
+_store = None
+
+def get_sampler() -> Sampler:
+    global _sampler
+    if _sampler is None:
+        _sampler = Sampler()
+    return _sampler
+
+def get_profile_store() -> ProfileStore:
+    global _store
+    if _store is None:
+        _store = ProfileStore()
+    return _store
+
+def profile_trigger(path: str, flag: Optional[str]) -> Optional[str]:
+    """
+    Whether to profile a request: on demand (flag "1"/"true"), or sampled at PROFILE_SAMPLE_RATE.
+    """
+    if path not in PROFILE_PATHS:
+        return None
+    if PROFILE_ON_DEMAND and flag in ("1", "true"):
+        return TRIGGER_ON_DEMAND
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return TRIGGER_SAMPLED
+    return None
+
+def start_profile(request_id: str, endpoint: str, trigger: str) -> RequestProfile:
+    profile = RequestProfile(request_id, endpoint, trigger)
+    _current_profile.set(profile)
+    get_sampler().add(profile)
+    return profile
+
+def finish_profile(profile: RequestProfile):
+    _current_profile.set(None)
+    get_sampler().remove(profile)
+    profile.duration = time.perf_counter() - profile.start
+    inc_counter("assistant_profiles_total", trigger=profile.trigger)
+    try:
+        get_profile_store().save(profile)
+    except OSError as e:
+        logger.error(f"Failed to save profile {profile.profile_id}: {e}")
+
+def profiled(fn):
+    """
+    Marks a function that does a request's work in a worker thread; while the request
+    is being profiled, the thread running it is sampled.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return fn(*args, **kwargs)
+        ident = threading.get_ident()
+        profile.add_thread(ident)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.remove_thread(ident)
+    return wrapper
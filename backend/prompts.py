@@ -24,5 +24,19 @@ USER:
 {user_query}
 
 INSTRUCTIONS:
-Prioritize KB and include citations exactly as (Ref: /mnt/data/GenAI_Intern_Assignment.pdf page {page} chunk {chunk_id}).
+Prioritize KB and include citations exactly as (Ref: /mnt/data/GenAI_Intern_Assignment.pdf page {{page}} chunk {{chunk_id}}).
+"""
+
+HISTORY_SUMMARY_PROMPT_TEMPLATE = """
+SYSTEM:
+You maintain a running summary of a post-discharge patient conversation.
+
+CURRENT SUMMARY:
+{summary}
+
+NEW MESSAGES:
+{transcript}
+
+INSTRUCTIONS:
+Update the summary with the new messages. Keep patient identity, symptoms, triage outcomes and open questions. Stay under {max_chars} characters. Return only the summary.
 """
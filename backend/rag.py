@@ -1,11 +1,19 @@
 import os
+import time
 import uuid
 import logging
-from typing import List, Dict, Any
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
 import chromadb
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
-from backend.grok_wrapper import grok_generate
+from backend.grok_wrapper import grok_complete, LLM_OK
+from backend.metrics import timer, timed, inc_counter
+from backend.memory import register_memory_component, estimate_size, evict_lru
+from backend.records import Chunk
+from backend.kb_artifact import KBArtifact, ArtifactError, artifact_path, ARTIFACT_SUFFIX
+from backend.topics import classify_text, topic_metadata, topic_filter, diagnosis_specialty
 from backend.prompts import RAG_GENERATION_PROMPT_TEMPLATE, CLINICAL_SYSTEM_PROMPT
 
 logger = logging.getLogger(__name__)
@@ -13,15 +21,41 @@ logger = logging.getLogger(__name__)
 CHROMA_DB_DIR = os.getenv("CHROMA_DB_DIR", "./chroma_db")
 EMBEDDING_MODEL_NAME = "all-mpnet-base-v2"
 
+# Named knowledge bases (one Chroma collection "<kb>_kb" each) share the client and
+# the embedding model. The default KB keeps the original "nephrology_kb" collection.
+DEFAULT_KB = os.getenv("DEFAULT_KB", "nephrology")
+# Collection handles kept open, least recently used evicted first
+KB_MAX_OPEN = int(os.getenv("KB_MAX_OPEN", "8"))
+# Memory budget for loaded vector indexes across all KBs; Chroma unloads the least
+# recently used index segments beyond it. 0 disables the limit.
+KB_MEMORY_LIMIT_MB = int(os.getenv("KB_MEMORY_LIMIT_MB", "1024"))
+# Prebuilt KB artifacts (<kb>.kbpack, see scripts/kb_artifact.py). A KB with an artifact
+# here is served from the memory-mapped file instead of its Chroma collection.
+KB_ARTIFACT_DIR = os.getenv("KB_ARTIFACT_DIR", "./kb_artifacts")
+KB_ARTIFACT_VERIFY = os.getenv("KB_ARTIFACT_VERIFY", "true").lower() == "true"
+# How long the set of KB names is cached; KBs ingested by another process appear after at most this long
+KB_NAMES_TTL_SECONDS = float(os.getenv("KB_NAMES_TTL_SECONDS", "30"))
+
 # Initialize global instances
 _chroma_client = None
 _embedding_model = None
-_collection = None
+_collections: "OrderedDict[str, Any]" = OrderedDict()
+_collections_lock = threading.Lock()
+_artifacts: Dict[str, Optional[KBArtifact]] = {}
+_artifacts_lock = threading.Lock()
+# (expiry, names) from the last scan of the Chroma store and artifact directory
+_kb_names: Optional[tuple] = None
 
 def get_chroma_client():
     global _chroma_client
     if _chroma_client is None:
-        _chroma_client = chromadb.PersistentClient(path=CHROMA_DB_DIR)
+        settings = Settings()
+        if KB_MEMORY_LIMIT_MB > 0:
+            settings = Settings(
+                chroma_segment_cache_policy="LRU",
+                chroma_memory_limit_bytes=KB_MEMORY_LIMIT_MB * 1024 * 1024
+            )
+        _chroma_client = chromadb.PersistentClient(path=CHROMA_DB_DIR, settings=settings)
     return _chroma_client
 
 def get_embedding_model():
@@ -30,12 +64,108 @@ def get_embedding_model():
         _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
     return _embedding_model
 
-def get_collection():
-    global _collection
-    client = get_chroma_client()
-    # Get or create collection
-    _collection = client.get_or_create_collection(name="nephrology_kb")
-    return _collection
+def kb_collection_name(kb: str) -> str:
+    return f"{kb}_kb"
+
+def get_collection(kb: Optional[str] = None):
+    """
+    Returns the collection handle for a named KB (default KB if None), creating
+    the collection on first use. Handles are cached; callers validate untrusted names.
+    """
+    kb = kb or DEFAULT_KB
+    with _collections_lock:
+        collection = _collections.get(kb)
+        if collection is not None:
+            _collections.move_to_end(kb)
+            return collection
+    collection = get_chroma_client().get_or_create_collection(name=kb_collection_name(kb))
+    with _collections_lock:
+        _collections[kb] = collection
+        _collections.move_to_end(kb)
+        while len(_collections) > KB_MAX_OPEN:
+            evicted, _ = _collections.popitem(last=False)
+            logger.info(f"Closed KB handle '{evicted}'")
+    return collection
+
+def get_kb_artifact(kb: Optional[str] = None) -> Optional[KBArtifact]:
+    """
+    The memory-mapped artifact serving a KB, or None if the KB has no (usable) artifact.
+    Artifacts are opened on first use; one that fails to open is not retried until restart.
+    """
+    kb = kb or DEFAULT_KB
+    if kb in _artifacts:
+        return _artifacts[kb]
+    path = artifact_path(KB_ARTIFACT_DIR, kb)
+    if not os.path.exists(path):
+        return None
+    with _artifacts_lock:
+        if kb not in _artifacts:
+            artifact = None
+            try:
+                with timer("artifact_load", kb=kb):
+                    artifact = KBArtifact(path, verify=KB_ARTIFACT_VERIFY)
+                if artifact.embedding_model != EMBEDDING_MODEL_NAME:
+                    logger.error(f"KB artifact {path} was built with '{artifact.embedding_model}', "
+                                 f"not '{EMBEDDING_MODEL_NAME}'; using Chroma for KB '{kb}'")
+                    artifact = None
+                else:
+                    logger.info(f"Serving KB '{kb}' from artifact {path} ({artifact.count} chunks)")
+            except (OSError, ValueError, ArtifactError) as e:
+                logger.error(f"Could not open KB artifact {path}: {e}; using Chroma for KB '{kb}'")
+            _artifacts[kb] = artifact
+    return _artifacts[kb]
+
+def list_kbs() -> List[str]:
+    """
+    Names of the KBs present in the Chroma store or as artifacts. The scan is cached for
+    KB_NAMES_TTL_SECONDS, so KBs ingested by another process are picked up without a restart.
+    """
+    global _kb_names
+    cached = _kb_names
+    if cached is not None and cached[0] > time.monotonic():
+        return list(cached[1])
+    names = _scan_kbs()
+    _kb_names = (time.monotonic() + KB_NAMES_TTL_SECONDS, names)
+    return list(names)
+
+def _scan_kbs() -> List[str]:
+    suffix = kb_collection_name("")
+    names = []
+    if os.path.isdir(KB_ARTIFACT_DIR):
+        names.extend(f[:-len(ARTIFACT_SUFFIX)] for f in os.listdir(KB_ARTIFACT_DIR) if f.endswith(ARTIFACT_SUFFIX))
+    for c in get_chroma_client().list_collections():
+        # list_collections returns names on newer Chroma versions, Collection objects on older ones
+        name = getattr(c, "name", c)
+        if name.endswith(suffix):
+            names.append(name[:-len(suffix)])
+    return sorted(set(names))
+
+def invalidate_kb_names():
+    """
+    Drops the cached KB names; called after ingesting or installing an artifact in this process.
+    """
+    global _kb_names
+    _kb_names = None
+
+def kb_for_diagnosis(diagnosis: Optional[str]) -> str:
+    """
+    Picks the specialty KB for a diagnosis if one has been ingested, else the default KB.
+    """
+    specialty = diagnosis_specialty(diagnosis)
+    if specialty and specialty != DEFAULT_KB and specialty in list_kbs():
+        return specialty
+    return DEFAULT_KB
+
+def warm_kb(kb: str):
+    """
+    Opens a KB and runs one query so its index is loaded before the first request.
+    """
+    if get_kb_artifact(kb) is not None:
+        return
+    collection = get_collection(kb)
+    if collection.count():
+        collection.query(query_embeddings=[embed_query(kb)], n_results=1)
+        logger.info(f"Warmed KB '{kb}'")
 
 def chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> List[str]:
     """
@@ -48,11 +178,10 @@ def chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> List[str
     chunks = []
     
     # Approximate tokens -> words (1 token ~= 0.75 words, so 800 tokens ~= 600 words)
-    # Let's stick to the prompt's "chunk_size approx 800 tokens".
-    # We'll use 600 words as chunk size, 75 words as overlap.
-    
-    word_chunk_size = 600
-    word_overlap = 75
+    word_chunk_size = max(1, int(chunk_size * 0.75))
+    word_overlap = int(overlap * 0.75)
+    if not 0 <= word_overlap < word_chunk_size:
+        raise ValueError(f"overlap ({overlap}) must be non-negative and smaller than chunk_size ({chunk_size})")
     
     if len(words) <= word_chunk_size:
         return [text]
@@ -66,22 +195,35 @@ def chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> List[str
         
     return chunks
 
+@timed("embed")
 def embed_texts(texts: List[str]) -> List[List[float]]:
     model = get_embedding_model()
     embeddings = model.encode(texts)
     return embeddings.tolist()
 
-def upsert_chunks_to_chroma(chunks: List[Dict[str, Any]]):
+def upsert_chunks_to_chroma(chunks: List[Dict[str, Any]], kb: Optional[str] = None,
+                            embeddings: Optional[List[List[float]]] = None):
     """
     chunks: list of dicts with keys: text, source, page, chunk_id
+    Optional scalar keys (e.g. section, chapter) are stored as metadata too.
+    Each chunk is tagged with topic labels for diagnosis-scoped retrieval.
+    kb: target knowledge base (default KB if None).
+    embeddings: precomputed chunk embeddings (e.g. from an artifact); embedded here if None.
     """
-    collection = get_collection()
+    if get_kb_artifact(kb) is not None:
+        logger.warning(f"KB '{kb or DEFAULT_KB}' is served from an artifact; re-export it to pick up this upsert")
+    collection = get_collection(kb)
     
     texts = [c['text'] for c in chunks]
-    metadatas = [{"source": c['source'], "page": c['page'], "chunk_id": c['chunk_id']} for c in chunks]
+    metadatas = []
+    for c in chunks:
+        meta = {k: v for k, v in c.items() if k != 'text' and v is not None}
+        meta.update(topic_metadata(classify_text(c['text'])))
+        metadatas.append(meta)
     ids = [c['chunk_id'] for c in chunks]
     
-    embeddings = embed_texts(texts)
+    if embeddings is None:
+        embeddings = embed_texts(texts)
     
     collection.upsert(
         documents=texts,
@@ -89,63 +231,231 @@ def upsert_chunks_to_chroma(chunks: List[Dict[str, Any]]):
         metadatas=metadatas,
         ids=ids
     )
-    logger.info(f"Upserted {len(chunks)} chunks to ChromaDB.")
+    clear_chunk_cache()
+    invalidate_kb_names()
+    logger.info(f"Upserted {len(chunks)} chunks to ChromaDB (KB '{kb or DEFAULT_KB}').")
+
+@timed("retrieve")
+def retrieve(query: str, k: int = 5, topics: Optional[List[str]] = None, kb: Optional[str] = None) -> List[Chunk]:
+    return retrieve_by_embedding(embed_query(query), k, topics, kb)
 
-def retrieve(query: str, k: int = 5) -> List[Dict[str, Any]]:
-    collection = get_collection()
+def embed_query(query: str) -> List[float]:
     model = get_embedding_model()
-    query_embedding = model.encode([query]).tolist()
-    
-    results = collection.query(
-        query_embeddings=query_embedding,
-        n_results=k
-    )
-    
-    # Format results
-    retrieved = []
-    if results['documents']:
-        for i in range(len(results['documents'][0])):
-            item = {
-                "text": results['documents'][0][i],
-                "source": results['metadatas'][0][i]['source'],
-                "page": results['metadatas'][0][i]['page'],
-                "chunk_id": results['metadatas'][0][i]['chunk_id'],
-                "score": results['distances'][0][i] if 'distances' in results else 0 
-                # Note: Chroma returns distances by default (lower is better for L2, higher is better for Cosine if configured)
-                # Default is L2. We might want to convert to similarity or just pass as is.
-            }
-            retrieved.append(item)
-            
-    return retrieved
+    with timer("embed_query"):
+        return model.encode([query])[0].tolist()
 
-def generate_answer(query: str, retrieved_chunks: List[Dict], system_prompt_template: str = CLINICAL_SYSTEM_PROMPT, use_grok: bool = True) -> Dict[str, Any]:
+def retrieve_by_embedding(query_embedding: List[float], k: int = 5, topics: Optional[List[str]] = None,
+                          kb: Optional[str] = None) -> List[Chunk]:
+    """
+    With topics, candidates are restricted to chunks tagged with any of them;
+    if that yields fewer than k results, the rest are filled from a global search of the same KB.
+    """
+    return _search([query_embedding], k, topics, kb)[0]
+
+def _query_collection(query_embeddings: List[List[float]], k: int, where: Optional[Dict] = None,
+                      kb: Optional[str] = None) -> List[List[Chunk]]:
+    collection = get_collection(kb)
+    with timer("chroma_query", filtered=where is not None, kb=kb or DEFAULT_KB):
+        results = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=k,
+            where=where
+        )
+    return [_format_results(results, q) for q in range(len(query_embeddings))]
+
+def _search(query_embeddings: List[List[float]], k: int, topics: Optional[List[str]] = None,
+            kb: Optional[str] = None) -> List[List[Chunk]]:
+    artifact = get_kb_artifact(kb)
+    if artifact is not None:
+        with timer("artifact_query", filtered=bool(topics), kb=kb or DEFAULT_KB):
+            return artifact.search(query_embeddings, k, topics)
+
+    where = topic_filter(topics or [])
+    if where is None:
+        return _query_collection(query_embeddings, k, kb=kb)
+
+    scoped = _query_collection(query_embeddings, k, where, kb)
+    short = [q for q, r in enumerate(scoped) if len(r) < k]
+    if short:
+        # Fallback: fill from a global search, keeping the scoped hits first
+        inc_counter("assistant_retrieval_fallbacks_total")
+        global_results = _query_collection([query_embeddings[q] for q in short], k, kb=kb)
+        for q, extra in zip(short, global_results):
+            seen = {c['chunk_id'] for c in scoped[q]}
+            scoped[q].extend([c for c in extra if c['chunk_id'] not in seen][:k - len(scoped[q])])
+    return scoped
+
+# Bounded cache of chunks served to /kb/chunk; cleared whenever the KB is upserted
+CHUNK_CACHE_SIZE = int(os.getenv("CHUNK_CACHE_SIZE", "2048"))
+_chunk_cache: "OrderedDict[tuple, Chunk]" = OrderedDict()
+_chunk_cache_lock = threading.Lock()
+
+def get_chunk(chunk_id: str, kb: Optional[str] = None) -> Optional[Chunk]:
+    """
+    Returns a single chunk (text and metadata) by id, from cache when possible.
+    """
+    key = (kb or DEFAULT_KB, chunk_id)
+    with _chunk_cache_lock:
+        chunk = _chunk_cache.get(key)
+        if chunk is not None:
+            _chunk_cache.move_to_end(key)
+    if chunk is not None:
+        inc_counter("assistant_cache_hits_total", cache="kb_chunk")
+        return chunk
+    inc_counter("assistant_cache_misses_total", cache="kb_chunk")
+
+    found = get_chunks_by_id([chunk_id], kb)
+    if not found:
+        return None
+    chunk = found[0]
+    with _chunk_cache_lock:
+        _chunk_cache[key] = chunk
+        while len(_chunk_cache) > CHUNK_CACHE_SIZE:
+            _chunk_cache.popitem(last=False)
+    return chunk
+
+def clear_chunk_cache():
+    with _chunk_cache_lock:
+        _chunk_cache.clear()
+
+def embedding_model_bytes() -> int:
+    """
+    Parameter and buffer bytes of the loaded embedding model (0 until it is loaded).
+    """
+    model = _embedding_model
+    if model is None:
+        return 0
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+def vector_index_bytes() -> int:
+    """
+    Mapped KB artifacts plus, once a Chroma collection is open, its HNSW index files
+    (what Chroma loads into memory), capped at KB_MEMORY_LIMIT_MB.
+    """
+    total = sum(a.mapped_bytes for a in list(_artifacts.values()) if a is not None)
+    if _collections and os.path.isdir(CHROMA_DB_DIR):
+        hnsw = 0
+        for root, _, files in os.walk(CHROMA_DB_DIR):
+            hnsw += sum(os.path.getsize(os.path.join(root, f)) for f in files if f.endswith(".bin"))
+        if KB_MEMORY_LIMIT_MB > 0:
+            hnsw = min(hnsw, KB_MEMORY_LIMIT_MB * 1024 * 1024)
+        total += hnsw
+    return total
+
+register_memory_component("embedding_model", embedding_model_bytes)
+register_memory_component("vector_index", vector_index_bytes)
+# Cheapest to rebuild: one lookup by id
+register_memory_component("chunk_cache", lambda: estimate_size(_chunk_cache, _chunk_cache_lock),
+                          lambda n: evict_lru(_chunk_cache, _chunk_cache_lock, n), priority=10)
+
+@timed("get_chunks")
+def get_chunks_by_id(chunk_ids: List[str], kb: Optional[str] = None) -> List[Chunk]:
+    """
+    Fetches stored chunks by id (no similarity search). Missing ids are skipped.
+    """
+    if not chunk_ids:
+        return []
+    artifact = get_kb_artifact(kb)
+    if artifact is not None:
+        rows = [artifact.index_of(c) for c in chunk_ids]
+        return [_stored_chunk(artifact.text(i), artifact.metadata(i)) for i in rows if i is not None]
+    collection = get_collection(kb)
+    results = collection.get(ids=list(chunk_ids), include=["documents", "metadatas"])
+    by_id = {}
+    for doc, meta in zip(results['documents'], results['metadatas']):
+        by_id[meta['chunk_id']] = _stored_chunk(doc, meta)
+    return [by_id[c] for c in chunk_ids if c in by_id]
+
+def _stored_chunk(text: str, meta: Dict[str, Any]) -> Chunk:
+    # topic_* flags only exist for filtering; "topics" lists the same names
+    extra = {k: v for k, v in meta.items()
+             if k not in ("source", "page", "chunk_id", "text") and not k.startswith("topic_")}
+    return Chunk(text, meta['source'], meta['page'], meta['chunk_id'], None, extra)
+
+@timed("retrieve_many")
+def retrieve_many(queries: List[str], k: int = 5, batch_size: int = 32, topics: Optional[List[str]] = None,
+                  kb: Optional[str] = None) -> List[List[Chunk]]:
+    """
+    Batched retrieve: embeds all queries in one encode call and runs a single
+    multi-query Chroma search. Returns one result list per query, in order.
+    """
+    if not queries:
+        return []
+    model = get_embedding_model()
+    with timer("embed_query"):
+        query_embeddings = model.encode(queries, batch_size=batch_size).tolist()
     
+    return _search(query_embeddings, k, topics, kb)
+
+def _format_results(results: Dict[str, Any], q: int) -> List[Chunk]:
+    # Format results for the q-th query of a Chroma query response
+    if not results['documents']:
+        return []
+    documents = results['documents'][q]
+    metadatas = results['metadatas'][q]
+    # Note: Chroma returns distances by default (lower is better for L2, higher is better for Cosine if configured)
+    # Default is L2. We might want to convert to similarity or just pass as is.
+    distances = results['distances'][q] if results.get('distances') else [0] * len(documents)
+    return [
+        Chunk(doc, meta['source'], meta['page'], meta['chunk_id'], score)
+        for doc, meta, score in zip(documents, metadatas, distances)
+    ]
+
+def build_rag_prompt(query: str, retrieved_chunks: List[Dict], system_prompt_template: str = CLINICAL_SYSTEM_PROMPT) -> str:
     # Format context
     context_text = ""
     for i, chunk in enumerate(retrieved_chunks):
         context_text += f"Chunk {i+1} (Page {chunk['page']}, ID {chunk['chunk_id']}):\n{chunk['text']}\n\n"
         
-    full_prompt = RAG_GENERATION_PROMPT_TEMPLATE.format(
+    return RAG_GENERATION_PROMPT_TEMPLATE.format(
         system_prompt=system_prompt_template,
         context_chunks=context_text,
         user_query=query
     )
+
+# Returned by the LLM, at the start of its answer, when the KB lacks the answer
+WEB_SEARCH_MARKER = "web_search_needed"
+# Skipped before the marker when checking the start of an answer
+_MARKER_LEAD = " \t\r\n\"'`*_>-"
+
+def starts_with_web_search_marker(text: str) -> Optional[bool]:
+    """
+    Whether an answer opens with the web-search marker: None while the text so far
+    (a streamed answer's opening) could still become it. Both the complete and the
+    streamed answer use this, so the same output takes the same route.
+    """
+    opening = text.lstrip(_MARKER_LEAD).lower()
+    if opening.startswith(WEB_SEARCH_MARKER):
+        return True
+    if not opening or WEB_SEARCH_MARKER.startswith(opening):
+        return None
+    return False
+
+@timed("generate_answer")
+def generate_answer(query: str, retrieved_chunks: List[Dict], system_prompt_template: str = CLINICAL_SYSTEM_PROMPT, use_grok: bool = True) -> Dict[str, Any]:
+    
+    full_prompt = build_rag_prompt(query, retrieved_chunks, system_prompt_template)
     
+    llm_outcome = LLM_OK
     if use_grok:
-        answer_text = grok_generate(full_prompt)
+        llm_result = grok_complete(full_prompt)
+        answer_text = llm_result.text
+        llm_outcome = llm_result.outcome
     else:
         answer_text = "Grok generation disabled."
 
     # Check if web search is needed based on the answer
     # The prompt says: "If KB lacks answer... return 'web_search_needed'"
-    # We rely on the LLM to output this string.
+    # We rely on the LLM to output this string; it only counts at the start, as when streamed.
     
     source_type = "KB"
-    if "web_search_needed" in answer_text.lower():
+    if starts_with_web_search_marker(answer_text):
         source_type = "Web" # This will trigger the web search flow in the agent
         
     return {
         "answer_text": answer_text,
         "sources": retrieved_chunks,
-        "source_type": source_type
+        "source_type": source_type,
+        "llm_outcome": llm_outcome
     }
@@ -0,0 +1,115 @@
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from backend.codec import loads
+
+# Compact record types for the hot path. Slotted dataclasses keep one small object
+# per chunk / patient / response instead of a dict, and serialize directly through
+# backend.codec. Mapping-style access (record['text'], record.get('score'),
+# dict(record)) is kept so code written against the plain dicts works unchanged.
+
+# Field names per record class (a slotted subclass's __slots__ lists only its own fields)
+_field_names: Dict[type, Tuple[Tuple[str, ...], FrozenSet[str]]] = {}
+
+def _names(record) -> Tuple[Tuple[str, ...], FrozenSet[str]]:
+    names = _field_names.get(type(record))
+    if names is None:
+        ordered = tuple(f.name for f in fields(record))
+        names = _field_names[type(record)] = (ordered, frozenset(ordered))
+    return names
+
+class Record:
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _names(self)[1]:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in _names(self)[1]:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in _names(self)[1]
+
+    def __iter__(self):
+        return iter(_names(self)[0])
+
+    def __len__(self) -> int:
+        return len(_names(self)[0])
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in _names(self)[1] else default
+
+    def keys(self) -> Tuple[str, ...]:
+        return _names(self)[0]
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return [(k, getattr(self, k)) for k in _names(self)[0]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in _names(self)[0]}
+
+@dataclass(slots=True)
+class Chunk(Record):
+    text: str
+    source: str
+    page: int
+    chunk_id: str
+    score: Optional[float] = None
+    # Remaining stored metadata (section, chapter, topics); only set on chunks fetched by id
+    metadata: Optional[Dict[str, Any]] = None
+
+def _json_field(value: Any) -> Any:
+    # Stored JSON lists; values that don't parse are passed through as stored
+    if not isinstance(value, (str, bytes)):
+        return value
+    try:
+        return loads(value)
+    except ValueError:
+        return value
+
+@dataclass(slots=True)
+class PatientRecord(Record):
+    patient_id: str
+    patient_name: Optional[str] = None
+    discharge_date: Optional[str] = None
+    primary_diagnosis: Optional[str] = None
+    medications: Any = None
+    follow_up: Optional[str] = None
+    warning_signs: Any = None
+    discharge_instructions: Optional[str] = None
+    notes: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row) -> "PatientRecord":
+        """
+        From a `patients` row; medications and warning_signs are stored as JSON.
+        """
+        return cls(
+            row['patient_id'], row['patient_name'], row['discharge_date'], row['primary_diagnosis'],
+            _json_field(row['medications']), row['follow_up'], _json_field(row['warning_signs']),
+            row['discharge_instructions'], row['notes'],
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PatientRecord":
+        return cls(**{f.name: data.get(f.name) for f in fields(cls)})
+
+@dataclass(slots=True)
+class AgentResponse(Record):
+    answer_text: str
+    source_type: str
+    session_id: str
+    sources: List[Any] = field(default_factory=list)
+    timestamp: Optional[str] = None
+    degraded: bool = False
+
+@dataclass(slots=True)
+class ReceptionistResponse(AgentResponse):
+    patient: Optional[PatientRecord] = None
+
+@dataclass(slots=True)
+class ClinicalResponse(AgentResponse):
+    sources_total: int = 0
@@ -0,0 +1,301 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, List, Optional, Callable
+import numpy as np
+from backend.rag import embed_texts, embed_query
+from backend.admission import SessionRateLimiter, get_admission_controller
+from backend.web_search import normalize_query
+from backend.grok_wrapper import LLM_OK, LLM_MOCK
+from backend.metrics import inc_counter, set_gauge, register_metric
+from backend.memory import register_memory_component, estimate_size, deep_sizeof
+from backend.records import PatientRecord
+
+logger = logging.getLogger(__name__)
+
+# Speculative answers: once the receptionist identifies a patient, the next message is
+# usually about that patient's warning signs, medications or the triage question just
+# asked. Those answers are generated in the background and kept per session, so a
+# matching clinical question is answered without retrieval or an LLM call.
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "true").lower() == "true"
+# Likely questions answered per identified patient
+SPECULATION_MAX_QUESTIONS = int(os.getenv("SPECULATION_MAX_QUESTIONS", "4"))
+# CPU budget: background threads doing speculative retrieval and generation
+SPECULATION_WORKERS = int(os.getenv("SPECULATION_WORKERS", "1"))
+# LLM budget: speculative answers generated per minute across all sessions
+SPECULATION_LLM_PER_MINUTE = float(os.getenv("SPECULATION_LLM_PER_MINUTE", "30"))
+# Speculative questions waiting for a worker; beyond this new work is dropped
+SPECULATION_MAX_PENDING = int(os.getenv("SPECULATION_MAX_PENDING", "64"))
+SPECULATION_MAX_SESSIONS = int(os.getenv("SPECULATION_MAX_SESSIONS", "1000"))
+SPECULATION_TTL_SECONDS = float(os.getenv("SPECULATION_TTL_SECONDS", "900"))
+# Cosine similarity between the asked and a speculated question needed to serve its answer
+SPECULATION_MATCH_THRESHOLD = float(os.getenv("SPECULATION_MATCH_THRESHOLD", "0.9"))
+# Share of content words the two questions must have in common on top of that. Embeddings
+# score "should I take furosemide" and "should I stop furosemide" as near-identical.
+SPECULATION_MIN_OVERLAP = float(os.getenv("SPECULATION_MIN_OVERLAP", "0.5"))
+
+# Left out of the word overlap
+_STOPWORDS = {
+    "a", "an", "the", "i", "im", "me", "my", "we", "you", "it", "is", "are", "am", "be", "do", "does",
+    "should", "can", "could", "would", "will", "what", "how", "when", "if", "about", "of", "to", "for",
+    "and", "or", "in", "on", "at", "with", "this", "that", "there", "any", "some",
+}
+# Must appear in both questions or neither ("t" is what's left of "don't" after normalizing)
+_NEGATIONS = {"no", "not", "never", "without", "none", "nothing", "t", "stop", "stopped", "stopping",
+              "skip", "skipped", "missed", "avoid"}
+
+# The receptionist's follow-up after identifying a patient (receptionist_node)
+TRIAGE_QUESTION = "I have swelling or reduced urine output. What should I do?"
+
+register_metric("assistant_speculation_total", "counter", "Speculative answers by result (generated, skipped, discarded).")
+register_metric("assistant_speculation_lookups_total", "counter", "Clinical questions checked against speculative answers, by result.")
+register_metric("assistant_speculation_sessions", "gauge", "Sessions holding speculative answers.")
+
+def _as_list(value: Any) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [str(v) for v in value]
+
+def candidate_questions(patient: PatientRecord, limit: int = SPECULATION_MAX_QUESTIONS) -> List[str]:
+    """
+    Likely next questions for a patient, most likely first: the triage follow-up,
+    then each warning sign, then each medication.
+    """
+    questions = [TRIAGE_QUESTION]
+    questions.extend(f"What should I do if I notice {sign[0].lower()}{sign[1:]}?"
+                     for sign in _as_list(patient.get('warning_signs')))
+    questions.extend(f"What should I know about taking {med}?"
+                     for med in _as_list(patient.get('medications')))
+    return questions[:limit]
+
+class SessionSpeculation:
+    """
+    Speculative answers for one session and patient. cancelled stops queued and
+    running work for it; answers finished after that are discarded.
+    """
+
+    def __init__(self, session_id: str, patient: PatientRecord, questions: List[str]):
+        self.session_id = session_id
+        self.patient = patient
+        self.patient_id = patient['patient_id']
+        self.questions = questions
+        self.keys = [normalize_query(q) for q in questions]
+        self.words = [_content_words(q) for q in questions]
+        # Words naming the patient's medications and warning signs; a question naming one
+        # only matches a speculated question naming the same ones
+        self.entity_words = set()
+        for value in _as_list(patient.get('medications')) + _as_list(patient.get('warning_signs')):
+            self.entity_words |= _content_words(value)
+        self.embeddings: Optional[np.ndarray] = None
+        self.answers: Dict[int, Dict[str, Any]] = {}
+        self.futures: List[Future] = []
+        self.cancelled = threading.Event()
+        self.created_at = time.monotonic()
+
+    def expired(self, now: float) -> bool:
+        return now - self.created_at > SPECULATION_TTL_SECONDS
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in self.futures:
+            future.cancel()
+
+class Speculator:
+    """
+    Per-session speculative answers, produced by a small worker pool under a global
+    LLM budget. Speculation yields to live traffic: a question is skipped while
+    clinical requests are waiting for admission.
+    """
+
+    def __init__(self, workers: int = SPECULATION_WORKERS, llm_per_minute: float = SPECULATION_LLM_PER_MINUTE,
+                 max_pending: int = SPECULATION_MAX_PENDING, max_sessions: int = SPECULATION_MAX_SESSIONS):
+        self.max_pending = max_pending
+        self.max_sessions = max_sessions
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculation")
+        # One shared bucket (burst of a few answers) is the LLM budget
+        self._budget = SessionRateLimiter(rate_per_minute=llm_per_minute, burst=SPECULATION_MAX_QUESTIONS, max_sessions=1)
+        self._sessions: "OrderedDict[str, SessionSpeculation]" = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def start(self, session_id: str, patient: PatientRecord, answer_fn: Callable[[str, PatientRecord], Dict[str, Any]]):
+        """
+        Queues speculative answers for a newly identified patient. answer_fn(question, patient)
+        runs retrieval and generation and returns the clinical answer dict.
+        """
+        with self._lock:
+            current = self._sessions.get(session_id)
+            if current is not None and current.patient_id == patient['patient_id'] and not current.cancelled.is_set():
+                return
+            questions = candidate_questions(patient)
+            if not questions:
+                return
+            if self._pending + len(questions) > self.max_pending:
+                inc_counter("assistant_speculation_total", len(questions), result="skipped", reason="backlog")
+                return
+            spec = SessionSpeculation(session_id, patient, questions)
+            self._install(session_id, spec)
+            self._pending += len(questions)
+            spec.futures = [self._executor.submit(self._run, spec, i, answer_fn) for i in range(len(questions))]
+
+    def _install(self, session_id: str, spec: SessionSpeculation):
+        previous = self._sessions.pop(session_id, None)
+        if previous is not None:
+            self._cancel(previous)
+        self._sessions[session_id] = spec
+        while len(self._sessions) > self.max_sessions:
+            _, evicted = self._sessions.popitem(last=False)
+            self._cancel(evicted)
+        set_gauge("assistant_speculation_sessions", len(self._sessions))
+
+    def _cancel(self, spec: SessionSpeculation):
+        spec.cancel()
+        # Futures cancelled before they ran never reach _run's accounting
+        cancelled = sum(1 for f in spec.futures if f.cancelled())
+        self._pending -= cancelled
+        if cancelled:
+            inc_counter("assistant_speculation_total", cancelled, result="discarded", reason="cancelled")
+
+    def _run(self, spec: SessionSpeculation, index: int, answer_fn: Callable):
+        try:
+            self._speculate(spec, index, answer_fn)
+        except Exception as e:
+            logger.error(f"Speculative answer failed for session {spec.session_id}: {e}")
+            inc_counter("assistant_speculation_total", result="skipped", reason="error")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _speculate(self, spec: SessionSpeculation, index: int, answer_fn: Callable):
+        if spec.cancelled.is_set():
+            inc_counter("assistant_speculation_total", result="discarded", reason="cancelled")
+            return
+        if get_admission_controller("clinical").queue_depth > 0:
+            inc_counter("assistant_speculation_total", result="skipped", reason="busy")
+            return
+        if self._budget.check("speculation") > 0:
+            inc_counter("assistant_speculation_total", result="skipped", reason="budget")
+            return
+        if spec.embeddings is None:
+            # All of a session's questions are embedded together on its first task
+            spec.embeddings = _normalized(np.asarray(embed_texts(spec.questions), dtype=np.float32))
+
+        answer = answer_fn(spec.questions[index], spec.patient)
+        if answer.get('llm_outcome') not in (LLM_OK, LLM_MOCK):
+            inc_counter("assistant_speculation_total", result="skipped", reason="llm_failed")
+            return
+        if spec.cancelled.is_set():
+            inc_counter("assistant_speculation_total", result="discarded", reason="cancelled")
+            return
+        spec.answers[index] = answer
+        inc_counter("assistant_speculation_total", result="generated")
+
+    def match(self, session_id: str, patient_id: Optional[str], question: str) -> Optional[Dict[str, Any]]:
+        """
+        The speculative answer for this session's patient whose question matches, if ready:
+        same normalized text, or embedding similarity above SPECULATION_MATCH_THRESHOLD with
+        the same negations and patient medications/signs and enough words in common.
+        """
+        if not self._sessions:
+            return None
+        with self._lock:
+            spec = self._sessions.get(session_id)
+            if spec is not None and spec.expired(time.monotonic()):
+                del self._sessions[session_id]
+                self._cancel(spec)
+                set_gauge("assistant_speculation_sessions", len(self._sessions))
+                spec = None
+        if spec is None or spec.cancelled.is_set() or spec.patient_id != patient_id:
+            return None
+        answers = dict(spec.answers)
+        if not answers:
+            inc_counter("assistant_speculation_lookups_total", result="not_ready")
+            return None
+
+        key = normalize_query(question)
+        index = next((i for i in answers if spec.keys[i] == key), None)
+        words = _content_words(question)
+        # Only questions with a ready answer and a compatible wording are embedded against
+        ready = [i for i in sorted(answers) if _compatible(words, spec.words[i], spec.entity_words)]
+        if index is None and ready and spec.embeddings is not None:
+            query = _normalized(np.asarray([embed_query(question)], dtype=np.float32))[0]
+            similarity = spec.embeddings[ready] @ query
+            best = int(np.argmax(similarity))
+            if similarity[best] >= SPECULATION_MATCH_THRESHOLD:
+                index = ready[best]
+        if index is None:
+            inc_counter("assistant_speculation_lookups_total", result="miss")
+            return None
+        inc_counter("assistant_speculation_lookups_total", result="hit")
+        logger.info(f"Serving speculative answer for session {session_id}: {spec.questions[index]!r}")
+        return dict(spec.answers[index])
+
+    def cancel(self, session_id: str):
+        with self._lock:
+            spec = self._sessions.pop(session_id, None)
+            if spec is not None:
+                self._cancel(spec)
+            set_gauge("assistant_speculation_sessions", len(self._sessions))
+
+    def size_bytes(self) -> int:
+        return estimate_size(self._sessions, self._lock)
+
+    def evict(self, n_bytes: int) -> int:
+        """
+        Drops (and cancels) the oldest sessions' speculative answers until about n_bytes are freed.
+        """
+        freed = 0
+        while freed < n_bytes:
+            with self._lock:
+                if not self._sessions:
+                    break
+                _, spec = self._sessions.popitem(last=False)
+                self._cancel(spec)
+                set_gauge("assistant_speculation_sessions", len(self._sessions))
+            freed += deep_sizeof(spec)
+        return freed
+
+def _content_words(text: str) -> set:
+    return {w for w in normalize_query(text).split() if w not in _STOPWORDS}
+
+def _compatible(asked: set, speculated: set, entity_words: set) -> bool:
+    """
+    Whether a paraphrase check may serve the speculated question's answer for the asked one.
+    """
+    if asked & _NEGATIONS != speculated & _NEGATIONS:
+        return False
+    if asked & entity_words != speculated & entity_words:
+        return False
+    union = asked | speculated
+    return bool(union) and len(asked & speculated) / len(union) >= SPECULATION_MIN_OVERLAP
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+_speculator = None
+
+def get_speculator() -> Speculator:
+    global _speculator
+    if _speculator is None:
+        _speculator = Speculator()
+        register_memory_component("speculation", _speculator.size_bytes, _speculator.evict, priority=40)
+    return _speculator
+
+def speculate(session_id: str, patient: PatientRecord, answer_fn: Callable[[str, PatientRecord], Dict[str, Any]]):
+    if SPECULATION_ENABLED:
+        get_speculator().start(session_id, patient, answer_fn)
+
+def speculative_answer(session_id: str, patient_id: Optional[str], question: str) -> Optional[Dict[str, Any]]:
+    if not SPECULATION_ENABLED or _speculator is None:
+        return None
+    return _speculator.match(session_id, patient_id, question)
+
+def cancel_speculation(session_id: str):
+    if _speculator is not None:
+        _speculator.cancel(session_id)
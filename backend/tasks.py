@@ -0,0 +1,296 @@
+import os
+import time
+import queue
+import sqlite3
+import logging
+import threading
+import contextvars
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from backend.codec import dumps, loads
+from backend.metrics import inc_counter, set_gauge, register_metric
+
+logger = logging.getLogger(__name__)
+
+# Background work that doesn't affect the answer (answer caching, history summaries)
+# runs here after the response is ready; logging doesn't need it, as records already go
+# through the log listener thread. TaskQueue is in-process and best effort: bounded,
+# retried, lost on restart. DurableTaskQueue commits each task to SQLite before enqueue
+# returns and runs it at least once, across restarts and worker processes; it is for
+# events that must not be lost, such as urgent triage events.
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", "4"))
+# Tasks waiting for a worker; beyond this new tasks are dropped
+TASK_QUEUE_SIZE = int(os.getenv("TASK_QUEUE_SIZE", "1000"))
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+# Delay before the first retry; doubled for each further attempt
+TASK_RETRY_DELAY = float(os.getenv("TASK_RETRY_DELAY", "0.5"))
+TASK_DB_PATH = os.getenv("TASK_DB_PATH", "tasks.db")
+TASK_DURABLE_MAX_ATTEMPTS = int(os.getenv("TASK_DURABLE_MAX_ATTEMPTS", "10"))
+# A claimed durable task not finished within this long (e.g. its process died) is run again
+TASK_LEASE_SECONDS = float(os.getenv("TASK_LEASE_SECONDS", "60"))
+# How often idle durable workers look for due tasks (new tasks wake them immediately)
+TASK_POLL_SECONDS = float(os.getenv("TASK_POLL_SECONDS", "1"))
+
+register_metric("assistant_task_queue_depth", "gauge", "Background tasks waiting to run, by queue.")
+register_metric("assistant_tasks_total", "counter", "Background task runs by queue, task and result (ok, retry, failed, dropped).")
+register_metric("assistant_tasks_failed", "gauge", "Durable tasks that exhausted their attempts.")
+
+class _Task:
+    __slots__ = ("name", "fn", "args", "kwargs", "context", "attempts", "max_attempts")
+
+    def __init__(self, name: str, fn: Callable, args: Tuple, kwargs: Dict, max_attempts: int):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        # Run in the submitter's context, so logs keep its request and session ids
+        self.context = contextvars.copy_context()
+        self.attempts = 0
+        self.max_attempts = max_attempts
+
+class TaskQueue:
+    """
+    Bounded in-process queue served by a fixed pool of worker threads (started on first use).
+    A failing task is retried with exponential backoff up to max_attempts.
+    """
+
+    def __init__(self, name: str = "default", workers: int = TASK_WORKERS, max_size: int = TASK_QUEUE_SIZE,
+                 max_attempts: int = TASK_MAX_ATTEMPTS, retry_delay: float = TASK_RETRY_DELAY):
+        self.name = name
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue: "queue.Queue[Optional[_Task]]" = queue.Queue(maxsize=max_size)
+        self._threads: List[threading.Thread] = []
+        self._retrying = 0
+        self._lock = threading.Lock()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() + self._retrying
+
+    def _update_gauge(self):
+        set_gauge("assistant_task_queue_depth", self.depth, queue=self.name)
+
+    def _ensure_workers(self):
+        if len(self._threads) >= self.workers:
+            return
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, daemon=True,
+                                          name=f"tasks-{self.name}-{len(self._threads)}")
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, fn: Callable, *args, task_name: Optional[str] = None,
+               max_attempts: Optional[int] = None, **kwargs) -> bool:
+        """
+        Queues fn(*args, **kwargs). Returns False (and drops it) if the queue is full.
+        """
+        self._ensure_workers()
+        task = _Task(task_name or getattr(fn, "__name__", "task"), fn, args, kwargs, max_attempts or self.max_attempts)
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            inc_counter("assistant_tasks_total", queue=self.name, task=task.name, result="dropped")
+            logger.warning(f"Background queue '{self.name}' is full; dropped task {task.name}")
+            return False
+        self._update_gauge()
+        return True
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            try:
+                self._run(task)
+            finally:
+                self._queue.task_done()
+                self._update_gauge()
+
+    def _run(self, task: _Task):
+        task.attempts += 1
+        try:
+            task.context.run(task.fn, *task.args, **task.kwargs)
+        except Exception as e:
+            if task.attempts < task.max_attempts:
+                inc_counter("assistant_tasks_total", queue=self.name, task=task.name, result="retry")
+                self._retry_later(task, self.retry_delay * 2 ** (task.attempts - 1))
+            else:
+                inc_counter("assistant_tasks_total", queue=self.name, task=task.name, result="failed")
+                logger.error(f"Background task {task.name} failed after {task.attempts} attempts: {e}")
+            return
+        inc_counter("assistant_tasks_total", queue=self.name, task=task.name, result="ok")
+
+    def _retry_later(self, task: _Task, delay: float):
+        with self._lock:
+            self._retrying += 1
+
+        def requeue():
+            with self._lock:
+                self._retrying -= 1
+            try:
+                self._queue.put_nowait(task)
+            except queue.Full:
+                inc_counter("assistant_tasks_total", queue=self.name, task=task.name, result="dropped")
+            self._update_gauge()
+
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        timer.start()
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """
+        Waits until queued and retrying tasks have finished; False if still busy at timeout.
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks or self._retrying:
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+# Durable task handlers by kind; registered at import by the modules that enqueue them
+_durable_handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+
+def register_durable_handler(kind: str, handler: Callable[[Dict[str, Any]], None]):
+    _durable_handlers[kind] = handler
+
+class DurableTaskQueue:
+    """
+    SQLite-backed task queue. enqueue() commits the task before returning. Workers claim
+    due tasks by leasing them (run_at moves TASK_LEASE_SECONDS ahead), so a task whose
+    worker or process dies is picked up again once the lease lapses. Finished tasks are
+    deleted. Failed tasks back off exponentially, and after max_attempts they are kept
+    with status 'failed' for inspection.
+    """
+
+    def __init__(self, path: str = TASK_DB_PATH, workers: int = 1, max_attempts: int = TASK_DURABLE_MAX_ATTEMPTS,
+                 retry_delay: float = TASK_RETRY_DELAY, lease_seconds: float = TASK_LEASE_SECONDS):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._threads: List[threading.Thread] = []
+        # Autocommit; transactions are opened explicitly where a claim needs one
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS durable_tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_error TEXT
+            )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_durable_tasks_due ON durable_tasks (status, run_at)")
+
+    def start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, daemon=True, name=f"tasks-durable-{len(self._threads)}")
+                thread.start()
+                self._threads.append(thread)
+        self._update_gauges()
+
+    def enqueue(self, kind: str, payload: Dict[str, Any]) -> int:
+        now = time.time()
+        with self._lock:
+            task_id = self._conn.execute(
+                "INSERT INTO durable_tasks (kind, payload, run_at, created_at) VALUES (?, ?, ?, ?)",
+                (kind, dumps(payload), now, now)
+            ).lastrowid
+        self.start()
+        self._wakeup.set()
+        return task_id
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM durable_tasks GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def _update_gauges(self):
+        counts = self.counts()
+        set_gauge("assistant_task_queue_depth", counts.get("pending", 0), queue="durable")
+        set_gauge("assistant_tasks_failed", counts.get("failed", 0))
+
+    def _claim(self) -> Optional[Tuple[int, str, str, int]]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, kind, payload, attempts FROM durable_tasks "
+                    "WHERE status = 'pending' AND run_at <= ? ORDER BY run_at, id LIMIT 1", (now,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE durable_tasks SET attempts = attempts + 1, run_at = ? WHERE id = ?",
+                                       (now + self.lease_seconds, row[0]))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def _work(self):
+        while True:
+            try:
+                task = self._claim()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to claim a durable task: {e}")
+                task = None
+            if task is None:
+                self._wakeup.wait(TASK_POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+            self._run(*task)
+            self._update_gauges()
+
+    def _run(self, task_id: int, kind: str, payload: str, attempts: int):
+        attempts += 1
+        try:
+            handler = _durable_handlers.get(kind)
+            if handler is None:
+                raise LookupError(f"No handler registered for durable task '{kind}'")
+            handler(loads(payload))
+        except Exception as e:
+            failed = attempts >= self.max_attempts
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE durable_tasks SET status = ?, run_at = ?, last_error = ? WHERE id = ?",
+                    ("failed" if failed else "pending", time.time() + self.retry_delay * 2 ** (attempts - 1), str(e), task_id)
+                )
+            inc_counter("assistant_tasks_total", queue="durable", task=kind, result="failed" if failed else "retry")
+            if failed:
+                logger.error(f"Durable task {task_id} ({kind}) failed after {attempts} attempts: {e}")
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM durable_tasks WHERE id = ?", (task_id,))
+        inc_counter("assistant_tasks_total", queue="durable", task=kind, result="ok")
+
+_task_queue = None
+_durable_queue = None
+
+def get_task_queue() -> TaskQueue:
+    global _task_queue
+    if _task_queue is None:
+        _task_queue = TaskQueue()
+    return _task_queue
+
+def get_durable_queue() -> DurableTaskQueue:
+    global _durable_queue
+    if _durable_queue is None:
+        _durable_queue = DurableTaskQueue()
+    return _durable_queue
+
+def run_in_background(fn: Callable, *args, **kwargs) -> bool:
+    return get_task_queue().submit(fn, *args, **kwargs)
+
+def enqueue_durable(kind: str, payload: Dict[str, Any]) -> int:
+    return get_durable_queue().enqueue(kind, payload)
@@ -0,0 +1,93 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Keyword taxonomy used to tag KB chunks at ingestion and to map a patient's
+# diagnosis to the topics its retrieval is scoped to. Matching is local and cheap.
+TOPIC_KEYWORDS: Dict[str, List[str]] = {
+    "ckd": ["chronic kidney disease", "ckd", "glomerular filtration rate", "gfr decline", "renal insufficiency"],
+    "aki": ["acute kidney injury", "aki", "acute tubular necrosis", "acute renal failure", "contrast nephropathy"],
+    "dialysis": ["end-stage renal disease", "end-stage kidney disease", "esrd", "dialysis", "hemodialysis", "peritoneal dialysis"],
+    "nephrotic": ["nephrotic syndrome", "nephrotic", "proteinuria", "minimal change disease", "membranous nephropathy", "focal segmental"],
+    "glomerulonephritis": ["glomerulonephritis", "iga nephropathy", "lupus nephritis", "anca", "crescentic", "nephritic"],
+    "hypertension": ["hypertension", "hypertensive", "nephrosclerosis", "blood pressure", "antihypertensive"],
+    "diabetic": ["diabetic nephropathy", "diabetic kidney disease", "diabetes", "diabetic"],
+    "polycystic": ["polycystic kidney disease", "polycystic", "adpkd", "renal cysts"],
+    "infection": ["pyelonephritis", "urinary tract infection", "uti", "bacteriuria", "urosepsis"],
+    "renovascular": ["renal artery stenosis", "renovascular", "fibromuscular dysplasia", "renal artery"],
+    "transplant": ["kidney transplant", "transplantation", "transplant", "allograft", "rejection", "tacrolimus", "mycophenolate"],
+}
+
+# Diagnosis keywords that route a patient to a specialty KB (when that KB exists)
+SPECIALTY_KEYWORDS: Dict[str, List[str]] = {
+    "transplant": ["kidney transplant", "renal transplant", "transplant", "allograft", "graft rejection"],
+    "cardiology": ["heart failure", "cardiomyopathy", "myocardial infarction", "coronary", "atrial fibrillation", "cardiorenal"],
+}
+
+# Minimum keyword hits for a chunk to be tagged with a topic
+MIN_TOPIC_HITS = 2
+
+_TOPIC_PATTERNS = {
+    topic: re.compile(r"\b(" + "|".join(re.escape(k) for k in keywords) + r")\b", re.IGNORECASE)
+    for topic, keywords in TOPIC_KEYWORDS.items()
+}
+
+_SPECIALTY_PATTERNS = {
+    specialty: re.compile(r"\b(" + "|".join(re.escape(k) for k in keywords) + r")\b", re.IGNORECASE)
+    for specialty, keywords in SPECIALTY_KEYWORDS.items()
+}
+
+_CHAPTER_RE = re.compile(r"^\s*CHAPTER\s+(\d+)\s*[:.\-]?\s*(.*)$", re.IGNORECASE | re.MULTILINE)
+_SECTION_RE = re.compile(r"^\s*SECTION\s+([IVXLC]+|\d+)\s*[:.\-]?\s*(.*)$", re.MULTILINE)
+
+def classify_text(text: str, min_hits: int = MIN_TOPIC_HITS) -> List[str]:
+    """
+    Returns topics whose keywords occur at least min_hits times, most hits first.
+    """
+    counts = []
+    for topic, pattern in _TOPIC_PATTERNS.items():
+        hits = len(pattern.findall(text))
+        if hits >= min_hits:
+            counts.append((hits, topic))
+    return [topic for _, topic in sorted(counts, reverse=True)]
+
+def diagnosis_topics(diagnosis: Optional[str]) -> List[str]:
+    # A diagnosis is short, so a single keyword hit is enough
+    if not diagnosis:
+        return []
+    return classify_text(diagnosis, min_hits=1)
+
+def diagnosis_specialty(diagnosis: Optional[str]) -> Optional[str]:
+    # First specialty whose keywords appear in the diagnosis
+    if not diagnosis:
+        return None
+    for specialty, pattern in _SPECIALTY_PATTERNS.items():
+        if pattern.search(diagnosis):
+            return specialty
+    return None
+
+def topic_metadata(topics: List[str]) -> Dict[str, object]:
+    """
+    Chroma metadata values must be scalars, so topics are stored as one boolean
+    flag per topic (filterable) plus a comma-separated list for display.
+    """
+    meta: Dict[str, object] = {f"topic_{t}": True for t in topics}
+    meta["topics"] = ",".join(topics)
+    return meta
+
+def topic_filter(topics: List[str]) -> Optional[Dict]:
+    if not topics:
+        return None
+    if len(topics) == 1:
+        return {f"topic_{topics[0]}": True}
+    return {"$or": [{f"topic_{t}": True} for t in topics]}
+
+def detect_headings(page_text: str) -> Tuple[Optional[Tuple[str, str]], Optional[Tuple[str, str]]]:
+    """
+    Finds the last SECTION and CHAPTER headings on a page, as (number, title) pairs.
+    """
+    section = chapter = None
+    for match in _SECTION_RE.finditer(page_text):
+        section = (match.group(1), match.group(2).strip())
+    for match in _CHAPTER_RE.finditer(page_text):
+        chapter = (match.group(1), match.group(2).strip())
+    return section, chapter
@@ -0,0 +1,238 @@
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+from backend.metrics import timed, timer, inc_counter
+from backend.codec import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+WEB_SEARCH_PROVIDER = os.getenv("WEB_SEARCH_PROVIDER", "stub")  # stub | fixture | http
+WEB_SEARCH_URL = os.getenv("WEB_SEARCH_URL")
+WEB_SEARCH_API_KEY = os.getenv("WEB_SEARCH_API_KEY")
+WEB_SEARCH_TIMEOUT = float(os.getenv("WEB_SEARCH_TIMEOUT", "5"))
+WEB_SEARCH_MAX_CONCURRENCY = int(os.getenv("WEB_SEARCH_MAX_CONCURRENCY", "4"))
+WEB_SEARCH_FIXTURES = os.getenv("WEB_SEARCH_FIXTURES", os.path.join(os.path.dirname(__file__), "web_search_fixtures.json"))
+
+WEB_SEARCH_CACHE_PATH = os.getenv("WEB_SEARCH_CACHE_PATH", "web_search_cache.db")
+WEB_SEARCH_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL", "86400"))
+WEB_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("WEB_SEARCH_CACHE_MAX_ENTRIES", "1000"))
+
+_provider = None
+_cache = None
+
+def normalize_query(query: str) -> str:
+    """
+    Cache key for a query: lowercase, punctuation stripped, whitespace collapsed.
+    "Latest dialysis guidelines?" and "latest  dialysis guidelines" share an entry.
+    """
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+# Providers
+class WebSearchProvider:
+    name = "base"
+
+    def search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def asearch(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        # Default: run the blocking search off the event loop
+        return await asyncio.to_thread(self.search, query, max_results)
+
+class StubSearchProvider(WebSearchProvider):
+    """
+    The original POC stub: one canned result for every query.
+    """
+    name = "stub"
+
+    def search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        return [
+            {
+                "title": "Latest Guidelines on Post-Discharge Nephrology Care",
+                "snippet": "Recent studies suggest monitoring weight daily is crucial...",
+                "url": "https://medical-journal.example.com/nephrology"
+            }
+        ][:max_results]
+
+class FixtureSearchProvider(WebSearchProvider):
+    """
+    Offline stand-in backed by a JSON file of {"match": [keywords], "results": [...]} entries.
+    The first entry whose keywords all appear in the normalized query wins; an entry
+    with an empty match list acts as the default.
+    """
+    name = "fixture"
+
+    def __init__(self, path: str = WEB_SEARCH_FIXTURES):
+        with open(path, "r") as f:
+            self.entries = json.load(f)
+
+    def search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        words = set(normalize_query(query).split())
+        for entry in self.entries:
+            if all(k in words for k in entry.get("match", [])):
+                return entry["results"][:max_results]
+        return []
+
+class HttpSearchProvider(WebSearchProvider):
+    """
+    Async HTTP provider for a JSON search API (GET {url}?q=...&count=N, bearer auth).
+    Requests run on a dedicated event loop thread so sync callers (graph nodes) and
+    async endpoints share one connection pool and one concurrency limit.
+    """
+    name = "http"
+
+    def __init__(self, url: str, api_key: Optional[str] = None, timeout: float = WEB_SEARCH_TIMEOUT,
+                 max_concurrency: int = WEB_SEARCH_MAX_CONCURRENCY):
+        import httpx
+        self.url = url
+        self.timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, daemon=True, name="web-search-loop").start()
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+        async def _init():
+            self._client = httpx.AsyncClient(headers=headers, timeout=timeout)
+            self._semaphore = asyncio.Semaphore(max_concurrency)
+        asyncio.run_coroutine_threadsafe(_init(), self._loop).result()
+
+    async def _fetch(self, query: str, max_results: int) -> List[Dict[str, Any]]:
+        async with self._semaphore:
+            response = await self._client.get(self.url, params={"q": query, "count": max_results})
+            response.raise_for_status()
+            data = response.json()
+        results = data.get("results", data if isinstance(data, list) else [])
+        return [
+            {
+                "title": r.get("title", ""),
+                "snippet": r.get("snippet") or r.get("content") or r.get("description", ""),
+                "url": r.get("url", ""),
+            }
+            for r in results[:max_results]
+        ]
+
+    def search(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        future = asyncio.run_coroutine_threadsafe(self._fetch(query, max_results), self._loop)
+        # Slack over the HTTP timeout covers waiting for a concurrency slot
+        return future.result(timeout=self.timeout * 2)
+
+    async def asearch(self, query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+        future = asyncio.run_coroutine_threadsafe(self._fetch(query, max_results), self._loop)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout * 2)
+
+def get_search_provider() -> WebSearchProvider:
+    global _provider
+    if _provider is None:
+        if WEB_SEARCH_PROVIDER == "http" and WEB_SEARCH_URL:
+            _provider = HttpSearchProvider(WEB_SEARCH_URL, WEB_SEARCH_API_KEY)
+        elif WEB_SEARCH_PROVIDER == "fixture":
+            _provider = FixtureSearchProvider()
+        else:
+            if WEB_SEARCH_PROVIDER == "http":
+                logger.warning("WEB_SEARCH_URL not set. Using stub web search provider.")
+            _provider = StubSearchProvider()
+    return _provider
+
+def set_search_provider(provider: WebSearchProvider):
+    global _provider
+    _provider = provider
+
+# Cache
+class WebSearchCache:
+    """
+    Persistent SQLite cache of search results keyed by normalized query and result count,
+    with TTL expiry and least-recently-used eviction beyond max_entries. Calls block on
+    SQLite, so async callers run them in a thread.
+    """
+
+    def __init__(self, path: str = WEB_SEARCH_CACHE_PATH, ttl: float = WEB_SEARCH_CACHE_TTL,
+                 max_entries: int = WEB_SEARCH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS web_search_cache (
+                query_key TEXT PRIMARY KEY,
+                results TEXT,
+                created_at REAL,
+                accessed_at REAL
+            )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_web_cache_accessed ON web_search_cache (accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(query: str, max_results: int) -> str:
+        # A shorter cached list can't answer a request for more results
+        return f"{max_results}:{normalize_query(query)}"
+
+    def get(self, query: str, max_results: int = 5) -> Optional[List[Dict[str, Any]]]:
+        key = self.key(query, max_results)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, created_at FROM web_search_cache WHERE query_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM web_search_cache WHERE query_key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE web_search_cache SET accessed_at = ? WHERE query_key = ?", (now, key))
+            self._conn.commit()
+        return loads(row[0])
+
+    def put(self, query: str, results: List[Dict[str, Any]], max_results: int = 5):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO web_search_cache (query_key, results, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (self.key(query, max_results), dumps(results), now, now)
+            )
+            # Expire stale entries, then evict least recently used over the size bound
+            self._conn.execute("DELETE FROM web_search_cache WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute('''
+                DELETE FROM web_search_cache WHERE query_key IN (
+                    SELECT query_key FROM web_search_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+            self._conn.commit()
+
+def get_search_cache() -> WebSearchCache:
+    global _cache
+    if _cache is None:
+        _cache = WebSearchCache()
+    return _cache
+
+@timed("web_search")
+def search_web(query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+    cache = get_search_cache()
+    cached = cache.get(query, max_results)
+    if cached is not None:
+        inc_counter("assistant_cache_hits_total", cache="web_search")
+        return cached
+    inc_counter("assistant_cache_misses_total", cache="web_search")
+    results = get_search_provider().search(query, max_results)
+    if results:
+        cache.put(query, results, max_results)
+    return results
+
+async def asearch_web(query: str, max_results: int = 5) -> List[Dict[str, Any]]:
+    with timer("web_search"):
+        # SQLite work stays off the event loop
+        cache = _cache or await asyncio.to_thread(get_search_cache)
+        cached = await asyncio.to_thread(cache.get, query, max_results)
+        if cached is not None:
+            inc_counter("assistant_cache_hits_total", cache="web_search")
+            return cached
+        inc_counter("assistant_cache_misses_total", cache="web_search")
+        results = await get_search_provider().asearch(query, max_results)
+        if results:
+            await asyncio.to_thread(cache.put, query, results, max_results)
+        return results
@@ -0,0 +1,97 @@
+import os
+import math
+import json
+import time
+import platform
+from typing import List, Dict, Any
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile; values need not be sorted.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+def latency_summary(samples: List[float], elapsed: float) -> Dict[str, Any]:
+    """
+    samples are per-operation latencies in seconds; elapsed is wall time for the whole run.
+    """
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+        "throughput_per_s": round(len(samples) / elapsed, 3) if elapsed > 0 else 0.0,
+    }
+
+def rss_mb(pid: int = None) -> float:
+    """
+    Resident set size of a process in MB (Linux /proc), falling back to peak RSS for this process.
+    """
+    status_path = f"/proc/{pid or os.getpid()}/status"
+    try:
+        with open(status_path) as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 2)
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 2)
+
+def bench(fn, iterations: int, warmup: int = 1) -> Dict[str, Any]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return latency_summary(samples, time.perf_counter() - start)
+
+def write_report(report: Dict[str, Any], path: str = None):
+    report.setdefault("meta", {}).update({
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    })
+    text = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(text)
+    print(text)
+
+def capture_files(path: str) -> List[str]:
+    """
+    A capture file plus its rotated backups (path.1 is the newest backup), oldest first.
+    """
+    backups = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        backups.append(f"{path}.{i}")
+        i += 1
+    return list(reversed(backups)) + ([path] if os.path.exists(path) else [])
+
+def read_capture(paths: List[str], kind: str) -> List[Dict[str, Any]]:
+    """
+    Reads capture records of one kind ("http" or "llm") from capture files, in timestamp order.
+    """
+    records = []
+    for base in paths:
+        for path in capture_files(base):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("kind") == kind:
+                        records.append(record)
+    return sorted(records, key=lambda r: r["ts"])
@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import random
+import argparse
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+import requests
+from benchmarks.common import latency_summary, rss_mb, write_report
+
+# End-to-end load generator for /agent/receptionist and /agent/clinical.
+# With --spawn it starts the stub LLM and a uvicorn backend pointed at it, so runs are reproducible.
+
+PATIENT_NAME = "John Smith"
+QUESTIONS = [
+    "I have swelling in my legs, what could this mean?",
+    "Which medications should I avoid?",
+    "What diet should I follow after discharge?",
+    "Is it normal to feel tired after discharge?",
+]
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, elapsed: float, ok: bool):
+        with self._lock:
+            if ok:
+                self.samples.setdefault(endpoint, []).append(elapsed)
+            else:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+def timed_post(http: requests.Session, recorder: Recorder, api_url: str, endpoint: str, payload: Dict, timeout: float):
+    start = time.perf_counter()
+    try:
+        res = http.post(f"{api_url}{endpoint}", json=payload, timeout=timeout)
+        ok = res.status_code == 200
+    except requests.RequestException:
+        res, ok = None, False
+    recorder.record(endpoint, time.perf_counter() - start, ok)
+    return res if ok else None
+
+def run_session(api_url: str, recorder: Recorder, questions_per_session: int, timeout: float, seed: int):
+    rng = random.Random(seed)
+    with requests.Session() as http:
+        res = http.post(f"{api_url}/session/start", timeout=timeout)
+        session_id = res.json()["session_id"]
+
+        timed_post(http, recorder, api_url, "/agent/receptionist",
+                   {"session_id": session_id, "message": PATIENT_NAME}, timeout)
+
+        patient = http.get(f"{api_url}/patient", params={"name": PATIENT_NAME}, timeout=timeout).json()
+        if patient.get("status") == "multiple_matches":
+            patient = patient["matches"][0]
+        patient_id = patient.get("patient_id")
+        if not patient_id:
+            return
+
+        for _ in range(questions_per_session):
+            timed_post(http, recorder, api_url, "/agent/clinical", {
+                "session_id": session_id,
+                "patient_id": patient_id,
+                "question": rng.choice(QUESTIONS),
+            }, timeout)
+
+def wait_for_server(api_url: str, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f"{api_url}/metrics", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.5)
+    raise RuntimeError(f"Backend at {api_url} did not come up within {timeout}s")
+
+def spawn_backend(port: int, stub_port: int, extra_env: Dict[str, str] = None) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["GROK_API_KEY"] = "stub"
+    env["GROK_API_URL"] = f"http://127.0.0.1:{stub_port}/v1/generate"
+    env.update(extra_env or {})
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test for the agent endpoints")
+    parser.add_argument("--api-url", default=os.getenv("API_URL", "http://localhost:8000"))
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--questions-per-session", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--spawn", action="store_true", help="Start the stub LLM and a local backend")
+    parser.add_argument("--port", type=int, default=8765, help="Backend port when --spawn is used")
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--stub-latency", type=float, default=0.2)
+    parser.add_argument("--stub-tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    backend_proc = None
+    stub = None
+    api_url = args.api_url
+    if args.spawn:
+        from benchmarks.stub_llm import start_stub_server
+        stub = start_stub_server(port=args.stub_port, latency=args.stub_latency,
+                                 tokens_per_second=args.stub_tokens_per_second)
+        backend_proc = spawn_backend(args.port, args.stub_port)
+        api_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        wait_for_server(api_url)
+        recorder = Recorder()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(run_session, api_url, recorder, args.questions_per_session, args.timeout, i)
+                       for i in range(args.sessions)]
+            for f in futures:
+                f.result()
+        elapsed = time.perf_counter() - start
+
+        report = {
+            "meta": {"kind": "load", "args": vars(args), "elapsed_s": round(elapsed, 3)},
+            "results": {
+                endpoint: dict(latency_summary(samples, elapsed), errors=recorder.errors.get(endpoint, 0))
+                for endpoint, samples in recorder.samples.items()
+            },
+        }
+        if backend_proc:
+            report["meta"]["backend_rss_mb"] = rss_mb(backend_proc.pid)
+        write_report(report, args.output)
+    finally:
+        if backend_proc:
+            backend_proc.terminate()
+            backend_proc.wait(timeout=10)
+        if stub:
+            stub.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import uuid
+import random
+import argparse
+import tempfile
+
+# Micro-benchmarks for the hot-path building blocks. Runs against a throwaway
+# Chroma directory and SQLite DB so results don't depend on local data.
+_workdir = tempfile.mkdtemp(prefix="pdai-bench-")
+os.environ.setdefault("CHROMA_DB_DIR", os.path.join(_workdir, "chroma_db"))
+
+from benchmarks.common import bench, rss_mb, write_report
+import backend.patient_db as patient_db
+from backend.rag import chunk_text, embed_texts, retrieve, upsert_chunks_to_chroma
+
+WORDS = ("kidney renal nephron dialysis creatinine edema sodium potassium glomerular "
+         "filtration proteinuria hypertension diuretic transplant urine fluid").split()
+
+QUERIES = [
+    "I have swelling in my legs, what could this mean?",
+    "Can I take ibuprofen for pain after discharge?",
+    "How much fluid should I drink per day?",
+    "What are the side effects of furosemide?",
+]
+
+def synthetic_text(n_words: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+def seed_kb(n_chunks: int):
+    chunks = [{
+        "text": synthetic_text(600, seed=i),
+        "source": "benchmark",
+        "page": i // 3 + 1,
+        "chunk_id": str(uuid.uuid4()),
+    } for i in range(n_chunks)]
+    upsert_chunks_to_chroma(chunks)
+
+def seed_patients(n_patients: int):
+    patient_db.DB_PATH = os.path.join(_workdir, "patients.db")
+    patient_db.init_db()
+    rng = random.Random(0)
+    for i in range(n_patients):
+        patient_db.create_patient({
+            "patient_id": str(uuid.uuid4()),
+            "patient_name": f"Patient{i} {rng.choice(['Smith', 'Jones', 'Brown', 'Lee'])}",
+            "discharge_date": "2024-01-15",
+            "primary_diagnosis": "Acute kidney injury",
+            "medications": ["Furosemide 40mg daily"],
+            "follow_up": "2 weeks",
+            "warning_signs": ["Swelling"],
+            "discharge_instructions": "Monitor weight daily.",
+            "notes": "Benchmark record.",
+        })
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for chunking, embedding, retrieval and patient lookup")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--kb-chunks", type=int, default=500)
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--embed-batch", type=int, default=16)
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    report = {"meta": {"kind": "micro", "args": vars(args)}, "results": {}}
+    results = report["results"]
+
+    page_text = synthetic_text(5000)
+    results["chunk_text"] = bench(lambda: chunk_text(page_text), args.iterations)
+
+    batch = [synthetic_text(600, seed=i) for i in range(args.embed_batch)]
+    results["embed_texts"] = bench(lambda: embed_texts(batch), max(1, args.iterations // 10))
+    results["embed_texts"]["batch_size"] = args.embed_batch
+
+    seed_kb(args.kb_chunks)
+    rng = random.Random(0)
+    results["retrieve"] = bench(lambda: retrieve(rng.choice(QUERIES)), args.iterations)
+    results["retrieve"]["kb_chunks"] = args.kb_chunks
+
+    seed_patients(args.patients)
+    results["find_patient_by_name"] = bench(lambda: patient_db.find_patient_by_name("Smith"), args.iterations)
+    results["find_patient_by_name"]["patients"] = args.patients
+
+    report["meta"]["rss_mb"] = rss_mb()
+    write_report(report, args.output)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Any, Tuple
+from backend.grok_wrapper import mock_grok_response
+from backend.capture import prompt_digest, rehydrate
+from benchmarks.common import read_capture
+
+# LLM stand-in that answers with responses recorded by traffic capture, so a replayed
+# trace sees the same LLM output (and, optionally, latency) as the original run.
+# Prompts are matched by digest; repeated prompts get their recorded responses in order.
+# Unmatched prompts fall back to the mock response.
+
+class RecordedLLM:
+    def __init__(self, records: List[Dict[str, Any]], names_by_id: Dict[str, str], latency_mode: str = "recorded"):
+        self.latency_mode = latency_mode
+        self._responses: Dict[str, List[Tuple[str, float]]] = {}
+        for r in records:
+            text = rehydrate(r.get("text", ""), names_by_id)
+            self._responses.setdefault(r["prompt_sha256"], []).append((text, r.get("latency_ms", 0) / 1000))
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def respond(self, prompt: str) -> Tuple[str, float]:
+        digest = prompt_digest(prompt)
+        with self._lock:
+            recorded = self._responses.get(digest)
+            if not recorded:
+                self.misses += 1
+                return mock_grok_response(prompt), 0.0
+            # Past the end of the recording, keep returning the last response
+            pos = self._positions.get(digest, 0)
+            self._positions[digest] = pos + 1
+            self.hits += 1
+            text, latency = recorded[min(pos, len(recorded) - 1)]
+        return text, latency if self.latency_mode == "recorded" else 0.0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "recorded_prompts": len(self._responses)}
+
+class RecordedLLMHandler(BaseHTTPRequestHandler):
+    recorded: RecordedLLM = None
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_error(400, "Invalid JSON")
+            return
+        text, latency = self.recorded.respond(payload.get("prompt", ""))
+        time.sleep(latency)
+        self._send_json({"text": text})
+
+    def do_GET(self):
+        self._send_json(self.recorded.stats())
+
+    def _send_json(self, data: Dict[str, Any]):
+        body = json.dumps(data).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+def patient_names() -> Dict[str, str]:
+    # patient_id -> name from the local patient DB, to restore redacted names
+    from backend.patient_db import list_patients
+    return {p['patient_id']: p['patient_name'] for p in list_patients()}
+
+def start_recorded_llm_server(capture_paths: List[str], host: str = "127.0.0.1", port: int = 9101,
+                              latency_mode: str = "recorded") -> ThreadingHTTPServer:
+    """
+    Starts the recorded-response stub in a daemon thread; server.recorded holds hit/miss stats.
+    """
+    recorded = RecordedLLM(read_capture(capture_paths, "llm"), patient_names(), latency_mode)
+    handler = type("BoundRecordedLLMHandler", (RecordedLLMHandler,), {"recorded": recorded})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.recorded = recorded
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve LLM responses recorded by traffic capture")
+    parser.add_argument("capture", nargs="+", help="Capture JSONL file(s); rotated backups are included")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--latency", choices=["recorded", "zero"], default="recorded",
+                        help="Replay recorded LLM latency or answer immediately")
+    args = parser.parse_args()
+
+    server = start_recorded_llm_server(args.capture, args.host, args.port, args.latency)
+    print(f"Recorded LLM listening on http://{args.host}:{args.port}/v1/generate "
+          f"({server.recorded.stats()['recorded_prompts']} recorded prompts, latency={args.latency})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
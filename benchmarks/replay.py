@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import argparse
+import threading
+from typing import Dict, List, Any, Optional
+import requests
+from backend.capture import rehydrate
+from benchmarks.common import latency_summary, percentile, read_capture, rss_mb, write_report
+from benchmarks.load_test import wait_for_server, spawn_backend
+from benchmarks.recorded_llm import patient_names
+
+# Replays captured traffic (CAPTURE_ENABLED=true) against a backend, preserving
+# per-session ordering and inter-arrival timing (scaled by --speed), and compares
+# replayed latencies to the recorded ones. With --spawn the LLM is served from the
+# same capture by benchmarks/recorded_llm.py, so prompt/answer behavior matches.
+
+class ReplayRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.replayed: Dict[str, List[float]] = {}
+        self.recorded: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.status_mismatches: Dict[str, int] = {}
+        self.skipped: Dict[str, int] = {}
+
+    def record(self, path: str, elapsed: Optional[float], recorded_ms: float, status: Optional[int], recorded_status: int):
+        with self._lock:
+            if elapsed is None:
+                self.errors[path] = self.errors.get(path, 0) + 1
+                return
+            self.replayed.setdefault(path, []).append(elapsed)
+            self.recorded.setdefault(path, []).append(recorded_ms / 1000)
+            if status != recorded_status:
+                self.status_mismatches[path] = self.status_mismatches.get(path, 0) + 1
+
+    def skip(self, path: str):
+        with self._lock:
+            self.skipped[path] = self.skipped.get(path, 0) + 1
+
+class SessionMap:
+    """
+    Recorded session id -> session id issued by the replay target.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def set(self, recorded: str, replayed: str):
+        with self._lock:
+            self._ids[recorded] = replayed
+
+    def get(self, recorded: Optional[str]) -> Optional[str]:
+        with self._lock:
+            return self._ids.get(recorded, recorded)
+
+def group_by_session(records: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    # One lane per session; requests without a session (e.g. /patient lookups) share a lane
+    lanes: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for r in records:
+        lanes.setdefault(r.get("session_id"), []).append(r)
+    return list(lanes.values())
+
+def replay_request(http: requests.Session, api_url: str, record: Dict[str, Any], sessions: SessionMap,
+                   names_by_id: Dict[str, str], timeout: float):
+    """
+    Sends one recorded request; returns (elapsed seconds or None on transport error, status).
+    Streaming responses are read to the end so the timing covers the full answer.
+    """
+    payload = rehydrate(record.get("payload"), names_by_id)
+    params = rehydrate(record.get("query") or None, names_by_id)
+    if isinstance(payload, dict) and "session_id" in payload:
+        payload = dict(payload, session_id=sessions.get(payload["session_id"]))
+    url = f"{api_url}{record['path']}"
+    start = time.perf_counter()
+    try:
+        if record["method"] == "GET":
+            res = http.get(url, params=params, timeout=timeout)
+        else:
+            res = http.request(record["method"], url, params=params, json=payload, timeout=timeout,
+                               stream=record["path"].endswith("/stream"))
+            for _ in res.iter_content(chunk_size=None):
+                pass
+        elapsed = time.perf_counter() - start
+    except requests.RequestException:
+        return None, None
+    if record["path"] == "/session/start" and res.status_code == 200 and record.get("session_id"):
+        sessions.set(record["session_id"], res.json()["session_id"])
+    return elapsed, res.status_code
+
+def run_lane(api_url: str, lane: List[Dict[str, Any]], recorder: ReplayRecorder, sessions: SessionMap,
+             names_by_id: Dict[str, str], t0: float, replay_start: float, speed: float, timeout: float):
+    with requests.Session() as http:
+        for record in lane:
+            if record.get("truncated"):
+                recorder.skip(record["path"])
+                continue
+            if speed > 0:
+                delay = replay_start + (record["ts"] - t0) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            elapsed, status = replay_request(http, api_url, record, sessions, names_by_id, timeout)
+            recorder.record(record["path"], elapsed, record.get("duration_ms", 0.0), status, record.get("status"))
+
+def compare(recorder: ReplayRecorder, elapsed: float) -> Dict[str, Any]:
+    results = {}
+    for path in sorted(set(recorder.replayed) | set(recorder.errors) | set(recorder.skipped)):
+        replayed = recorder.replayed.get(path, [])
+        recorded = recorder.recorded.get(path, [])
+        results[path] = {
+            "replayed": latency_summary(replayed, elapsed),
+            "recorded": latency_summary(recorded, elapsed),
+            "p50_delta_ms": round((percentile(replayed, 50) - percentile(recorded, 50)) * 1000, 3),
+            "p95_delta_ms": round((percentile(replayed, 95) - percentile(recorded, 95)) * 1000, 3),
+            "errors": recorder.errors.get(path, 0),
+            "status_mismatches": recorder.status_mismatches.get(path, 0),
+            "skipped": recorder.skipped.get(path, 0),
+        }
+    return results
+
+def baseline_deltas(results: Dict[str, Any], baseline_path: str) -> Dict[str, Any]:
+    """
+    p50/p95 change of each path's replayed latency against an earlier replay report.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f).get("results", {})
+    deltas = {}
+    for path, result in results.items():
+        before = baseline.get(path, {}).get("replayed")
+        if not before:
+            continue
+        deltas[path] = {
+            "p50_delta_ms": round(result["replayed"]["p50_ms"] - before["p50_ms"], 3),
+            "p95_delta_ms": round(result["replayed"]["p95_ms"] - before["p95_ms"], 3),
+        }
+    return deltas
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured traffic and compare latencies")
+    parser.add_argument("capture", nargs="+", help="Capture JSONL file(s); rotated backups are included")
+    parser.add_argument("--api-url", default=os.getenv("API_URL", "http://localhost:8000"))
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Time scale for inter-arrival gaps (2 = twice as fast, 0 = no waiting)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--spawn", action="store_true",
+                        help="Start a local backend with the LLM served from the capture")
+    parser.add_argument("--port", type=int, default=8765, help="Backend port when --spawn is used")
+    parser.add_argument("--stub-port", type=int, default=9101)
+    parser.add_argument("--llm-latency", choices=["recorded", "zero"], default="recorded",
+                        help="With --spawn: replay recorded LLM latency or answer immediately")
+    parser.add_argument("--baseline", help="Earlier replay report to diff p50/p95 against")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    records = read_capture(args.capture, "http")
+    if not records:
+        parser.error("No captured requests found")
+    names_by_id = patient_names()
+
+    backend_proc = None
+    stub = None
+    api_url = args.api_url
+    if args.spawn:
+        from benchmarks.recorded_llm import start_recorded_llm_server
+        stub = start_recorded_llm_server(args.capture, port=args.stub_port, latency_mode=args.llm_latency)
+        backend_proc = spawn_backend(args.port, args.stub_port, {"CAPTURE_ENABLED": "false"})
+        api_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        wait_for_server(api_url)
+        recorder = ReplayRecorder()
+        sessions = SessionMap()
+        lanes = group_by_session(records)
+        t0 = records[0]["ts"]
+        start = time.perf_counter()
+        threads = [threading.Thread(target=run_lane, args=(api_url, lane, recorder, sessions, names_by_id,
+                                                            t0, start, args.speed, args.timeout))
+                   for lane in lanes]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        results = compare(recorder, elapsed)
+        report = {
+            "meta": {
+                "kind": "replay",
+                "args": vars(args),
+                "elapsed_s": round(elapsed, 3),
+                "recorded_span_s": round(records[-1]["ts"] - t0, 3),
+                "requests": len(records),
+                "sessions": len(lanes),
+            },
+            "results": results,
+        }
+        if stub:
+            report["meta"]["llm"] = stub.recorded.stats()
+        if backend_proc:
+            report["meta"]["backend_rss_mb"] = rss_mb(backend_proc.pid)
+        if args.baseline:
+            report["baseline"] = baseline_deltas(results, args.baseline)
+        write_report(report, args.output)
+    finally:
+        if backend_proc:
+            backend_proc.terminate()
+            backend_proc.wait(timeout=10)
+        if stub:
+            stub.shutdown()
+
+if __name__ == "__main__":
+    main()
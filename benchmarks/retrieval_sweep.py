@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from benchmarks.common import latency_summary, write_report
+from backend.rag import chunk_text, build_rag_prompt, EMBEDDING_MODEL_NAME
+from backend.kb_artifact import KBArtifact, write_artifact
+
+# Retrieval quality vs cost over a grid of chunk sizes, overlaps, k, embedding models and
+# distance metrics. The PDF's page text is extracted once and cached. Each (model, chunk
+# size, overlap, metric) candidate is chunked the way ingest_reference does (per page),
+# embedded and written as a KB artifact, with builds running in parallel. Candidates are
+# then scored one at a time, so query latencies aren't skewed by concurrent builds,
+# against a labeled set of questions, one JSON object per line:
+#   {"question": "What causes hyperkalemia in CKD?", "pages": [412, 413]}
+# A question counts as answered by a chunk from any of its pages. Output is one row per
+# candidate and k, plus the Pareto-optimal rows over the objectives below.
+
+# The production settings: chunk_text defaults, retrieve's k, Chroma's default metric
+BASELINE = {"model": EMBEDDING_MODEL_NAME, "chunk_size": 800, "overlap": 100, "k": 5, "metric": "l2"}
+METRICS = ("l2", "cosine", "ip")
+# (field, True if higher is better)
+PARETO_OBJECTIVES = [("recall_at_k", True), ("mrr", True), ("query_p95_ms", False),
+                     ("index_bytes", False), ("prompt_tokens_mean", False)]
+
+def approx_tokens(text: str) -> int:
+    # Same approximation as chunk_text: a token is roughly 4 characters
+    return len(text) // 4
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_pages(pdf_path: str, cache_dir: str) -> List[Tuple[int, str]]:
+    """
+    (1-based page number, text) for each page with text. Extraction is cached in
+    cache_dir, keyed by the PDF's content hash.
+    """
+    cache_path = os.path.join(cache_dir, f"pages-{file_sha256(pdf_path)[:16]}.json")
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return [(page, text) for page, text in json.load(f)]
+
+    from pypdf import PdfReader
+    pages = []
+    for i, page in enumerate(PdfReader(pdf_path).pages):
+        text = page.extract_text()
+        if text:
+            pages.append((i + 1, text))
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.tmp{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(pages, f)
+    os.replace(tmp_path, cache_path)
+    return pages
+
+def load_questions(path: str) -> List[Dict[str, Any]]:
+    questions = []
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if not item.get("question") or not item.get("pages"):
+                raise ValueError(f"{path}:{n}: each line needs 'question' and a non-empty 'pages' list")
+            questions.append({"question": item["question"], "pages": {int(p) for p in item["pages"]}})
+    return questions
+
+class Embedder:
+    """
+    One embedding model shared by the build workers. Chunk texts already embedded for an
+    earlier candidate (e.g. pages shorter than every chunk size) are not encoded again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.model = SentenceTransformer(name)
+        self._cache: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            missing = [t for t in dict.fromkeys(texts) if t not in self._cache]
+        if missing:
+            vectors = np.asarray(self.model.encode(missing), dtype=np.float32)
+            with self._lock:
+                self._cache.update(zip(missing, vectors))
+        with self._lock:
+            return np.stack([self._cache[t] for t in texts])
+
+    def encode_queries(self, questions: List[str]) -> Tuple[np.ndarray, List[float]]:
+        """
+        Question embeddings, each encoded on its own as embed_query does, with per-question latency.
+        """
+        self.model.encode([questions[0]])
+        vectors, samples = [], []
+        for question in questions:
+            start = time.perf_counter()
+            vectors.append(self.model.encode([question])[0])
+            samples.append(time.perf_counter() - start)
+        return np.asarray(vectors, dtype=np.float32), samples
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def index_vectors(vectors: np.ndarray, metric: str) -> np.ndarray:
+    """
+    Chunk vectors transformed so the artifact's exact L2 search ranks by the given metric.
+    """
+    if metric == "cosine":
+        # On unit vectors L2 distance is monotonic in cosine distance
+        return _normalized(vectors)
+    if metric == "ip":
+        # Maximum inner product as L2: append sqrt(M - |x|^2) with M the largest squared norm;
+        # with a 0 appended to the query, |q - x'|^2 = |q|^2 + M - 2 q.x
+        squared = np.einsum("ij,ij->i", vectors, vectors)
+        extra = np.sqrt(np.maximum(squared.max() - squared, 0))[:, None]
+        return np.hstack([vectors, extra]).astype(np.float32)
+    return vectors
+
+def query_vectors(vectors: np.ndarray, metric: str) -> np.ndarray:
+    if metric == "cosine":
+        return _normalized(vectors)
+    if metric == "ip":
+        return np.hstack([vectors, np.zeros((len(vectors), 1), dtype=np.float32)])
+    return vectors
+
+def build_candidates(embedder: Embedder, pages: List[Tuple[int, str]], source: str, chunk_size: int,
+                     overlap: int, metrics: List[str], out_dir: str) -> List[Dict[str, Any]]:
+    """
+    Chunks and embeds the pages once for (model, chunk_size, overlap), then writes one artifact per metric.
+    """
+    start = time.perf_counter()
+    texts, chunk_pages = [], []
+    for page, text in pages:
+        for chunk in chunk_text(text, chunk_size, overlap):
+            texts.append(chunk)
+            chunk_pages.append(page)
+    vectors = embedder.encode(texts)
+    embed_s = time.perf_counter() - start
+
+    ids = [f"chunk-{i}" for i in range(len(texts))]
+    metadatas = [{"source": source, "page": page} for page in chunk_pages]
+    candidates = []
+    for metric in metrics:
+        name = f"{embedder.name.replace('/', '_')}-cs{chunk_size}-ov{overlap}-{metric}"
+        path = os.path.join(out_dir, f"{name}.kbpack")
+        write_artifact(path, name, embedder.name, ids, texts, metadatas, index_vectors(vectors, metric))
+        candidates.append({"model": embedder.name, "chunk_size": chunk_size, "overlap": overlap, "metric": metric,
+                           "chunks": len(texts), "embed_s": round(embed_s, 3),
+                           "index_bytes": os.path.getsize(path), "path": path})
+    return candidates
+
+def evaluate(candidate: Dict[str, Any], questions: List[Dict[str, Any]], query_embeddings: np.ndarray,
+             embed_samples: List[float], k_values: List[int]) -> List[Dict[str, Any]]:
+    """
+    One row per k: recall@k (share of a question's labeled pages retrieved), hit rate, MRR
+    of the first relevant chunk, search and end-to-end query latency, and prompt tokens.
+    """
+    artifact = KBArtifact(candidate["path"], verify=False)
+    queries = query_vectors(query_embeddings, candidate["metric"])
+    rows = []
+    for k in k_values:
+        recall, hits, reciprocal_ranks, search_samples, query_samples, prompt_tokens = [], 0, [], [], [], []
+        start = time.perf_counter()
+        for item, query, embed_s in zip(questions, queries, embed_samples):
+            t0 = time.perf_counter()
+            retrieved = artifact.search([query], k)[0]
+            search_s = time.perf_counter() - t0
+            search_samples.append(search_s)
+            query_samples.append(embed_s + search_s)
+
+            retrieved_pages = [chunk['page'] for chunk in retrieved]
+            found = item["pages"].intersection(retrieved_pages)
+            recall.append(len(found) / len(item["pages"]))
+            hits += bool(found)
+            rank = next((i for i, page in enumerate(retrieved_pages, 1) if page in item["pages"]), None)
+            reciprocal_ranks.append(1 / rank if rank else 0.0)
+            prompt_tokens.append(approx_tokens(build_rag_prompt(item["question"], retrieved)))
+        elapsed = time.perf_counter() - start
+
+        search = latency_summary(search_samples, elapsed)
+        query = latency_summary(query_samples, elapsed)
+        row = {key: candidate[key] for key in ("model", "chunk_size", "overlap", "metric", "chunks", "index_bytes")}
+        row.update({
+            "k": k,
+            "id": f"{candidate['model']}/cs{candidate['chunk_size']}/ov{candidate['overlap']}/k{k}/{candidate['metric']}",
+            "recall_at_k": round(float(np.mean(recall)), 4),
+            "hit_rate": round(hits / len(questions), 4),
+            "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+            "search_p50_ms": search["p50_ms"],
+            "search_p95_ms": search["p95_ms"],
+            "query_p50_ms": query["p50_ms"],
+            "query_p95_ms": query["p95_ms"],
+            "prompt_tokens_mean": round(float(np.mean(prompt_tokens)), 1),
+            "prompt_tokens_max": max(prompt_tokens),
+        })
+        row["baseline"] = all(row[key] == value for key, value in BASELINE.items())
+        rows.append(row)
+    return rows
+
+def pareto_front(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Rows not dominated by any other (no worse on every objective and better on one), best recall first.
+    """
+    def at_least_as_good(a, b):
+        return all(a[f] >= b[f] if higher else a[f] <= b[f] for f, higher in PARETO_OBJECTIVES)
+
+    front = [row for row in rows
+             if not any(other is not row and at_least_as_good(other, row) and
+                        any(other[f] != row[f] for f, _ in PARETO_OBJECTIVES) for other in rows)]
+    return sorted(front, key=lambda r: (-r["recall_at_k"], -r["mrr"], r["query_p95_ms"]))
+
+def int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+def str_list(value: str) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality/latency sweep over chunking, k, models and metrics")
+    parser.add_argument("pdf", help="Reference PDF (as ingested with scripts/ingest_reference.py)")
+    parser.add_argument("--questions", required=True, help="Labeled questions, JSONL with 'question' and 'pages'")
+    parser.add_argument("--chunk-sizes", type=int_list, default=[200, 400, 800], help="Tokens, comma-separated")
+    parser.add_argument("--overlaps", type=int_list, default=[0, 100], help="Tokens, comma-separated")
+    parser.add_argument("--k", type=int_list, default=[3, 5, 10])
+    parser.add_argument("--models", type=str_list, default=[EMBEDDING_MODEL_NAME, "all-MiniLM-L6-v2"])
+    parser.add_argument("--metrics", type=str_list, default=list(METRICS), help=f"Any of {', '.join(METRICS)}")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="Parallel index builds")
+    parser.add_argument("--cache-dir", default="./sweep_cache", help="Where extracted page text is cached")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    unknown = [m for m in args.metrics if m not in METRICS]
+    if unknown:
+        parser.error(f"Unknown metric(s): {', '.join(unknown)}")
+    grid = [(size, overlap) for size in args.chunk_sizes for overlap in args.overlaps if 0 <= overlap < size]
+    if not grid:
+        parser.error("No valid (chunk size, overlap) pairs; overlap must be smaller than chunk size")
+
+    pages = load_pages(args.pdf, args.cache_dir)
+    questions = load_questions(args.questions)
+    source = os.path.basename(args.pdf)
+    embedders = {name: Embedder(name) for name in args.models}
+    query_embeddings = {name: e.encode_queries([q["question"] for q in questions]) for name, e in embedders.items()}
+
+    with tempfile.TemporaryDirectory(prefix="pdai-sweep-") as out_dir:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(build_candidates, embedders[model], pages, source, size, overlap, args.metrics, out_dir)
+                       for model in args.models for size, overlap in grid]
+            candidates = [c for future in futures for c in future.result()]
+        build_s = time.perf_counter() - start
+
+        rows = []
+        for candidate in candidates:
+            vectors, embed_samples = query_embeddings[candidate["model"]]
+            rows.extend(evaluate(candidate, questions, vectors, embed_samples, args.k))
+
+    front = pareto_front(rows)
+    front_ids = {row["id"] for row in front}
+    for row in rows:
+        row["pareto"] = row["id"] in front_ids
+    report = {
+        "meta": {"kind": "retrieval_sweep", "args": vars(args), "pages": len(pages), "questions": len(questions),
+                 "candidates": len(candidates), "build_s": round(build_s, 3), "baseline": BASELINE,
+                 "pareto_objectives": [f for f, _ in PARETO_OBJECTIVES]},
+        "results": {
+            "models": {name: latency_summary(samples, sum(samples))
+                       for name, (_, samples) in query_embeddings.items()},
+            "pareto": [row["id"] for row in front],
+            "configs": sorted(rows, key=lambda r: (-r["recall_at_k"], -r["mrr"], r["query_p95_ms"])),
+        },
+    }
+    write_report(report, args.output)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import sys
+import json
+import argparse
+import tracemalloc
+from benchmarks.common import bench, write_report
+from backend.codec import dumps_bytes, orjson
+from backend.records import Chunk, PatientRecord, ClinicalResponse, ReceptionistResponse
+
+# Before/after for the response hot path: the plain dicts serialized the way FastAPI
+# does for a returned dict (jsonable_encoder, then json.dumps) versus the slotted
+# records in backend.records serialized by backend.codec. Reports time and peak
+# memory per response, and the size of the response objects themselves.
+try:
+    from fastapi.encoders import jsonable_encoder
+except ImportError:
+    jsonable_encoder = None
+
+CHUNK_TEXT = ("Patients with chronic kidney disease should monitor fluid intake, weigh "
+              "themselves daily and report swelling or reduced urine output. ") * 8
+
+PATIENT_ROW = {
+    "patient_id": "bench-0001",
+    "patient_name": "Benchmark Patient",
+    "discharge_date": "2024-01-15",
+    "primary_diagnosis": "Chronic kidney disease stage 3",
+    "medications": ["Furosemide 40mg daily", "Lisinopril 10mg daily", "Calcium carbonate 500mg"],
+    "follow_up": "Nephrology clinic in 2 weeks",
+    "warning_signs": ["Swelling in legs", "Shortness of breath", "Reduced urine output"],
+    "discharge_instructions": "Low sodium diet. Monitor weight daily.",
+    "notes": "Benchmark record.",
+}
+
+def clinical_dict(k: int) -> dict:
+    return {
+        "answer_text": "Swelling can indicate fluid retention; contact your care team if it worsens.",
+        "sources": [{"text": CHUNK_TEXT, "source": "comprehensive-clinical-nephrology.pdf",
+                     "page": 100 + i, "chunk_id": f"chunk-{i}", "score": 0.1 * i} for i in range(k)],
+        "source_type": "KB",
+        "session_id": "bench-session",
+        "timestamp": "2025-11-20T12:00:00+05:30",
+        "sources_total": k,
+    }
+
+def clinical_record(k: int) -> ClinicalResponse:
+    return ClinicalResponse(
+        answer_text="Swelling can indicate fluid retention; contact your care team if it worsens.",
+        sources=[Chunk(CHUNK_TEXT, "comprehensive-clinical-nephrology.pdf", 100 + i, f"chunk-{i}", 0.1 * i)
+                 for i in range(k)],
+        source_type="KB",
+        session_id="bench-session",
+        timestamp="2025-11-20T12:00:00+05:30",
+        sources_total=k,
+    )
+
+def receptionist_dict() -> dict:
+    return {"answer_text": "I found your discharge record.", "sources": [], "source_type": "System",
+            "patient": dict(PATIENT_ROW), "session_id": "bench-session",
+            "timestamp": "2025-11-20T12:00:00+05:30"}
+
+def receptionist_record() -> ReceptionistResponse:
+    return ReceptionistResponse(answer_text="I found your discharge record.", source_type="System",
+                                session_id="bench-session", patient=PatientRecord.from_dict(PATIENT_ROW),
+                                timestamp="2025-11-20T12:00:00+05:30")
+
+def encode_before(payload) -> bytes:
+    if jsonable_encoder is not None:
+        payload = jsonable_encoder(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def peak_bytes(fn) -> int:
+    """
+    Peak memory traced while one call runs (its transient allocations plus the result).
+    """
+    fn()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def retained_bytes(fn, iterations: int) -> int:
+    """
+    Memory held per object returned by fn, averaged over iterations live objects.
+    """
+    fn()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        keep = [fn() for _ in range(iterations)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del keep
+    return round(sum(s.size_diff for s in after.compare_to(before, "filename")) / iterations)
+
+def main():
+    parser = argparse.ArgumentParser(description="Response serialization: dicts + json vs records + backend.codec")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--sources", type=int, default=5, help="Chunks per clinical response")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    report = {"meta": {"kind": "serialization", "args": vars(args),
+                       "codec": "orjson" if orjson is not None else "json",
+                       "jsonable_encoder": jsonable_encoder is not None}, "results": {}}
+    results = report["results"]
+
+    lanes = {
+        "clinical": (lambda: encode_before(clinical_dict(args.sources)),
+                     lambda: dumps_bytes(clinical_record(args.sources))),
+        "receptionist": (lambda: encode_before(receptionist_dict()),
+                         lambda: dumps_bytes(receptionist_record())),
+    }
+    builders = {
+        "clinical": (lambda: clinical_dict(args.sources), lambda: clinical_record(args.sources)),
+        "receptionist": (receptionist_dict, receptionist_record),
+    }
+    for name, (before, after) in lanes.items():
+        for variant, fn in (("dict_json", before), ("record_codec", after)):
+            result = bench(fn, args.iterations, warmup=10)
+            result["peak_bytes"] = peak_bytes(fn)
+            result["response_bytes"] = len(fn())
+            results[f"{name}_{variant}"] = result
+
+        # The response object a handler builds and holds until it is rendered
+        build_dict, build_record = builders[name]
+        results[f"{name}_object_bytes"] = {
+            "dict": retained_bytes(build_dict, min(args.iterations, 500)),
+            "record": retained_bytes(build_record, min(args.iterations, 500)),
+        }
+
+    write_report(report, args.output)
+
+if __name__ == "__main__":
+    sys.exit(main())
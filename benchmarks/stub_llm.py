@@ -0,0 +1,105 @@
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from backend.grok_wrapper import mock_grok_response
+
+# Local stand-in for the Grok endpoint. Point the backend at it with
+#   GROK_API_KEY=stub GROK_API_URL=http://127.0.0.1:9100/v1/generate
+# Each response waits `latency` seconds plus one token interval per output word.
+# Fault injection: a fraction of calls fail with HTTP 500 (`error_rate`) or take
+# `slow_latency` seconds instead (`slow_rate`); `slow_next` makes the next N calls slow.
+
+class StubLLMConfig:
+    latency = 0.2
+    tokens_per_second = 50.0
+    error_rate = 0.0
+    slow_rate = 0.0
+    slow_latency = 5.0
+    slow_next = 0
+    calls = 0
+    _lock = threading.Lock()
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_error(400, "Invalid JSON")
+            return
+
+        with StubLLMConfig._lock:
+            StubLLMConfig.calls += 1
+            slow = StubLLMConfig.slow_next > 0 or random.random() < StubLLMConfig.slow_rate
+            StubLLMConfig.slow_next = max(0, StubLLMConfig.slow_next - 1)
+        if random.random() < StubLLMConfig.error_rate:
+            self.send_error(500, "Injected fault")
+            return
+
+        text = mock_grok_response(payload.get("prompt", ""))
+        n_tokens = min(len(text.split()), payload.get("max_tokens", 512))
+        delay = StubLLMConfig.latency
+        if StubLLMConfig.tokens_per_second > 0:
+            delay += n_tokens / StubLLMConfig.tokens_per_second
+        if slow:
+            delay = StubLLMConfig.slow_latency
+        time.sleep(delay)
+
+        body = json.dumps({"text": text, "usage": {"completion_tokens": n_tokens}}).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client gave up (timeout or a hedged attempt that lost the race)
+            pass
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 9100, latency: float = 0.2,
+                      tokens_per_second: float = 50.0, error_rate: float = 0.0,
+                      slow_rate: float = 0.0, slow_latency: float = 5.0) -> ThreadingHTTPServer:
+    """
+    Starts the stub in a daemon thread and returns the server (call shutdown() to stop).
+    Faults can be changed while it runs by setting StubLLMConfig attributes.
+    """
+    StubLLMConfig.latency = latency
+    StubLLMConfig.tokens_per_second = tokens_per_second
+    StubLLMConfig.error_rate = error_rate
+    StubLLMConfig.slow_rate = slow_rate
+    StubLLMConfig.slow_latency = slow_latency
+    server = ThreadingHTTPServer((host, port), StubLLMHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stub LLM server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fixed latency per call in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Output token rate (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls failing with HTTP 500")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of calls delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="Latency of slow calls in seconds")
+    args = parser.parse_args()
+
+    StubLLMConfig.latency = args.latency
+    StubLLMConfig.tokens_per_second = args.tokens_per_second
+    StubLLMConfig.error_rate = args.error_rate
+    StubLLMConfig.slow_rate = args.slow_rate
+    StubLLMConfig.slow_latency = args.slow_latency
+    server = ThreadingHTTPServer((args.host, args.port), StubLLMHandler)
+    print(f"Stub LLM listening on http://{args.host}:{args.port}/v1/generate "
+          f"(latency={args.latency}s, {args.tokens_per_second} tok/s)")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
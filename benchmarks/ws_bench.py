@@ -0,0 +1,136 @@
+import os
+import sys
+import time
+import json
+import argparse
+from typing import Dict, List, Optional, Tuple
+import requests
+from websockets.sync.client import connect
+from benchmarks.common import latency_summary, rss_mb, write_report
+from benchmarks.load_test import PATIENT_NAME, QUESTIONS, wait_for_server, spawn_backend
+
+# Per-turn overhead of the WebSocket chat (/ws/chat/{session_id}) against the REST
+# clinical endpoints, for the same questions in one session each. Run against the stub
+# LLM with zero latency (the default here) so the difference is the per-turn work
+# around the LLM call: HTTP handling, session checks, patient and bundle lookups.
+
+def start_session(http: requests.Session, api_url: str) -> Tuple[str, str]:
+    session_id = http.post(f"{api_url}/session/start").json()["session_id"]
+    http.post(f"{api_url}/agent/receptionist", json={"session_id": session_id, "message": PATIENT_NAME})
+    patient = http.get(f"{api_url}/patient", params={"name": PATIENT_NAME}).json()
+    if patient.get("status") == "multiple_matches":
+        patient = patient["matches"][0]
+    return session_id, patient["patient_id"]
+
+def rest_turns(api_url: str, turns: int) -> Dict[str, List[float]]:
+    with requests.Session() as http:
+        session_id, patient_id = start_session(http, api_url)
+        samples = []
+        for i in range(turns):
+            start = time.perf_counter()
+            res = http.post(f"{api_url}/agent/clinical", json={
+                "session_id": session_id, "patient_id": patient_id, "question": QUESTIONS[i % len(QUESTIONS)]})
+            res.raise_for_status()
+            samples.append(time.perf_counter() - start)
+    return {"turn": samples}
+
+def rest_stream_turns(api_url: str, turns: int) -> Dict[str, List[float]]:
+    with requests.Session() as http:
+        session_id, patient_id = start_session(http, api_url)
+        samples, first_token = [], []
+        for i in range(turns):
+            start = time.perf_counter()
+            with http.post(f"{api_url}/agent/clinical/stream", stream=True, json={
+                    "session_id": session_id, "patient_id": patient_id, "question": QUESTIONS[i % len(QUESTIONS)]}) as res:
+                res.raise_for_status()
+                for line in res.iter_lines():
+                    if line and json.loads(line)["type"] == "token" and len(first_token) == i:
+                        first_token.append(time.perf_counter() - start)
+            samples.append(time.perf_counter() - start)
+    return {"turn": samples, "first_token": first_token}
+
+def ws_turns(api_url: str, turns: int) -> Dict[str, List[float]]:
+    with requests.Session() as http:
+        session_id = http.post(f"{api_url}/session/start").json()["session_id"]
+    ws_url = api_url.replace("http", "ws", 1) + f"/ws/chat/{session_id}"
+    samples, first_token = [], []
+    with connect(ws_url) as ws:
+        ws.send(json.dumps({"message": PATIENT_NAME}))
+        receive_done(ws)
+        for i in range(turns):
+            start = time.perf_counter()
+            ws.send(json.dumps({"message": QUESTIONS[i % len(QUESTIONS)]}))
+            first = receive_done(ws)
+            samples.append(time.perf_counter() - start)
+            if first is not None:
+                first_token.append(first - start)
+    return {"turn": samples, "first_token": first_token}
+
+def receive_done(ws) -> Optional[float]:
+    """
+    Reads events up to the turn's "done"; returns when the first token arrived (None if none did).
+    """
+    first = None
+    while True:
+        event = json.loads(ws.recv())
+        if event["type"] == "token" and first is None:
+            first = time.perf_counter()
+        elif event["type"] == "error":
+            raise RuntimeError(f"WebSocket turn failed: {event}")
+        elif event["type"] == "done":
+            return first
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-turn overhead: WebSocket chat vs REST clinical endpoints")
+    parser.add_argument("--api-url", default=os.getenv("API_URL", "http://localhost:8000"))
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--spawn", action="store_true",
+                        help="Start the stub LLM and a local backend (rate limits and speculation off)")
+    parser.add_argument("--port", type=int, default=8766, help="Backend port when --spawn is used")
+    parser.add_argument("--stub-port", type=int, default=9102)
+    parser.add_argument("--stub-latency", type=float, default=0.0)
+    parser.add_argument("--stub-tokens-per-second", type=float, default=0.0, help="0 streams without delay")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    backend_proc = None
+    stub = None
+    api_url = args.api_url
+    if args.spawn:
+        from benchmarks.stub_llm import start_stub_server
+        stub = start_stub_server(port=args.stub_port, latency=args.stub_latency,
+                                 tokens_per_second=args.stub_tokens_per_second)
+        # One session sends every turn, and speculative answers would skip the work being measured
+        backend_proc = spawn_backend(args.port, args.stub_port, {
+            "SESSION_RATE_PER_MINUTE": "100000", "SESSION_RATE_BURST": "100000", "SPECULATION_ENABLED": "false"})
+        api_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        wait_for_server(api_url)
+        report = {"meta": {"kind": "ws_chat", "args": vars(args)}, "results": {}}
+        results = report["results"]
+        for lane, run in (("rest", rest_turns), ("rest_stream", rest_stream_turns), ("ws", ws_turns)):
+            start = time.perf_counter()
+            samples = run(api_url, args.turns)
+            elapsed = time.perf_counter() - start
+            results[lane] = latency_summary(samples["turn"], elapsed)
+            if samples.get("first_token"):
+                results[lane]["first_token"] = latency_summary(samples["first_token"], elapsed)
+
+        for lane in ("rest", "rest_stream"):
+            results[f"ws_vs_{lane}"] = {
+                f"{stat[:-len('_ms')]}_delta_ms": round(results["ws"][stat] - results[lane][stat], 3)
+                for stat in ("p50_ms", "p95_ms", "mean_ms")
+            }
+        if backend_proc:
+            report["meta"]["backend_rss_mb"] = rss_mb(backend_proc.pid)
+        write_report(report, args.output)
+    finally:
+        if backend_proc:
+            backend_proc.terminate()
+            backend_proc.wait(timeout=10)
+        if stub:
+            stub.shutdown()
+
+if __name__ == "__main__":
+    sys.exit(main())
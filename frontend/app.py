@@ -6,7 +6,10 @@ from datetime import datetime
 
 # Config
 import os
+from requests.adapters import HTTPAdapter
 API_URL = os.getenv("API_URL", "http://localhost:8000")
+# (connect, read) timeouts in seconds; LLM-backed calls need a longer read timeout
+TIMEOUT = (3, 60)
 
 st.set_page_config(page_title="Post-Discharge Medical AI Assistant", layout="wide")
 
@@ -54,10 +57,36 @@ st.markdown('<div class="disclaimer">This is educational only. Consult a healthc
 
 st.title("Post-Discharge Medical AI Assistant")
 
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    # One pooled, keep-alive session shared across reruns and messages
+    http = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    http.mount("http://", adapter)
+    http.mount("https://", adapter)
+    return http
+
+http = get_http_session()
+
+def stream_clinical_answer(payload: dict, final: dict):
+    """
+    Yields answer text pieces from /agent/clinical/stream; the closing event is stored in `final`.
+    """
+    with http.post(f"{API_URL}/agent/clinical/stream", json=payload, timeout=TIMEOUT, stream=True) as res:
+        res.raise_for_status()
+        for line in res.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            event = json.loads(line)
+            if event["type"] == "token":
+                yield event["text"]
+            elif event["type"] == "done":
+                final.update(event)
+
 # Session State
 if "session_id" not in st.session_state:
     try:
-        res = requests.post(f"{API_URL}/session/start")
+        res = http.post(f"{API_URL}/session/start", timeout=TIMEOUT)
         if res.status_code == 200:
             st.session_state.session_id = res.json()["session_id"]
             st.session_state.messages = []
@@ -86,10 +115,10 @@ with st.sidebar:
             st.session_state.messages.append({"role": "user", "content": patient_name_input})
             
             try:
-                res = requests.post(f"{API_URL}/agent/receptionist", json={
+                res = http.post(f"{API_URL}/agent/receptionist", json={
                     "session_id": st.session_state.session_id,
                     "message": patient_name_input
-                })
+                }, timeout=TIMEOUT)
                 if res.status_code == 200:
                     data = res.json()
                     st.session_state.messages.append({
@@ -99,15 +128,9 @@ with st.sidebar:
                         "source_type": data.get("source_type")
                     })
                     
-                    # Check if we can fetch patient details now
-                    # We'll try to fetch patient details directly to populate the sidebar
-                    # if the name matches.
-                    try:
-                        pat_res = requests.get(f"{API_URL}/patient?name={patient_name_input}")
-                        if pat_res.status_code == 200:
-                            st.session_state.patient = pat_res.json()
-                    except:
-                        pass
+                    # The receptionist returns the patient it resolved; cache it for the sidebar
+                    if data.get("patient"):
+                        st.session_state.patient = data["patient"]
                         
                 else:
                     st.error("Error contacting receptionist.")
@@ -132,12 +155,23 @@ with st.sidebar:
     # Logs
     if st.button("View Logs"):
         try:
-            res = requests.get(f"{API_URL}/logs?session_id={st.session_state.session_id}")
+            # Only fetch entries newer than the last one already shown
+            params = {"session_id": st.session_state.session_id}
+            if st.session_state.get("log_lines"):
+                params["since"] = st.session_state.log_since
+            res = http.get(f"{API_URL}/logs", params=params, timeout=TIMEOUT)
             if res.status_code == 200:
                 logs = res.json().get("logs", [])
-                st.text_area("Logs", "".join(logs), height=300)
+                # Entries come back newest first
+                new_lines = [f"{l['timestamp']} {l['level']} {l['logger']}: {l['message']}" for l in reversed(logs)
+                             if l['timestamp'] != st.session_state.get("log_since")]
+                if logs:
+                    st.session_state.log_since = logs[0]['timestamp']
+                st.session_state.log_lines = (st.session_state.get("log_lines", []) + new_lines)[-100:]
         except:
             st.error("Could not fetch logs.")
+    if st.session_state.get("log_lines"):
+        st.text_area("Logs", "\n".join(st.session_state.log_lines), height=300)
 
 # Main Chat
 chat_container = st.container()
@@ -193,17 +227,38 @@ if user_input:
         }
     
     try:
-        res = requests.post(f"{API_URL}/agent/{target_agent}", json=payload)
-        if res.status_code == 200:
-            data = res.json()
-            st.session_state.messages.append({
-                "role": "assistant", 
-                "content": data["answer_text"],
-                "sources": data.get("sources", []),
-                "source_type": data.get("source_type")
-            })
-            st.rerun()
+        if target_agent == "clinical":
+            # Render the answer as it streams, then keep the final event for history
+            final = {}
+            with chat_container:
+                with st.chat_message("user"):
+                    st.write(user_input)
+                with st.chat_message("assistant"):
+                    st.write_stream(stream_clinical_answer(payload, final))
+            if final:
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": final["answer_text"],
+                    "sources": final.get("sources", []),
+                    "source_type": final.get("source_type")
+                })
+                st.rerun()
+            else:
+                st.error("Clinical answer stream ended unexpectedly.")
         else:
-            st.error(f"Error from {target_agent}: {res.text}")
+            res = http.post(f"{API_URL}/agent/{target_agent}", json=payload, timeout=TIMEOUT)
+            if res.status_code == 200:
+                data = res.json()
+                st.session_state.messages.append({
+                    "role": "assistant", 
+                    "content": data["answer_text"],
+                    "sources": data.get("sources", []),
+                    "source_type": data.get("source_type")
+                })
+                if data.get("patient"):
+                    st.session_state.patient = data["patient"]
+                st.rerun()
+            else:
+                st.error(f"Error from {target_agent}: {res.text}")
     except Exception as e:
         st.error(f"Error: {e}")
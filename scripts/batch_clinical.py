@@ -0,0 +1,39 @@
+import sys
+import json
+import time
+import argparse
+import logging
+from backend.batch import parse_jsonl, run_checkpointed_batch, load_completed
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Offline bulk clinical Q&A, e.g. nightly pre-answering for newly discharged patients.
+# Input: JSONL of {"patient_id": ..., "question": ...}. Output: JSONL results.
+# The output file doubles as the checkpoint: re-running skips items that already succeeded.
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL of clinical questions in bulk")
+    parser.add_argument("input", help="JSONL file with patient_id and question per line")
+    parser.add_argument("output", help="JSONL results file (appended to; used to resume)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent LLM calls")
+    args = parser.parse_args()
+
+    already_done = len(load_completed(args.output))
+    if already_done:
+        logger.info(f"Resuming: {already_done} items already completed in {args.output}")
+
+    start = time.perf_counter()
+    answered = failed = 0
+    with open(args.input, "r") as f:
+        for result in run_checkpointed_batch(parse_jsonl(f), args.output, args.concurrency):
+            if result.get("error"):
+                failed += 1
+            else:
+                answered += 1
+    elapsed = time.perf_counter() - start
+    logger.info(f"Answered {answered}, failed {failed} in {elapsed:.1f}s")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
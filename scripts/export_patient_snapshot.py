@@ -0,0 +1,13 @@
+import sys
+import logging
+from backend.cohort import export_snapshot, SNAPSHOT_PATH
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Exports the patients table to a columnar Parquet snapshot for analytics
+# and /cohort?source=snapshot. Re-run after importing new discharges.
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else SNAPSHOT_PATH
+    export_snapshot(path)
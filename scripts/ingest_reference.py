@@ -1,8 +1,10 @@
 import os
 import uuid
+import argparse
 import logging
 from pypdf import PdfReader
-from backend.rag import chunk_text, upsert_chunks_to_chroma
+from backend.rag import chunk_text, upsert_chunks_to_chroma, DEFAULT_KB
+from backend.topics import detect_headings
 
 # Configuration
 # The path where the user has the file locally
@@ -13,7 +15,7 @@ METADATA_SOURCE_PATH = "/mnt/data/GenAI_Intern_Assignment.pdf"
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def ingest_pdf(file_path: str):
+def ingest_pdf(file_path: str, kb: str = DEFAULT_KB):
     if not os.path.exists(file_path):
         logger.error(f"File not found at {file_path}. Please ensure the PDF is at this location.")
         return
@@ -26,11 +28,19 @@ def ingest_pdf(file_path: str):
         return
 
     all_chunks = []
+    # Current section/chapter carry over to following pages until the next heading
+    section = chapter = None
     
     for i, page in enumerate(reader.pages):
         text = page.extract_text()
         if not text:
             continue
+        
+        page_section, page_chapter = detect_headings(text)
+        if page_section:
+            section = f"Section {page_section[0]}: {page_section[1]}".rstrip(": ")
+        if page_chapter:
+            chapter = f"Chapter {page_chapter[0]}: {page_chapter[1]}".rstrip(": ")
             
         # Chunk the text
         chunks = chunk_text(text)
@@ -40,19 +50,20 @@ def ingest_pdf(file_path: str):
                 "text": chunk,
                 "source": METADATA_SOURCE_PATH,
                 "page": i + 1, # 1-based page number
-                "chunk_id": str(uuid.uuid4())
+                "chunk_id": str(uuid.uuid4()),
+                "section": section,
+                "chapter": chapter
             }
             all_chunks.append(chunk_record)
             
-    logger.info(f"Extracted {len(all_chunks)} chunks. Upserting to ChromaDB...")
-    upsert_chunks_to_chroma(all_chunks)
+    logger.info(f"Extracted {len(all_chunks)} chunks. Upserting to ChromaDB KB '{kb}'...")
+    upsert_chunks_to_chroma(all_chunks, kb)
     logger.info("Ingestion complete.")
 
 if __name__ == "__main__":
-    # Check if user provided a path arg, else use default
-    import sys
-    path = LOCAL_PDF_PATH
-    if len(sys.argv) > 1:
-        path = sys.argv[1]
-        
-    ingest_pdf(path)
+    parser = argparse.ArgumentParser(description="Ingest a reference PDF into a named knowledge base")
+    parser.add_argument("path", nargs="?", default=LOCAL_PDF_PATH, help="PDF to ingest")
+    parser.add_argument("--kb", default=DEFAULT_KB, help="Target KB, e.g. nephrology, cardiology, transplant")
+    args = parser.parse_args()
+
+    ingest_pdf(args.path, args.kb)
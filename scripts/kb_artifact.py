@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import logging
+from backend.kb_artifact import KBArtifact, ArtifactError, write_artifact, artifact_path
+from backend.rag import get_collection, upsert_chunks_to_chroma, invalidate_kb_names, DEFAULT_KB, EMBEDDING_MODEL_NAME, KB_ARTIFACT_DIR
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rows fetched from Chroma per page when exporting
+EXPORT_PAGE_SIZE = 1000
+
+def export_kb(kb: str, path: str):
+    """
+    Packs a KB's Chroma collection (texts, metadata, embeddings) into an artifact, without re-embedding.
+    """
+    collection = get_collection(kb)
+    total = collection.count()
+    ids, texts, metadatas, embeddings = [], [], [], []
+    for offset in range(0, total, EXPORT_PAGE_SIZE):
+        page = collection.get(include=["documents", "metadatas", "embeddings"],
+                              limit=EXPORT_PAGE_SIZE, offset=offset)
+        ids.extend(page['ids'])
+        texts.extend(page['documents'])
+        metadatas.extend(page['metadatas'])
+        embeddings.extend(page['embeddings'])
+    header = write_artifact(path, kb, EMBEDDING_MODEL_NAME, ids, texts, metadatas, embeddings)
+    invalidate_kb_names()
+    logger.info(f"Exported {header['count']} chunks of KB '{kb}' to {path} "
+                f"({os.path.getsize(path) / 1024 / 1024:.1f} MB, sha256 {header['sha256'][:12]})")
+
+def import_kb(path: str, kb: str = None, to_chroma: bool = False):
+    """
+    Verifies an artifact and installs it into KB_ARTIFACT_DIR, where the backend serves it
+    from. With to_chroma, its chunks are also upserted into the KB's Chroma collection.
+    """
+    artifact = KBArtifact(path)
+    kb = kb or artifact.kb
+    if artifact.embedding_model != EMBEDDING_MODEL_NAME:
+        raise ArtifactError(f"Artifact was built with '{artifact.embedding_model}', backend uses '{EMBEDDING_MODEL_NAME}'")
+
+    target = artifact_path(KB_ARTIFACT_DIR, kb)
+    if os.path.abspath(path) != os.path.abspath(target):
+        os.makedirs(KB_ARTIFACT_DIR, exist_ok=True)
+        # Copy then rename, so a running backend never maps a half-written file
+        tmp_path = f"{target}.tmp{os.getpid()}"
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, target)
+        invalidate_kb_names()
+    logger.info(f"Installed artifact for KB '{kb}' at {target} ({artifact.count} chunks)")
+
+    if to_chroma:
+        chunks = []
+        for i in range(artifact.count):
+            meta = artifact.metadata(i)
+            chunks.append({k: v for k, v in dict(meta, text=artifact.text(i)).items()
+                           if k != "topics" and not k.startswith("topic_")})
+        upsert_chunks_to_chroma(chunks, kb, embeddings=artifact.vectors.tolist())
+
+def describe(path: str):
+    start = time.perf_counter()
+    artifact = KBArtifact(path, verify=False)
+    opened_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    artifact.verify()
+    verified_ms = (time.perf_counter() - start) * 1000
+    info = {k: v for k, v in artifact.header.items() if k != "sections"}
+    info.update(size_bytes=os.path.getsize(path), open_ms=round(opened_ms, 3), verify_ms=round(verified_ms, 3))
+    print(json.dumps(info, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export, import or inspect prebuilt KB artifacts")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = sub.add_parser("export", help="Pack a KB from Chroma into an artifact")
+    export_parser.add_argument("--kb", default=DEFAULT_KB)
+    export_parser.add_argument("--output", help="Artifact path (default: KB_ARTIFACT_DIR/<kb>.kbpack)")
+
+    import_parser = sub.add_parser("import", help="Verify an artifact and install it for the backend")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--kb", help="Install under this KB name (default: the KB it was exported from)")
+    import_parser.add_argument("--to-chroma", action="store_true", help="Also upsert its chunks into Chroma")
+
+    info_parser = sub.add_parser("info", help="Print an artifact's header and time open/verify")
+    info_parser.add_argument("path")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_kb(args.kb, args.output or artifact_path(KB_ARTIFACT_DIR, args.kb))
+    elif args.command == "import":
+        import_kb(args.path, args.kb, args.to_chroma)
+    else:
+        describe(args.path)
@@ -0,0 +1,67 @@
+import time
+import uuid
+import statistics
+import backend.patient_db as patient_db
+from backend.langgraph_agents import run_receptionist_flow
+
+# Compares the old per-turn rebuild (fresh state, patient lookups repeated every turn)
+# with resuming the session's checkpointed thread.
+# Uses the mock Grok response (unset GROK_API_KEY) and small-talk turns so no KB is needed.
+
+PATIENT_NAME = "John Smith"
+TURNS = 20
+FOLLOW_UP = "Thanks"
+
+_db_reads = 0
+_original_connection = patient_db.get_db_connection
+
+def _counting_connection():
+    global _db_reads
+    _db_reads += 1
+    return _original_connection()
+
+def run_rebuild(turns: int):
+    """
+    Old behaviour: state rebuilt on every turn. The endpoint never stored the
+    resolved patient_id, so each turn started without patient context.
+    """
+    session_id = str(uuid.uuid4())
+    timings = []
+    for i in range(turns):
+        message = PATIENT_NAME if i == 0 else FOLLOW_UP
+        start = time.perf_counter()
+        # A fresh thread per turn means nothing is resumed from the checkpoint
+        run_receptionist_flow(f"{session_id}-{i}", message)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def run_resume(turns: int):
+    """New behaviour: one thread per session, patient context resumed from the checkpoint."""
+    session_id = str(uuid.uuid4())
+    timings = []
+    for i in range(turns):
+        message = PATIENT_NAME if i == 0 else FOLLOW_UP
+        start = time.perf_counter()
+        run_receptionist_flow(session_id, message)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def measure(label: str, fn):
+    global _db_reads
+    _db_reads = 0
+    timings = fn(TURNS)
+    follow_up = timings[1:]
+    print(f"{label}: patient DB reads={_db_reads} ({_db_reads / TURNS:.2f}/turn), "
+          f"follow-up turn mean={statistics.mean(follow_up) * 1000:.2f}ms "
+          f"median={statistics.median(follow_up) * 1000:.2f}ms")
+
+def main():
+    patient_db.get_db_connection = _counting_connection
+    if not patient_db.find_patient_by_name(PATIENT_NAME):
+        print("Could not find John Smith. Run generate_dummy_patients.py first.")
+        return
+    measure("rebuild per turn", run_rebuild)
+    measure("checkpoint resume", run_resume)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import logging
+from backend.patient_context import refresh_all_context_bundles
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rebuilds every patient's context bundle, e.g. after re-ingesting the KB.
+# Bundles are also refreshed automatically by create_patient at discharge import time.
+
+if __name__ == "__main__":
+    count = refresh_all_context_bundles()
+    logger.info(f"Precomputed context bundles for {count} patients.")
@@ -0,0 +1,37 @@
+import argparse
+import logging
+from backend.rag import get_collection, list_kbs, DEFAULT_KB
+from backend.topics import classify_text, topic_metadata, TOPIC_KEYWORDS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Re-tags an existing KB with topic labels without re-embedding,
+# e.g. for collections ingested before tagging existed or after a taxonomy change.
+
+PAGE_SIZE = 500
+
+def retag_collection(kb: str = DEFAULT_KB):
+    collection = get_collection(kb)
+    total = collection.count()
+    stale_keys = [f"topic_{t}" for t in TOPIC_KEYWORDS]
+    for offset in range(0, total, PAGE_SIZE):
+        page = collection.get(limit=PAGE_SIZE, offset=offset, include=["documents", "metadatas"])
+        metadatas = []
+        for doc, meta in zip(page['documents'], page['metadatas']):
+            # update() merges metadata, so clear old flags explicitly rather than dropping them
+            meta = dict(meta, **{k: False for k in stale_keys})
+            meta.update(topic_metadata(classify_text(doc)))
+            metadatas.append(meta)
+        collection.update(ids=page['ids'], metadatas=metadatas)
+        logger.info(f"Tagged {min(offset + PAGE_SIZE, total)}/{total} chunks.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-tag KB chunks with topic labels")
+    parser.add_argument("--kb", default=DEFAULT_KB, help="KB to re-tag")
+    parser.add_argument("--all", action="store_true", help="Re-tag every KB")
+    args = parser.parse_args()
+
+    for kb in (list_kbs() if args.all else [args.kb]):
+        logger.info(f"Re-tagging KB '{kb}'")
+        retag_collection(kb)
@@ -0,0 +1,177 @@
+import os
+import sys
+import asyncio
+
+# Urgency detection, per-session rate limits and the admission queue. Runs in-process
+# (no API server needed):
+#   python tests/test_admission.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.admission import (
+    is_urgent, SessionRateLimiter, AdmissionController, Overloaded, get_rate_limiter,
+    PRIORITY_URGENT, PRIORITY_NORMAL,
+)
+
+URGENT = [
+    "I have chest pain",
+    "I can't breathe",
+    "No urine since yesterday",
+    "My mother is confused and can't stand",
+    "He had a seizure an hour ago",
+    "I have chest pain, is that normal?",
+    "What should I eat? I have chest pain.",
+    "I don't have chest pain but I fainted this morning",
+]
+
+NEGATED = [
+    "I have no chest pain today",
+    "Patient denies shortness of breath",
+    "Without shortness of breath, just tired",
+    "I haven't had a seizure since the new dose",
+    "The chest pain has gone now.",
+]
+
+BENIGN = [
+    "what is a stroke risk?",
+    "Is chest pain after dialysis common?",
+    "I'm confused about my furosemide dose",
+    "Why am I confused about the dose?",
+    "How much fluid should I drink each day?",
+]
+
+def test_symptom_reports_are_urgent():
+    missed = [text for text in URGENT if not is_urgent(text)]
+    assert not missed, missed
+
+def test_negated_symptoms_are_not_urgent():
+    flagged = [text for text in NEGATED if is_urgent(text)]
+    assert not flagged, flagged
+
+def test_questions_are_not_urgent():
+    flagged = [text for text in BENIGN if is_urgent(text)]
+    assert not flagged, flagged
+
+def test_rate_limiter_allows_burst_then_waits():
+    limiter = SessionRateLimiter(rate_per_minute=60, burst=3)
+    assert [limiter.check("s1") for _ in range(3)] == [0.0, 0.0, 0.0]
+    wait = limiter.check("s1")
+    assert 0 < wait <= 1.0, wait
+    # Buckets are per session
+    assert limiter.check("s2") == 0.0
+
+def test_default_burst_allows_ordinary_chat():
+    # A quick back-and-forth with the receptionist shouldn't hit 429
+    limiter = SessionRateLimiter()
+    waits = [limiter.check("chat") for _ in range(10)]
+    assert all(w == 0.0 for w in waits), waits
+
+def test_urgent_messages_use_their_own_bucket():
+    normal, urgent = get_rate_limiter(), get_rate_limiter(urgent=True)
+    assert normal is not urgent
+    while normal.check("busy-session") == 0:
+        pass
+    # An exhausted chat bucket doesn't block an emergency, but urgent messages are still limited
+    assert urgent.check("busy-session") == 0.0
+    assert urgent.burst >= normal.burst
+
+async def queue_order():
+    controller = AdmissionController("test-order", max_concurrency=1, max_queue=10, slo_seconds=5)
+    controller._service_time = 0.01
+    order = []
+
+    async def request(name, priority):
+        async with controller.admit(priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    await controller.acquire()
+    tasks = []
+    for name, priority in (("normal-1", PRIORITY_NORMAL), ("normal-2", PRIORITY_NORMAL), ("urgent", PRIORITY_URGENT)):
+        tasks.append(asyncio.create_task(request(name, priority)))
+        await asyncio.sleep(0)
+    assert controller.queue_depth == 3
+    controller.release(0.01)
+    await asyncio.gather(*tasks)
+    return order
+
+def test_urgent_requests_go_first():
+    assert asyncio.run(queue_order()) == ["urgent", "normal-1", "normal-2"]
+
+async def queue_shedding():
+    controller = AdmissionController("test-shed", max_concurrency=1, max_queue=2, slo_seconds=5)
+    controller._service_time = 0.01
+    await controller.acquire()
+    first = asyncio.create_task(controller.acquire(PRIORITY_NORMAL))
+    await asyncio.sleep(0)
+    newest = asyncio.create_task(controller.acquire(PRIORITY_NORMAL))
+    await asyncio.sleep(0)
+
+    # Queue full: a normal request is turned away...
+    try:
+        await controller.acquire(PRIORITY_NORMAL)
+        rejected = None
+    except Overloaded as e:
+        rejected = e.reason
+    # ...while an urgent one takes the newest normal waiter's place
+    urgent = asyncio.create_task(controller.acquire(PRIORITY_URGENT))
+    await asyncio.sleep(0)
+    try:
+        await newest
+        shed = None
+    except Overloaded as e:
+        shed = e.reason
+    controller.release(0.01)
+    await urgent
+    controller.release(0.01)
+    await first
+    controller.release(0.01)
+    return rejected, shed
+
+def test_full_queue_sheds_for_urgent():
+    rejected, shed = asyncio.run(queue_shedding())
+    assert rejected == "queue_full", rejected
+    assert shed == "shed_for_urgent", shed
+
+async def queue_timeout():
+    controller = AdmissionController("test-timeout", max_concurrency=1, max_queue=10, slo_seconds=0.1)
+    controller._service_time = 0.01
+    await controller.acquire()
+    try:
+        await controller.acquire()
+    except Overloaded as e:
+        return e.reason, controller.queue_depth
+    return None, controller.queue_depth
+
+def test_waiters_dropped_after_slo():
+    reason, depth = asyncio.run(queue_timeout())
+    assert reason == "queue_timeout", reason
+    assert depth == 0
+
+def test_estimated_wait_over_slo_rejected_up_front():
+    async def run():
+        controller = AdmissionController("test-slo", max_concurrency=1, max_queue=10, slo_seconds=1)
+        controller._service_time = 2.0
+        await controller.acquire()
+        try:
+            await controller.acquire()
+        except Overloaded as e:
+            return e.reason, e.retry_after
+    reason, retry_after = asyncio.run(run())
+    assert reason == "slo", reason
+    assert retry_after >= 2, retry_after
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
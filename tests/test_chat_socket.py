@@ -0,0 +1,155 @@
+import os
+import sys
+import asyncio
+import threading
+import unittest
+
+# WebSocket chat backpressure: events reach the client in order, a client that stops
+# reading holds back the producer and is then closed with 1008, and a closed channel
+# refuses further events. Runs in-process against a fake client; needs the backend's
+# retrieval dependencies (chromadb) to import:
+#   python tests/test_chat_socket.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+try:
+    from backend import chat_socket
+except ImportError as e:
+    if __name__ == "__main__":
+        print(f"SKIPPED: backend dependencies not installed: {e}")
+        sys.exit(0)
+    raise unittest.SkipTest(f"backend dependencies not installed: {e}")
+from backend.chat_socket import EventChannel, ChannelClosed
+from backend.codec import loads
+
+# Short enough that the slow-client tests finish quickly
+SEND_TIMEOUT = 0.2
+
+class FakeClient:
+    """
+    Stands in for the WebSocket: records sent events and the close code. While `reading`
+    is cleared, send_text blocks as it would for a client that stopped reading.
+    """
+
+    def __init__(self, fail: bool = False):
+        self.sent = []
+        self.close_code = None
+        self.fail = fail
+        self.reading = asyncio.Event()
+        self.reading.set()
+
+    async def send_text(self, text: str):
+        if self.fail:
+            raise ConnectionResetError("client went away")
+        await self.reading.wait()
+        self.sent.append(loads(text))
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.close_code = code
+
+def with_send_timeout(coroutine):
+    saved = chat_socket.WS_SEND_TIMEOUT
+    chat_socket.WS_SEND_TIMEOUT = SEND_TIMEOUT
+    try:
+        return asyncio.run(coroutine)
+    finally:
+        chat_socket.WS_SEND_TIMEOUT = saved
+
+async def in_order():
+    client = FakeClient()
+    channel = EventChannel(client, maxsize=4)
+    channel.start()
+    for i in range(20):
+        await channel.send({"type": "token", "text": str(i)})
+    # Closing flushes what is still queued
+    await channel.close()
+    return client
+
+def test_events_delivered_in_order_and_flushed():
+    client = with_send_timeout(in_order())
+    assert [event["text"] for event in client.sent] == [str(i) for i in range(20)]
+    assert client.close_code is None
+
+async def slow_client():
+    client = FakeClient()
+    client.reading.clear()
+    channel = EventChannel(client, maxsize=2)
+    channel.start()
+    accepted = 0
+    try:
+        while True:
+            await channel.send({"type": "token", "text": str(accepted)})
+            accepted += 1
+    except ChannelClosed:
+        pass
+    await channel.close()
+    return client, channel, accepted
+
+def test_slow_client_closed_with_1008():
+    client, channel, accepted = with_send_timeout(slow_client())
+    # One event taken by the blocked sender plus a full queue, then the producer waits
+    assert accepted == 3, accepted
+    assert client.close_code == 1008
+    assert channel.closed and not client.sent
+
+async def worker_thread_blocked():
+    client = FakeClient()
+    client.reading.clear()
+    channel = EventChannel(client, maxsize=1)
+    channel.start()
+    results = []
+
+    def produce():
+        try:
+            for i in range(10):
+                channel.put({"type": "token", "text": str(i)})
+                results.append(i)
+        except ChannelClosed:
+            results.append("closed")
+
+    thread = threading.Thread(target=produce)
+    thread.start()
+    await asyncio.to_thread(thread.join, 5)
+    await channel.close()
+    return client, results
+
+def test_worker_thread_waits_then_sees_close():
+    client, results = with_send_timeout(worker_thread_blocked())
+    # put() blocked once the queue was full instead of buffering all ten events
+    assert results == [0, 1, "closed"], results
+    assert client.close_code == 1008
+
+async def client_gone():
+    client = FakeClient(fail=True)
+    channel = EventChannel(client)
+    channel.start()
+    await channel.send({"type": "token", "text": "lost"})
+    await asyncio.sleep(0.05)
+    try:
+        await channel.send({"type": "token", "text": "refused"})
+        refused = False
+    except ChannelClosed:
+        refused = True
+    await channel.close()
+    return client, refused
+
+def test_closed_channel_refuses_events():
+    client, refused = with_send_timeout(client_gone())
+    assert refused
+    # A dropped connection isn't counted as a slow consumer
+    assert client.close_code is None
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
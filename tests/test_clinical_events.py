@@ -0,0 +1,106 @@
+import os
+import sys
+import unittest
+
+# The clinical answer has one schema whether it comes from /agent/clinical, the final
+# "done" event of /agent/clinical/stream or the WebSocket chat: internal keys such as
+# llm_outcome are not sent. Runs in-process with the agent flows patched; needs the
+# backend's retrieval dependencies (chromadb):
+#   python tests/test_clinical_events.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+try:
+    from backend import main
+except ImportError as e:
+    if __name__ == "__main__":
+        print(f"SKIPPED: backend dependencies not installed: {e}")
+        sys.exit(0)
+    raise unittest.SkipTest(f"backend dependencies not installed: {e}")
+from starlette.testclient import TestClient
+from backend.codec import loads
+from backend.chat_socket import ChatContext
+from backend.grok_wrapper import LLM_OK
+from backend.records import Chunk, PatientRecord
+
+RESULT = {
+    "answer_text": "Keep salt under 2 g a day.",
+    "sources": [Chunk("Limit sodium.", "GenAI_Intern_Assignment.pdf", 12, "c-12-0", 0.1)],
+    "source_type": "KB",
+    "llm_outcome": LLM_OK,
+}
+
+def stream(session_id, question, patient_id, history=None, kb=None, **kwargs):
+    yield {"type": "token", "text": RESULT["answer_text"]}
+    yield {"type": "done", **RESULT}
+
+class Patched:
+    def __enter__(self):
+        self.saved = (main.run_clinical_flow, main.stream_clinical_flow, main.cache_clinical_answer)
+        main.run_clinical_flow = lambda *args, **kwargs: dict(RESULT)
+        main.stream_clinical_flow = stream
+        main.cache_clinical_answer = lambda *args, **kwargs: None
+        return TestClient(main.app)
+
+    def __exit__(self, *exc):
+        main.run_clinical_flow, main.stream_clinical_flow, main.cache_clinical_answer = self.saved
+
+def ask(client, path, **options):
+    session_id = client.post("/session/start").json()["session_id"]
+    body = dict({"session_id": session_id, "patient_id": "p1", "question": "How much salt?"}, **options)
+    response = client.post(path, json=body)
+    assert response.status_code == 200, response.text
+    if path.endswith("/stream"):
+        events = [loads(line) for line in response.text.splitlines()]
+        done = events[-1]
+        assert done.pop("type") == "done"
+        return done
+    return response.json()
+
+def test_stream_done_matches_rest_response():
+    with Patched() as client:
+        rest = ask(client, "/agent/clinical")
+        streamed = ask(client, "/agent/clinical/stream")
+    assert "llm_outcome" not in streamed, streamed
+    assert set(streamed) == set(rest), (set(streamed) ^ set(rest))
+    assert streamed["sources"] == rest["sources"]
+
+def test_stream_done_respects_fields():
+    with Patched() as client:
+        streamed = ask(client, "/agent/clinical/stream", fields=["answer_text", "sources_total"])
+    assert streamed == {"answer_text": RESULT["answer_text"], "sources_total": 1}, streamed
+
+class Channel:
+    def __init__(self):
+        self.events = []
+
+    def put(self, event):
+        self.events.append(event)
+
+def test_websocket_done_matches_rest_response():
+    with Patched() as client:
+        rest = ask(client, "/agent/clinical")
+        chat = ChatContext("ws-events", {"history": main.SessionHistory(), "patient_id": None})
+        chat.patient = PatientRecord("p1", "Ana Lopez")
+        channel = Channel()
+        req = main.ClinicalRequest(session_id="ws-events", patient_id="p1", question="How much salt?")
+        done = loads(main.dumps(main.done_event("clinical", main.chat_clinical_turn(chat, channel, req))))
+    assert [e["type"] for e in channel.events] == ["token"]
+    assert (done.pop("type"), done.pop("agent")) == ("done", "clinical")
+    assert "llm_outcome" not in done, done
+    assert set(done) == set(rest), (set(done) ^ set(rest))
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
@@ -0,0 +1,113 @@
+import os
+import sys
+import sqlite3
+import tempfile
+
+# Cohort queries over the normalized medication/warning-sign tables, the backfill for
+# databases created before them, and the Parquet snapshot. Runs in-process against a
+# temporary patients database (no API server needed):
+#   python tests/test_cohort.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend import patient_db
+from backend.patient_db import init_db, create_patient, query_cohort
+from backend.cohort import export_snapshot, query_snapshot
+from backend.codec import dumps
+
+PATIENTS = [
+    ("p1", "Ana Lopez", "2026-03-02", "Chronic Kidney Disease", ["Furosemide 40mg daily", "Lisinopril 10mg"], ["Swelling in legs"]),
+    ("p2", "Ben Okafor", "2026-03-10", "chronic kidney disease", ["Amlodipine 5mg"], ["Shortness of breath", "Swelling  in Legs"]),
+    ("p3", "Chloe Park", "2026-02-20", "Acute Kidney Injury", ["furosemide 20mg twice daily"], ["Reduced urine output"]),
+    ("p4", "Dev Shah", "2026-01-15", "Chronic Kidney Disease", [], []),
+]
+
+def patient_record(patient_id, name, discharged, diagnosis, medications, warning_signs):
+    return {
+        "patient_id": patient_id, "patient_name": name, "discharge_date": discharged,
+        "primary_diagnosis": diagnosis, "medications": medications, "follow_up": None,
+        "warning_signs": warning_signs, "discharge_instructions": None, "notes": None,
+    }
+
+def with_database(test):
+    def run():
+        saved = patient_db.DB_PATH
+        with tempfile.TemporaryDirectory() as tmp:
+            patient_db.DB_PATH = os.path.join(tmp, "patients.db")
+            try:
+                test(tmp)
+            finally:
+                patient_db.DB_PATH = saved
+    run.__name__ = test.__name__
+    return run
+
+def ids(rows):
+    return [row["patient_id"] for row in rows]
+
+@with_database
+def test_cohort_filters(tmp):
+    init_db()
+    for p in PATIENTS:
+        create_patient(patient_record(*p), precompute_context=False)
+    # Diagnosis is case-insensitive; newest discharge first
+    assert ids(query_cohort(diagnosis="CHRONIC KIDNEY DISEASE")) == ["p2", "p1", "p4"]
+    # Medication matches by drug name, across doses
+    assert ids(query_cohort(medication="Furosemide")) == ["p1", "p3"]
+    # Warning signs match with whitespace and case normalized
+    assert ids(query_cohort(warning_sign="swelling in legs")) == ["p2", "p1"]
+    assert ids(query_cohort(medication="furosemide", discharged_since="2026-03-01")) == ["p1"]
+    assert ids(query_cohort(discharged_until="2026-02-20")) == ["p3", "p4"]
+    assert ids(query_cohort(limit=2, offset=1)) == ["p1", "p3"]
+
+@with_database
+def test_backfills_legacy_database(tmp):
+    # A database written before the normalized tables existed
+    conn = sqlite3.connect(patient_db.DB_PATH)
+    conn.execute('''
+        CREATE TABLE patients (
+            patient_id TEXT PRIMARY KEY, patient_name TEXT, discharge_date TEXT, primary_diagnosis TEXT,
+            medications TEXT, follow_up TEXT, warning_signs TEXT, discharge_instructions TEXT, notes TEXT
+        )
+    ''')
+    conn.executemany("INSERT INTO patients VALUES (?, ?, ?, ?, ?, NULL, ?, NULL, NULL)",
+                     [(pid, name, discharged, diagnosis, dumps(meds), dumps(signs))
+                      for pid, name, discharged, diagnosis, meds, signs in PATIENTS])
+    conn.commit()
+    conn.close()
+
+    init_db()
+    assert ids(query_cohort(medication="furosemide")) == ["p1", "p3"]
+    assert ids(query_cohort(warning_sign="Reduced urine output")) == ["p3"]
+    # A second start doesn't duplicate the rows
+    init_db()
+    conn = sqlite3.connect(patient_db.DB_PATH)
+    count = conn.execute("SELECT COUNT(*) FROM patient_medications").fetchone()[0]
+    conn.close()
+    assert count == 4, count
+
+@with_database
+def test_snapshot_matches_database(tmp):
+    init_db()
+    for p in PATIENTS:
+        create_patient(patient_record(*p), precompute_context=False)
+    path = os.path.join(tmp, "patients.parquet")
+    assert export_snapshot(path) == len(PATIENTS)
+    for filters in ({"diagnosis": "chronic kidney disease"}, {"medication": "Furosemide"},
+                    {"warning_sign": "SWELLING IN LEGS"}, {"discharged_since": "2026-02-20", "discharged_until": "2026-03-02"},
+                    {"limit": 2, "offset": 1}):
+        assert query_snapshot(path=path, **filters) == query_cohort(**filters), filters
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
@@ -0,0 +1,100 @@
+import os
+import sys
+
+# Bounded session history: recent turns kept verbatim, older ones folded into a capped
+# rolling summary by the background worker, and nothing lost when a summary fails.
+# Runs in-process with the summarizer's LLM patched (no API server needed):
+#   python tests/test_history.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend import history
+from backend.history import SessionHistory, HISTORY_SUMMARY_MAX_CHARS
+from backend.grok_wrapper import LLMResult, LLM_OK
+from backend.tasks import get_task_queue
+
+class Summarizer:
+    """
+    Stands in for the LLM: the new summary is the old one plus the folded turns' numbers.
+    Fails while `failing` is set.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.failing = False
+
+    def __enter__(self):
+        self.saved = history.summarize_messages
+        history.summarize_messages = self.summarize
+        return self
+
+    def __exit__(self, *exc):
+        history.summarize_messages = self.saved
+
+    def summarize(self, summary, messages):
+        if self.failing:
+            raise RuntimeError("summarizer unavailable")
+        self.batches.append([m["content"] for m in messages])
+        turns = sorted({m["content"].split()[-1] for m in messages}, key=int)
+        return " ".join(filter(None, [summary, *turns]))
+
+def add_turns(h: SessionHistory, start: int, end: int):
+    for turn in range(start, end):
+        h.append_turn(f"question {turn}", f"answer {turn}")
+        assert get_task_queue().drain(10)
+
+def test_recent_turns_kept_verbatim():
+    with Summarizer():
+        h = SessionHistory(recent_turns=2)
+        add_turns(h, 1, 11)
+        messages = h.as_messages()
+    assert len(messages) == 5, messages
+    assert messages[0]["role"] == "system"
+    assert [m["content"] for m in messages[1:]] == ["question 9", "answer 9", "question 10", "answer 10"]
+
+def test_older_turns_folded_into_summary():
+    with Summarizer() as summarizer:
+        h = SessionHistory(recent_turns=2)
+        add_turns(h, 1, 7)
+    # Every turn that left the window was summarized exactly once, in order
+    folded = [content for batch in summarizer.batches for content in batch]
+    assert folded == [f"{role} {turn}" for turn in range(1, 5) for role in ("question", "answer")], folded
+    assert h.summary == "1 2 3 4", h.summary
+
+def test_summary_is_capped():
+    saved = history.grok_complete
+    history.grok_complete = lambda prompt, max_tokens=256: LLMResult("x" * (HISTORY_SUMMARY_MAX_CHARS * 3), LLM_OK)
+    try:
+        h = SessionHistory(recent_turns=1)
+        add_turns(h, 1, 5)
+    finally:
+        history.grok_complete = saved
+    assert len(h.summary) == HISTORY_SUMMARY_MAX_CHARS, len(h.summary)
+
+def test_failed_summary_keeps_turns():
+    with Summarizer() as summarizer:
+        h = SessionHistory(recent_turns=1)
+        summarizer.failing = True
+        add_turns(h, 1, 4)
+        # Turns 1 and 2 left the window but couldn't be summarized; they wait, in order
+        assert h.summary == ""
+        assert [m["content"] for m in h._pending] == ["question 1", "answer 1", "question 2", "answer 2"]
+        summarizer.failing = False
+        add_turns(h, 4, 5)
+    assert h.summary == "1 2 3", h.summary
+    assert not h._pending
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
@@ -0,0 +1,119 @@
+import os
+import sys
+import struct
+import tempfile
+import numpy as np
+
+# KB artifacts: round trip, and rejection of corrupt or incompatible files.
+# Runs in-process on small generated artifacts (no API server needed):
+#   python tests/test_kb_artifact.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.kb_artifact import KBArtifact, ArtifactError, write_artifact, MAGIC, FORMAT_VERSION
+
+DIM = 8
+
+def build(path: str, count: int = 6) -> dict:
+    rng = np.random.default_rng(7)
+    ids = [f"c-{i}" for i in range(count)]
+    texts = [f"Chunk {i} about kidney care." for i in range(count)]
+    metadatas = [dict({"source": "GenAI_Intern_Assignment.pdf", "page": i + 1, "chunk_id": f"c-{i}"},
+                      **({"topic_diet": True} if i % 2 else {})) for i in range(count)]
+    return write_artifact(path, "nephrology", "all-mpnet-base-v2", ids, texts, metadatas,
+                          rng.normal(size=(count, DIM)).astype(np.float32))
+
+def expect_error(path: str, fragment: str, **kwargs):
+    try:
+        KBArtifact(path, **kwargs)
+    except ArtifactError as e:
+        assert fragment in str(e), e
+        return
+    raise AssertionError(f"{path} opened; expected ArtifactError containing {fragment!r}")
+
+def patch(path: str, offset: int, data: bytes):
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+
+def test_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "nephrology.kbpack")
+        header = build(path)
+        artifact = KBArtifact(path)
+        assert (artifact.kb, artifact.count, artifact.dim) == ("nephrology", 6, DIM)
+        assert artifact.header["sha256"] == header["sha256"]
+        chunk = artifact.chunk(artifact.index_of("c-3"))
+        assert (chunk.text, chunk.page) == ("Chunk 3 about kidney care.", 4)
+        # Each chunk's own vector is its nearest neighbour
+        hits = artifact.search(artifact.vectors[[2]].tolist(), k=1)
+        assert hits[0][0].chunk_id == "c-2"
+        # Topic-scoped search ranks the tagged (odd) chunks first
+        scoped = artifact.search(artifact.vectors[[2]].tolist(), k=3, topics=["diet"])
+        assert {c.chunk_id for c in scoped[0]} == {"c-1", "c-3", "c-5"}, scoped
+
+def test_checksum_mismatch():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "nephrology.kbpack")
+        build(path)
+        size = os.path.getsize(path)
+        # Flip a byte in the body (the chunk text at the end of the file)
+        with open(path, "rb") as f:
+            f.seek(size - 1)
+            last = f.read(1)
+        patch(path, size - 1, bytes([last[0] ^ 0xFF]))
+        expect_error(path, "checksum mismatch")
+        # Opening without verification is allowed; verify() still catches it
+        artifact = KBArtifact(path, verify=False)
+        try:
+            artifact.verify()
+        except ArtifactError:
+            pass
+        else:
+            raise AssertionError("verify() accepted a corrupt artifact")
+
+def test_version_mismatch():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "nephrology.kbpack")
+        build(path)
+        patch(path, len(MAGIC), struct.pack("<I", FORMAT_VERSION + 1))
+        expect_error(path, f"format version {FORMAT_VERSION + 1}, expected {FORMAT_VERSION}")
+
+def test_not_an_artifact():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bogus.kbpack")
+        with open(path, "wb") as f:
+            f.write(b"PK\x03\x04" + b"\x00" * 64)
+        expect_error(path, "not a KB artifact")
+        with open(path, "wb") as f:
+            f.write(MAGIC)
+        expect_error(path, "truncated")
+        open(path, "wb").close()
+        expect_error(path, "empty or unreadable")
+
+def test_query_dimension_mismatch():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "nephrology.kbpack")
+        build(path)
+        artifact = KBArtifact(path)
+        try:
+            artifact.search([[0.0] * (DIM + 1)], k=1)
+        except ArtifactError as e:
+            assert "dimension" in str(e), e
+        else:
+            raise AssertionError("search accepted a query of the wrong dimension")
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+
+# Named KBs: the set of KB names is scanned once per KB_NAMES_TTL_SECONDS (or after an
+# ingest in this process), diagnoses pick an ingested specialty KB, and naming a KB that
+# doesn't exist is a 404. Runs in-process with the Chroma client patched; needs the
+# backend's retrieval dependencies (chromadb):
+#   python tests/test_kb_names.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+try:
+    from backend import rag, main
+except ImportError as e:
+    if __name__ == "__main__":
+        print(f"SKIPPED: backend dependencies not installed: {e}")
+        sys.exit(0)
+    raise unittest.SkipTest(f"backend dependencies not installed: {e}")
+from starlette.testclient import TestClient
+
+class FakeClient:
+    def __init__(self, names):
+        self.names = names
+        self.scans = 0
+
+    def list_collections(self):
+        self.scans += 1
+        return list(self.names)
+
+class Store:
+    """
+    Patches the Chroma client and the artifact directory, and clears the cached names.
+    """
+
+    def __init__(self, collections, artifacts=(), ttl=30.0):
+        self.client = FakeClient(collections)
+        self.artifacts = artifacts
+        self.ttl = ttl
+
+    def __enter__(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        for name in self.artifacts:
+            open(os.path.join(self.tmp.name, name + rag.ARTIFACT_SUFFIX), "wb").close()
+        self.saved = (rag.get_chroma_client, rag.KB_ARTIFACT_DIR, rag.KB_NAMES_TTL_SECONDS)
+        rag.get_chroma_client = lambda: self.client
+        rag.KB_ARTIFACT_DIR = self.tmp.name
+        rag.KB_NAMES_TTL_SECONDS = self.ttl
+        rag.invalidate_kb_names()
+        return self.client
+
+    def __exit__(self, *exc):
+        rag.get_chroma_client, rag.KB_ARTIFACT_DIR, rag.KB_NAMES_TTL_SECONDS = self.saved
+        rag.invalidate_kb_names()
+        self.tmp.cleanup()
+
+def test_names_from_collections_and_artifacts():
+    with Store([rag.kb_collection_name("nephrology"), "unrelated", rag.kb_collection_name("cardiology")],
+               artifacts=["transplant", "nephrology"]):
+        assert rag.list_kbs() == ["cardiology", "nephrology", "transplant"]
+
+def test_names_cached_until_ttl_or_invalidated():
+    with Store([rag.kb_collection_name("nephrology")], ttl=0.2) as client:
+        for _ in range(50):
+            rag.list_kbs()
+        assert client.scans == 1, client.scans
+        # Another process ingests a KB: seen once the TTL lapses
+        client.names.append(rag.kb_collection_name("cardiology"))
+        assert "cardiology" not in rag.list_kbs()
+        time.sleep(0.25)
+        assert "cardiology" in rag.list_kbs() and client.scans == 2
+        # An ingest in this process invalidates straight away
+        client.names.append(rag.kb_collection_name("transplant"))
+        rag.invalidate_kb_names()
+        assert "transplant" in rag.list_kbs() and client.scans == 3
+        # Callers get a copy, not the cached list
+        rag.list_kbs().append("bogus")
+        assert "bogus" not in rag.list_kbs()
+
+def test_diagnosis_picks_ingested_specialty():
+    with Store([rag.kb_collection_name("nephrology"), rag.kb_collection_name("cardiology")]):
+        assert rag.kb_for_diagnosis("Cardiorenal syndrome with heart failure") == "cardiology"
+        # No transplant KB ingested: the default is used
+        assert rag.kb_for_diagnosis("Kidney transplant, graft rejection") == rag.DEFAULT_KB
+        assert rag.kb_for_diagnosis(None) == rag.DEFAULT_KB
+
+def test_unknown_kb_is_404():
+    with Store([rag.kb_collection_name("nephrology")]):
+        client = TestClient(main.app)
+        assert client.get("/kb").json()["kbs"] == ["nephrology"]
+        session_id = client.post("/session/start").json()["session_id"]
+        body = {"session_id": session_id, "patient_id": "p1", "question": "How much salt?", "kb": "dermatology"}
+        for path in ("/agent/clinical", "/agent/clinical/stream"):
+            response = client.post(path, json=body)
+            assert response.status_code == 404, (path, response.status_code, response.text)
+            assert response.json()["detail"] == "Unknown knowledge base: dermatology"
+        chunk = client.get("/kb/chunk/c-1", params={"kb": "dermatology"})
+        assert chunk.status_code == 404, chunk.text
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
@@ -0,0 +1,155 @@
+import os
+import sys
+import time
+
+# Runs in-process against the local fault-injecting stub LLM (no API server needed):
+#   python tests/test_llm_resilience.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.stub_llm import start_stub_server, StubLLMConfig
+from backend import grok_wrapper
+from backend.circuit_breaker import CircuitBreaker, HedgePolicy, CLOSED, OPEN, HALF_OPEN
+from backend.grok_wrapper import grok_complete, grok_generate_stream, LLM_OK, LLM_ERROR, LLM_TIMEOUT, LLM_CIRCUIT_OPEN
+
+PORT = 9187
+PROMPT = "Patient reports swelling in both legs."
+
+_server = None
+
+def setup_stub(cooldown: float = 0.5, hedge: bool = False):
+    """
+    Starts the stub once and points the wrapper at it with a fresh breaker and hedge policy.
+    """
+    global _server
+    if _server is None:
+        _server = start_stub_server(port=PORT, latency=0.02, tokens_per_second=0)
+    StubLLMConfig.latency = 0.02
+    StubLLMConfig.error_rate = 0.0
+    StubLLMConfig.slow_rate = 0.0
+    StubLLMConfig.slow_next = 0
+    StubLLMConfig.slow_latency = 0.6
+    grok_wrapper.GROK_API_KEY = "stub"
+    grok_wrapper.GROK_API_URL = f"http://127.0.0.1:{PORT}/v1/generate"
+    grok_wrapper.GROK_TIMEOUT = 1.0
+    grok_wrapper._breaker = CircuitBreaker("grok", window=10, min_calls=5, error_rate=0.5,
+                                           slow_seconds=0.5, slow_rate=0.5, cooldown=cooldown)
+    grok_wrapper._hedge_policy = HedgePolicy(enabled=hedge, min_delay=0.05, min_samples=10, max_ratio=1.0)
+
+def test_healthy_calls_are_ok():
+    setup_stub()
+    result = grok_complete(PROMPT)
+    assert result.outcome == LLM_OK, result
+    assert "edema" in result.text.lower()
+
+def test_errors_trip_breaker_and_fail_fast():
+    setup_stub(cooldown=60)
+    StubLLMConfig.error_rate = 1.0
+    outcomes = [grok_complete(PROMPT).outcome for _ in range(5)]
+    assert outcomes == [LLM_ERROR] * 5, outcomes
+    assert grok_wrapper.get_circuit_breaker().state == OPEN
+
+    calls_before = StubLLMConfig.calls
+    start = time.perf_counter()
+    result = grok_complete(PROMPT)
+    elapsed = time.perf_counter() - start
+    assert result.outcome == LLM_CIRCUIT_OPEN, result
+    assert not result.ok
+    # Fails fast to the local fallback without calling the API
+    assert StubLLMConfig.calls == calls_before
+    assert elapsed < 0.05, elapsed
+    assert result.text, "fallback text should be usable"
+
+def test_slow_calls_trip_breaker():
+    setup_stub(cooldown=60)
+    StubLLMConfig.slow_next = 5
+    for _ in range(5):
+        grok_complete(PROMPT)
+    assert grok_wrapper.get_circuit_breaker().state == OPEN
+
+def test_half_open_probe_closes_breaker():
+    setup_stub(cooldown=0.3)
+    StubLLMConfig.error_rate = 1.0
+    for _ in range(5):
+        grok_complete(PROMPT)
+    assert grok_wrapper.get_circuit_breaker().state == OPEN
+
+    StubLLMConfig.error_rate = 0.0
+    time.sleep(0.35)
+    result = grok_complete(PROMPT)
+    assert result.outcome == LLM_OK, result
+    assert grok_wrapper.get_circuit_breaker().state == CLOSED
+
+def test_failed_probe_reopens_breaker():
+    setup_stub(cooldown=0.3)
+    StubLLMConfig.error_rate = 1.0
+    for _ in range(5):
+        grok_complete(PROMPT)
+    time.sleep(0.35)
+    assert grok_complete(PROMPT).outcome == LLM_ERROR
+    assert grok_wrapper.get_circuit_breaker().state == OPEN
+
+def test_half_open_ignores_results_admitted_before_trip():
+    breaker = CircuitBreaker("late", window=10, min_calls=2, error_rate=0.5, cooldown=0.1)
+    early = breaker.allow()
+    late = breaker.allow()
+    breaker.record(False, 0.01, early)
+    breaker.record(False, 0.01, late)
+    assert breaker.state == OPEN
+    time.sleep(0.15)
+    probe = breaker.allow()
+    assert probe is not None and breaker.allow() is None
+    # A success from a call admitted while closed neither closes the circuit nor frees the probe slot
+    breaker.record(True, 0.01, early)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is None
+    breaker.record(True, 0.01, probe)
+    assert breaker.state == CLOSED
+
+def test_timeout_is_typed():
+    setup_stub(cooldown=60)
+    StubLLMConfig.slow_latency = 1.5
+    StubLLMConfig.slow_next = 1
+    result = grok_complete(PROMPT)
+    assert result.outcome == LLM_TIMEOUT, result
+    assert result.text, "fallback text should be usable"
+
+def test_hedged_request_cuts_tail_latency():
+    setup_stub(hedge=True)
+    # Build up a latency history so the hedge delay (p95) is known
+    for _ in range(10):
+        assert grok_complete(PROMPT).outcome == LLM_OK
+
+    # The first attempt is slow; the hedge fired after ~p95 returns first
+    StubLLMConfig.slow_next = 1
+    start = time.perf_counter()
+    result = grok_complete(PROMPT)
+    elapsed = time.perf_counter() - start
+    assert result.outcome == LLM_OK, result
+    assert result.hedged
+    assert elapsed < StubLLMConfig.slow_latency / 2, elapsed
+
+def test_stream_falls_back_when_circuit_open():
+    setup_stub(cooldown=60)
+    StubLLMConfig.error_rate = 1.0
+    for _ in range(5):
+        grok_complete(PROMPT)
+    outcome = {}
+    text = "".join(grok_generate_stream(PROMPT, outcome=outcome))
+    assert outcome["result"].outcome == LLM_CIRCUIT_OPEN
+    assert "edema" in text.lower()
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
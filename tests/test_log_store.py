@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import logging
+import tempfile
+
+# SQLite log store batching and retention. Runs in-process (no API server needed):
+#   python tests/test_log_store.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.log_store import SQLiteLogHandler, get_log_db_connection
+
+DAY = 86400
+
+def make_record(message: str, created: float) -> logging.LogRecord:
+    record = logging.LogRecord("test", logging.INFO, __file__, 0, message, None, None)
+    record.created = created
+    return record
+
+def count_rows(path: str) -> int:
+    conn = get_log_db_connection(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+    finally:
+        conn.close()
+
+def test_commits_in_batches():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "logs.db")
+        handler = SQLiteLogHandler(path, commit_every=10)
+        now = time.time()
+        for i in range(15):
+            handler.handle(make_record(f"record {i}", now))
+        # Other connections only see committed batches
+        assert count_rows(path) == 10, count_rows(path)
+        handler.flush()
+        assert count_rows(path) == 15, count_rows(path)
+        handler.close()
+
+def test_prunes_by_age_and_row_count():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "logs.db")
+        handler = SQLiteLogHandler(path, retention_days=7, max_rows=20, commit_every=1)
+        now = time.time()
+        for i in range(10):
+            handler.handle(make_record(f"old {i}", now - 8 * DAY))
+        for i in range(30):
+            handler.handle(make_record(f"new {i}", now - 30 + i))
+        assert handler.prune(now) == 20
+        conn = get_log_db_connection(path)
+        rows = [r[0] for r in conn.execute("SELECT message FROM logs ORDER BY id")]
+        conn.close()
+        # Everything past retention goes, then the oldest rows over the cap
+        assert rows == [f"new {i}" for i in range(10, 30)], rows
+        handler.close()
+
+def test_close_commits_pending_records():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "logs.db")
+        handler = SQLiteLogHandler(path, commit_every=100)
+        handler.start_maintenance(commit_seconds=60)
+        handler.handle(make_record("last words", time.time()))
+        handler.close()
+        assert count_rows(path) == 1
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
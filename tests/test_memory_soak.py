@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import logging
+
+# Soak test for the memory budget: 100k simulated turns across short-lived sessions,
+# each adding history and a cached answer, with the session store and answer cache
+# sized so that only the budget bounds them. Runs in-process (no API server needed):
+#   python tests/test_memory_soak.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.memory import MemoryBudget, rss_bytes
+from backend.history import SessionHistory, SessionStore
+from backend.admission import AnswerCache
+from backend.tasks import get_task_queue
+
+TURNS = int(os.getenv("SOAK_TURNS", "100000"))
+TURNS_PER_SESSION = 10
+BUDGET_MB = 4
+# Budget checks (and summarizer drains) every this many turns
+CHECK_EVERY = 1000
+# RSS is compared from this point on, once caches have filled up to the budget
+WARMUP_TURNS = TURNS // 5
+MAX_RSS_GROWTH_MB = 16
+
+QUESTION = "I have had some swelling in my ankles since discharge, turn {turn}. Should I take an extra dose of furosemide?"
+ANSWER = ("Ankle swelling after discharge can be a sign of fluid build-up. Do not change your furosemide dose "
+          "on your own; weigh yourself each morning, limit salt, and contact your nephrology team if your weight "
+          "rises by more than 2 kg in three days or the swelling spreads. Reference turn {turn}.")
+
+def simulate_turn(turn: int, store: SessionStore, cache: AnswerCache):
+    session_id = f"soak-{turn // TURNS_PER_SESSION}"
+    session = store.get(session_id)
+    if session is None:
+        session = {"history": SessionHistory(), "patient_id": f"patient-{turn % 500}"}
+        store[session_id] = session
+    question, answer = QUESTION.format(turn=turn), ANSWER.format(turn=turn)
+    session["history"].append_turn(question, answer)
+    cache.put(AnswerCache.key(question, "chronic kidney disease"), {
+        "answer_text": answer, "sources": [], "source_type": "KB", "session_id": session_id})
+
+def test_rss_flat_under_budget():
+    # The summarizer runs on the local mock LLM, which warns on every call without an API key
+    logging.getLogger("backend.grok_wrapper").setLevel(logging.ERROR)
+    budget = MemoryBudget(budget_mb=BUDGET_MB)
+    store = SessionStore(max_sessions=TURNS, min_idle=0)
+    cache = AnswerCache(max_entries=TURNS)
+    budget.register("sessions", store.size_bytes, store.evict, priority=90)
+    budget.register("answer_cache", cache.size_bytes, cache.evict, priority=30)
+
+    baseline_rss = None
+    peak_rss = 0
+    freed = 0
+    start = time.perf_counter()
+    for turn in range(1, TURNS + 1):
+        simulate_turn(turn, store, cache)
+        if turn % CHECK_EVERY == 0:
+            assert get_task_queue().drain(30), "summarizer fell behind"
+            freed += budget.enforce()
+            if turn == WARMUP_TURNS:
+                baseline_rss = rss_bytes()
+            elif turn > WARMUP_TURNS:
+                peak_rss = max(peak_rss, rss_bytes())
+
+    report = budget.report()
+    growth_mb = (peak_rss - baseline_rss) / 1024 / 1024
+    print(f"{TURNS} turns in {time.perf_counter() - start:.1f}s; RSS {baseline_rss / 1024 / 1024:.1f} MB after warmup, "
+          f"peak {peak_rss / 1024 / 1024:.1f} MB; evicted ~{freed / 1024 / 1024:.1f} MB; "
+          f"{len(store)} sessions held")
+    assert freed > 0, "the budget never had to evict, so the soak proves nothing"
+    # Eviction stops at 90% of the budget; allow for estimation error on top of the full budget
+    assert report["evictable_bytes"] <= budget.budget_bytes * 1.25, report
+    assert growth_mb < MAX_RSS_GROWTH_MB, f"RSS grew {growth_mb:.1f} MB after warmup"
+
+def test_idle_sessions_only():
+    budget = MemoryBudget(budget_mb=0.01)
+    store = SessionStore(min_idle=60)
+    budget.register("sessions", store.size_bytes, store.evict, priority=90)
+    for i in range(50):
+        store[f"active-{i}"] = {"history": SessionHistory(), "patient_id": None}
+    budget.enforce()
+    # Every session was just used, so none is evicted even though the budget is exceeded
+    assert len(store) == 50, len(store)
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
@@ -0,0 +1,147 @@
+import os
+import re
+import sys
+import tempfile
+import unittest
+
+# In-process metrics: the Prometheus text format served on /metrics, per-stage latency
+# histograms recorded by timed()/timer(), and opt-in traces. Runs in-process (no API
+# server needed):
+#   python tests/test_metrics.py
+# The /metrics endpoint test imports the API app and needs its retrieval dependencies
+# (chromadb, sentence-transformers); it is skipped without them.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend import metrics, patient_db
+from backend.metrics import (
+    inc_counter, set_gauge, observe, timed, timer, render_metrics, start_trace, end_trace,
+    server_timing_header, register_metric, STAGE_LATENCY, LATENCY_BUCKETS,
+)
+
+# name{labels} value, as in the text exposition format
+SAMPLE_RE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? [-+0-9.eE]+(Inf)?$')
+
+def samples(text: str, name: str) -> dict:
+    """
+    {labels text: value} for the samples of one metric name (with _bucket/_sum/_count suffix).
+    """
+    found = {}
+    for line in text.splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            series, value = line.rsplit(" ", 1)
+            found[series[len(name):]] = float(value)
+    return found
+
+def test_exposition_format():
+    register_metric("test_format_total", "counter", "Counter used by the metrics test.")
+    inc_counter("test_format_total", 2, reason='quote " and \\ backslash')
+    set_gauge("test_format_gauge", 3.5)
+    text = render_metrics()
+    assert text.endswith("\n")
+    for line in text.splitlines():
+        if line.startswith("#"):
+            assert re.match(r"^# (HELP|TYPE) [a-zA-Z_:][a-zA-Z0-9_:]* ?", line), line
+        else:
+            assert SAMPLE_RE.match(line), line
+    assert "# TYPE test_format_total counter" in text
+    assert 'test_format_total{reason="quote \\" and \\\\ backslash"} 2' in text
+    # Every sampled metric has HELP and TYPE lines, registered or not
+    assert "# TYPE test_format_gauge untyped" in text
+
+def test_histogram_buckets_are_cumulative():
+    for value in (0.0005, 0.001, 0.03, 0.03, 20.0):
+        observe("test_hist_seconds", value, stage="unit")
+    text = render_metrics()
+    buckets = samples(text, "test_hist_seconds_bucket")
+    assert buckets['{stage="unit",le="0.001"}'] == 2  # bounds are inclusive
+    assert buckets['{stage="unit",le="0.025"}'] == 2
+    assert buckets['{stage="unit",le="0.05"}'] == 4
+    assert buckets['{stage="unit",le="10.0"}'] == 4
+    assert buckets['{stage="unit",le="+Inf"}'] == 5
+    assert len(buckets) == len(LATENCY_BUCKETS) + 1
+    assert samples(text, "test_hist_seconds_count") == {'{stage="unit"}': 5}
+    assert abs(samples(text, "test_hist_seconds_sum")['{stage="unit"}'] - 20.0615) < 1e-9
+
+def stage_count(stage: str, **labels) -> float:
+    key = (STAGE_LATENCY, metrics._label_key(dict(labels, stage=stage)))
+    with metrics._lock:
+        hist = metrics._histograms.get(key)
+    return hist[3] if hist else 0
+
+def test_timed_stages_recorded():
+    @timed("test_stage", op="decorated")
+    def work():
+        return 42
+
+    before = stage_count("test_stage", op="decorated")
+    assert work() == 42
+    with timer("test_stage", op="block"):
+        pass
+    assert stage_count("test_stage", op="decorated") == before + 1
+    assert stage_count("test_stage", op="block") >= 1
+
+def test_instrumented_db_stage():
+    saved = patient_db.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        patient_db.DB_PATH = os.path.join(tmp, "patients.db")
+        try:
+            patient_db.init_db()
+            before = stage_count("db", op="get_patient_by_id")
+            assert patient_db.get_patient_by_id("nobody") is None
+        finally:
+            patient_db.DB_PATH = saved
+    assert stage_count("db", op="get_patient_by_id") == before + 1
+    assert 'assistant_stage_latency_seconds_count{op="get_patient_by_id",stage="db"}' in render_metrics()
+
+def test_trace_spans_and_server_timing():
+    spans = start_trace()
+    try:
+        with timer("embed_query"):
+            pass
+        with timer("chroma_query", kb="nephrology"):
+            pass
+        with timer("embed_query"):
+            pass
+    finally:
+        end_trace()
+    with timer("after_trace"):
+        pass
+    assert [s["name"] for s in spans] == ["embed_query", "chroma_query.nephrology", "embed_query"], spans
+    header = server_timing_header(spans)
+    assert re.fullmatch(r"embed_query;dur=[0-9.]+, chroma_query\.nephrology;dur=[0-9.]+", header), header
+    assert server_timing_header([]) is None
+
+def test_metrics_endpoint():
+    try:
+        from backend.main import app
+    except ImportError as e:
+        raise unittest.SkipTest(f"backend dependencies not installed: {e}")
+    from starlette.testclient import TestClient
+    client = TestClient(app)
+    client.post("/session/start")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'assistant_http_request_duration_seconds_count{route="/session/start"}' in response.text
+    # Traced requests report their stages
+    traced = client.get("/patient", params={"name": "Nobody Known"}, headers={"X-Trace": "1"})
+    assert "db.find_patient_by_name;dur=" in traced.headers.get("server-timing", ""), traced.headers
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = skipped = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except unittest.SkipTest as e:
+            skipped += 1
+            print(f"SKIPPED: {test.__name__}: {e}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed - skipped}/{len(tests)} passed, {skipped} skipped")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
@@ -0,0 +1,136 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# The clinical path with a precomputed context bundle: the question is the only text
+# embedded and searched per turn, and the stored diagnosis and medication chunks are
+# added by id. Runs in-process with retrieval patched and a temporary patients database;
+# needs the backend's retrieval dependencies (chromadb):
+#   python tests/test_patient_context.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+try:
+    from backend import patient_db, patient_context, langgraph_agents
+except ImportError as e:
+    if __name__ == "__main__":
+        print(f"SKIPPED: backend dependencies not installed: {e}")
+        sys.exit(0)
+    raise unittest.SkipTest(f"backend dependencies not installed: {e}")
+from backend.records import PatientRecord, Chunk
+
+PATIENT = PatientRecord("p-ctx", "Ana Lopez", "2026-03-02", "Chronic Kidney Disease", ["Furosemide 40mg"])
+
+def chunk(chunk_id: str) -> Chunk:
+    return Chunk(f"text of {chunk_id}", "GenAI_Intern_Assignment.pdf", 1, chunk_id)
+
+class Retrieval:
+    """
+    Patches the retrieval primitives and records what each turn asked of them.
+    """
+
+    def __init__(self):
+        self.embedded = []
+        self.searches = []
+        self.by_id = []
+
+    def __enter__(self):
+        self.saved = (patient_context.embed_query, patient_context.retrieve_by_embedding,
+                      patient_context.get_chunks_by_id, patient_context.retrieve_many, langgraph_agents.retrieve)
+        patient_context.embed_query = self.embed
+        patient_context.retrieve_by_embedding = self.search
+        patient_context.get_chunks_by_id = self.lookup
+        patient_context.retrieve_many = lambda texts, k, kb=None: [[chunk(f"med-{i}-{j}") for j in range(k)]
+                                                                   for i in range(len(texts))]
+        langgraph_agents.retrieve = self.per_turn
+        return self
+
+    def __exit__(self, *exc):
+        (patient_context.embed_query, patient_context.retrieve_by_embedding,
+         patient_context.get_chunks_by_id, patient_context.retrieve_many, langgraph_agents.retrieve) = self.saved
+
+    def embed(self, text):
+        self.embedded.append(text)
+        return [1.0, 0.0, 0.0]
+
+    def search(self, embedding, k, topics=None, kb=None):
+        self.searches.append(k)
+        prefix = "diag" if self.embedded[-1] == PATIENT['primary_diagnosis'] else "q"
+        return [chunk(f"{prefix}-{i}") for i in range(k)]
+
+    def lookup(self, chunk_ids, kb=None):
+        self.by_id.append(list(chunk_ids))
+        return [chunk(cid) for cid in chunk_ids]
+
+    def per_turn(self, *args, **kwargs):
+        raise AssertionError("the per-turn retrieval path ran for a patient with a bundle")
+
+def with_database(test):
+    def run():
+        saved = patient_db.DB_PATH
+        with tempfile.TemporaryDirectory() as tmp:
+            patient_db.DB_PATH = os.path.join(tmp, "patients.db")
+            patient_context.init_context_table()
+            try:
+                test()
+            finally:
+                patient_db.DB_PATH = saved
+                patient_context._cache.clear()
+    run.__name__ = test.__name__
+    return run
+
+@with_database
+def test_clinical_turn_uses_stored_bundle():
+    with Retrieval() as retrieval:
+        patient_context.save_context_bundle(patient_context.build_context_bundle(PATIENT))
+        # Served from SQLite, as in a fresh worker process
+        patient_context._cache.clear()
+        retrieval.embedded.clear()
+        retrieval.searches.clear()
+        chunks = langgraph_agents.retrieve_clinical_context("How much furosemide can I take?", PATIENT)
+    ids = [c['chunk_id'] for c in chunks]
+    # One search, for the question alone; the diagnosis isn't embedded or searched again
+    assert retrieval.embedded == ["How much furosemide can I take?"], retrieval.embedded
+    assert retrieval.searches == [5], retrieval.searches
+    assert ids[:5] == [f"q-{i}" for i in range(5)], ids
+    # The mentioned medication's and the top diagnosis chunks come from the bundle by id
+    assert retrieval.by_id == [["med-0-0", "med-0-1", "diag-0", "diag-1"]], retrieval.by_id
+    assert ids[5:] == ["med-0-0", "med-0-1", "diag-0", "diag-1"], ids
+
+@with_database
+def test_diagnosis_chunks_not_repeated():
+    with Retrieval() as retrieval:
+        bundle = patient_context.build_context_bundle(PATIENT)
+        bundle['diagnosis_chunk_ids'] = ["q-0", "diag-1", "diag-2"]
+        retrieval.by_id.clear()
+        chunks = patient_context.retrieve_for_patient("What should I eat?", bundle)
+    ids = [c['chunk_id'] for c in chunks]
+    assert len(ids) == len(set(ids)), ids
+    assert retrieval.by_id == [["diag-1"]], retrieval.by_id
+
+@with_database
+def test_other_kb_skips_bundle():
+    with Retrieval() as retrieval:
+        patient_context.save_context_bundle(patient_context.build_context_bundle(PATIENT))
+        calls = []
+        langgraph_agents.retrieve = lambda *args, **kwargs: calls.append(kwargs.get("kb")) or []
+        langgraph_agents.retrieve_clinical_context("What should I eat?", PATIENT, kb="cardiology")
+    # The bundle was built against the patient's own KB, so another KB is searched per turn
+    assert calls == ["cardiology"], calls
+    assert not retrieval.by_id, retrieval.by_id
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+import contextvars
+
+# Request profiling: which requests are profiled, how samples from worker threads are
+# collected, how the store prunes old profiles, and that stored profiles can only be read
+# by plain ids. Runs in-process (no API server needed):
+#   python tests/test_profiling.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend import profiling
+from backend.profiling import (
+    ProfileStore, RequestProfile, profile_trigger, start_profile, finish_profile, profiled,
+    TRIGGER_ON_DEMAND, TRIGGER_SAMPLED,
+)
+
+class Settings:
+    """
+    Temporarily overrides module-level profiling settings.
+    """
+
+    def __init__(self, **values):
+        self.values = values
+
+    def __enter__(self):
+        self.saved = {name: getattr(profiling, name) for name in self.values}
+        for name, value in self.values.items():
+            setattr(profiling, name, value)
+
+    def __exit__(self, *exc):
+        for name, value in self.saved.items():
+            setattr(profiling, name, value)
+
+def make_profile(request_id: str, started_at: float) -> RequestProfile:
+    profile = RequestProfile(request_id, "/agent/clinical", TRIGGER_ON_DEMAND)
+    profile.started_at = started_at
+    profile.stacks["a;b;c"] = 3
+    profile.samples = 3
+    return profile
+
+def test_trigger_on_demand():
+    with Settings(PROFILE_ON_DEMAND=True, PROFILE_SAMPLE_RATE=0):
+        assert profile_trigger("/agent/clinical", "1") == TRIGGER_ON_DEMAND
+        assert profile_trigger("/agent/receptionist", "true") == TRIGGER_ON_DEMAND
+        assert profile_trigger("/agent/clinical", None) is None
+        assert profile_trigger("/agent/clinical", "0") is None
+        # Only agent endpoints are profiled
+        assert profile_trigger("/patient", "1") is None
+    with Settings(PROFILE_ON_DEMAND=False, PROFILE_SAMPLE_RATE=0):
+        assert profile_trigger("/agent/clinical", "1") is None
+
+def test_trigger_sampled():
+    with Settings(PROFILE_ON_DEMAND=False, PROFILE_SAMPLE_RATE=1.0):
+        assert profile_trigger("/agent/clinical", None) == TRIGGER_SAMPLED
+        assert profile_trigger("/kb", None) is None
+    with Settings(PROFILE_ON_DEMAND=False, PROFILE_SAMPLE_RATE=0.5):
+        triggers = [profile_trigger("/agent/clinical", None) for _ in range(2000)]
+        sampled = triggers.count(TRIGGER_SAMPLED)
+        assert 700 < sampled < 1300, sampled
+
+def test_profile_id_is_a_plain_name():
+    profile = make_profile("../../etc/passwd x" * 10, time.time())
+    profile_id = profile.profile_id
+    assert profiling._PROFILE_ID_RE.match(profile_id), profile_id
+    assert "/" not in profile_id and "agent-clinical" in profile_id
+    assert len(profile_id.rsplit("agent-clinical_", 1)[1]) == 64
+
+def test_store_prunes_oldest():
+    with tempfile.TemporaryDirectory() as directory:
+        store = ProfileStore(directory, max_profiles=3)
+        base = time.time()
+        ids = []
+        for i in range(5):
+            profile = make_profile(f"req-{i}", base + i)
+            store.save(profile)
+            ids.append(profile.profile_id)
+        assert len(os.listdir(directory)) == 6, os.listdir(directory)
+        listed = [summary["profile_id"] for summary in store.list()]
+        assert listed == ids[:1:-1], listed
+        assert store.read(ids[0]) is None
+        assert store.read(ids[4]) == "a;b;c 3\n"
+        assert [summary["request_id"] for summary in store.list(limit=1)] == ["req-4"]
+
+def test_read_rejects_path_like_ids():
+    with tempfile.TemporaryDirectory() as root:
+        directory = os.path.join(root, "profiles")
+        store = ProfileStore(directory)
+        store.save(make_profile("req", time.time()))
+        # A collapsed file outside the store must not be reachable
+        with open(os.path.join(root, "secret.collapsed"), "w") as f:
+            f.write("secret 1\n")
+        for profile_id in ("../secret", "..%2Fsecret", "/tmp/secret", "sub/secret", ""):
+            assert store.read(profile_id) is None, profile_id
+        assert store.read("missing") is None
+        assert ProfileStore(os.path.join(root, "none")).list() == []
+
+def test_profiled_worker_is_sampled():
+    @profiled
+    def work():
+        deadline = time.perf_counter() + 0.15
+        while time.perf_counter() < deadline:
+            time.sleep(0.002)
+
+    with tempfile.TemporaryDirectory() as directory:
+        saved = profiling._store
+        profiling._store = ProfileStore(directory)
+        try:
+            profile = start_profile("req-sampled", "/agent/clinical", TRIGGER_ON_DEMAND)
+            # The worker inherits the profile through the context, as in a threadpool
+            worker = threading.Thread(target=contextvars.copy_context().run, args=(work,))
+            worker.start()
+            worker.join()
+            finish_profile(profile)
+            # Not profiled once the request has finished
+            untouched = profile.samples
+            work()
+        finally:
+            profiling._store = saved
+        assert profile.samples > 0 and profile.samples == untouched
+        top_stack = profile.stacks.most_common(1)[0][0]
+        assert top_stack.split(";")[-1].endswith("work") and "wrapper" in top_stack, top_stack
+        assert not profile._threads
+        assert profile.duration >= 0.15
+        stored = ProfileStore(directory).read(profile.profile_id)
+        assert stored and stored.splitlines()[0].endswith(f" {profile.stacks.most_common(1)[0][1]}")
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
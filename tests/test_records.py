@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import sqlite3
+
+# Slotted records keep the dict-style access the plain dicts they replaced had, and
+# serialize the same. Runs in-process (no API server needed):
+#   python tests/test_records.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.records import Chunk, PatientRecord, ClinicalResponse, ReceptionistResponse
+from backend.codec import dumps, loads
+
+def chunk() -> Chunk:
+    return Chunk("Limit salt.", "GenAI_Intern_Assignment.pdf", 12, "c-12-0", 0.25)
+
+def test_mapping_access():
+    c = chunk()
+    assert c["text"] == "Limit salt." and c["page"] == 12
+    assert c.get("score") == 0.25 and c.get("missing", "default") == "default"
+    assert "chunk_id" in c and "missing" not in c
+    c["score"] = 0.5
+    assert c.score == 0.5
+    for op in (lambda: c["missing"], lambda: c.__setitem__("missing", 1)):
+        try:
+            op()
+        except KeyError:
+            continue
+        raise AssertionError("unknown keys should raise KeyError like a dict")
+
+def test_dict_conversion():
+    c = chunk()
+    as_dict = {"text": "Limit salt.", "source": "GenAI_Intern_Assignment.pdf", "page": 12,
+               "chunk_id": "c-12-0", "score": 0.25, "metadata": None}
+    assert dict(c) == as_dict
+    assert c.to_dict() == as_dict
+    assert list(c.keys()) == list(as_dict) and len(c) == len(as_dict)
+    assert dict(c.items()) == as_dict
+    # Dict comprehensions over items(), as the API's response shaping does
+    assert {k: v for k, v in c.items() if k != "text"} == {k: v for k, v in as_dict.items() if k != "text"}
+
+def test_subclass_fields_include_parent():
+    response = ClinicalResponse("Limit salt.", "KB", "s1", [chunk()], sources_total=1)
+    assert response["answer_text"] == "Limit salt." and response["sources_total"] == 1
+    assert list(response.keys())[:3] == ["answer_text", "source_type", "session_id"]
+    receptionist = ReceptionistResponse("Hello", "System", "s1")
+    assert "patient" in receptionist and "sources_total" not in receptionist
+
+def test_codec_matches_plain_dicts():
+    patient = PatientRecord("p1", "Ana Lopez", "2026-03-02", "Chronic Kidney Disease", ["Furosemide 40mg"])
+    response = ReceptionistResponse("Found you.", "System", "s1", [chunk()], patient=patient)
+    plain = dict(response, sources=[dict(chunk())], patient=dict(patient))
+    assert loads(dumps(response)) == loads(dumps(plain)) == json.loads(json.dumps(plain))
+
+def test_patient_from_row_and_dict():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE patients (patient_id, patient_name, discharge_date, primary_diagnosis, medications, "
+                 "follow_up, warning_signs, discharge_instructions, notes)")
+    conn.execute("INSERT INTO patients VALUES ('p1', 'Ana', '2026-03-02', 'CKD', ?, NULL, ?, NULL, NULL)",
+                 ('["Furosemide 40mg"]', 'not json'))
+    patient = PatientRecord.from_row(conn.execute("SELECT * FROM patients").fetchone())
+    assert patient["medications"] == ["Furosemide 40mg"]
+    # Values that don't parse are passed through as stored
+    assert patient["warning_signs"] == "not json"
+    again = PatientRecord.from_dict(dict(patient, unexpected="ignored"))
+    assert again == patient
+
+def test_checkpoint_serializer_round_trip():
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    allowed = [(cls.__module__, cls.__name__) for cls in (PatientRecord, Chunk)]
+    serde = JsonPlusSerializer(allowed_msgpack_modules=allowed)
+    state = {"patient_record": PatientRecord("p1", "Ana"), "sources": [chunk()]}
+    restored = serde.loads_typed(serde.dumps_typed(state))
+    assert restored == state, restored
+    assert type(restored["sources"][0]) is Chunk
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
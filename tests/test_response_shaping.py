@@ -0,0 +1,94 @@
+import os
+import sys
+import unittest
+
+# Clinical response trimming (sources without text, paging, field selection) and
+# response compression. Runs in-process (no API server needed):
+#   python tests/test_response_shaping.py
+# The trimming tests import the API app and need its retrieval dependencies
+# (chromadb, sentence-transformers); they are skipped without them.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from backend.compression import CompressionMiddleware
+from backend.records import Chunk, ClinicalResponse
+
+PAYLOAD = {"answer_text": "Limit salt to under 2 g a day. " * 100}
+
+def make_app() -> TestClient:
+    async def clinical(request):
+        return JSONResponse(PAYLOAD)
+
+    async def stream(request):
+        return StreamingResponse(iter([b'{"type":"token"}\n'] * 200), media_type="application/x-ndjson")
+
+    async def small(request):
+        return JSONResponse({"ok": True})
+
+    app = Starlette(routes=[Route("/agent/clinical", clinical, methods=["POST"]),
+                            Route("/agent/clinical/stream", stream, methods=["POST"]),
+                            Route("/health", small)])
+    return TestClient(CompressionMiddleware(app, minimum_size=1000))
+
+def test_large_responses_are_compressed():
+    response = make_app().post("/agent/clinical", headers={"Accept-Encoding": "gzip"})
+    assert response.headers.get("content-encoding") in ("gzip", "br"), response.headers
+    assert response.json() == PAYLOAD
+
+def test_stream_and_small_responses_are_not_compressed():
+    client = make_app()
+    stream = client.post("/agent/clinical/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in stream.headers, stream.headers
+    small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers, small.headers
+
+def clinical_response() -> ClinicalResponse:
+    sources = [Chunk(f"Chunk text {i}", "GenAI_Intern_Assignment.pdf", 10 + i, f"c-{i}", 0.1 * i) for i in range(5)]
+    return ClinicalResponse("Limit salt.", "KB", "s1", sources)
+
+def shaping():
+    try:
+        from backend.main import shape_clinical_response, ClinicalRequest
+    except ImportError as e:
+        raise unittest.SkipTest(f"backend dependencies not installed: {e}")
+    return shape_clinical_response, ClinicalRequest
+
+def test_sources_omit_text_by_default():
+    shape, ClinicalRequest = shaping()
+    req = ClinicalRequest(session_id="s1", patient_id="p1", question="salt?")
+    payload = shape(clinical_response(), req)
+    assert payload["sources_total"] == 5
+    assert all("text" not in src for src in payload["sources"])
+    assert [src["page"] for src in payload["sources"]] == [10, 11, 12, 13, 14]
+
+def test_sources_paging_and_fields():
+    shape, ClinicalRequest = shaping()
+    req = ClinicalRequest(session_id="s1", patient_id="p1", question="salt?", include_text=True,
+                          sources_offset=1, sources_limit=2, fields=["answer_text", "sources", "sources_total"])
+    payload = shape(clinical_response(), req)
+    assert set(payload.keys()) == {"answer_text", "sources", "sources_total"}, payload.keys()
+    assert payload["sources_total"] == 5
+    assert [src["chunk_id"] for src in payload["sources"]] == ["c-1", "c-2"]
+    assert payload["sources"][0]["text"] == "Chunk text 1"
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = skipped = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except unittest.SkipTest as e:
+            skipped += 1
+            print(f"SKIPPED: {test.__name__}: {e}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed - skipped}/{len(tests)} passed, {skipped} skipped")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
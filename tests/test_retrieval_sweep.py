@@ -0,0 +1,123 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# Retrieval sweep scoring: the metric transforms that let the artifact's L2 search rank by
+# cosine or inner product, recall@k / hit rate / MRR on a hand-built artifact, the Pareto
+# front and the question file format. Runs in-process without loading an embedding model;
+# needs the sweep's dependencies (sentence-transformers, chromadb):
+#   python tests/test_retrieval_sweep.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+try:
+    from benchmarks.retrieval_sweep import (
+        BASELINE, PARETO_OBJECTIVES, index_vectors, query_vectors, evaluate, pareto_front, load_questions,
+    )
+    from backend.kb_artifact import KBArtifact, write_artifact
+except ImportError as e:
+    if __name__ == "__main__":
+        print(f"SKIPPED: sweep dependencies not installed: {e}")
+        sys.exit(0)
+    raise unittest.SkipTest(f"sweep dependencies not installed: {e}")
+
+def l2_ranking(vectors: np.ndarray, query: np.ndarray) -> list:
+    return list(np.argsort(((vectors - query) ** 2).sum(axis=1), kind="stable"))
+
+def test_metric_transforms_rank_like_the_metric():
+    rng = np.random.default_rng(7)
+    # Varied norms, so L2, cosine and inner product disagree
+    vectors = (rng.normal(size=(40, 8)) * rng.uniform(0.2, 5.0, size=(40, 1))).astype(np.float32)
+    queries = rng.normal(size=(10, 8)).astype(np.float32)
+    for metric, score in (
+        ("ip", lambda q: vectors @ q),
+        ("cosine", lambda q: (vectors @ q) / np.linalg.norm(vectors, axis=1)),
+        ("l2", lambda q: -((vectors - q) ** 2).sum(axis=1)),
+    ):
+        indexed = index_vectors(vectors, metric)
+        for query, transformed in zip(queries, query_vectors(queries, metric)):
+            expected = list(np.argsort(-score(query), kind="stable"))
+            assert l2_ranking(indexed, transformed)[:5] == expected[:5], metric
+    assert index_vectors(vectors, "ip").shape == (40, 9)
+    assert np.allclose(np.linalg.norm(index_vectors(vectors, "ip"), axis=1), np.linalg.norm(vectors, axis=1).max())
+
+def test_recall_hit_rate_and_mrr():
+    # One chunk per page, on the axes of the plane
+    vectors = np.array([[1, 0], [0, 1], [-1, 0], [0, -1]], dtype=np.float32)
+    questions = [
+        {"question": "q1", "pages": {1}},     # nearest chunk is page 1
+        {"question": "q2", "pages": {3, 4}},  # ranking is pages 1, 2, 4, 3
+    ]
+    query_embeddings = np.array([[1, 0.1], [0.9, 0.1]], dtype=np.float32)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sweep.kbpack")
+        write_artifact(path, "sweep", BASELINE["model"], [f"chunk-{i}" for i in range(4)],
+                       [f"text of page {page}" for page in range(1, 5)],
+                       [{"source": "book.pdf", "page": page} for page in range(1, 5)], vectors)
+        candidate = {"model": BASELINE["model"], "chunk_size": BASELINE["chunk_size"],
+                     "overlap": BASELINE["overlap"], "metric": "l2", "chunks": 4,
+                     "index_bytes": os.path.getsize(path), "path": path}
+        rows = {row["k"]: row for row in evaluate(candidate, questions, query_embeddings, [0.001, 0.001], [1, 3, 5])}
+
+    assert (rows[1]["recall_at_k"], rows[1]["hit_rate"], rows[1]["mrr"]) == (0.5, 0.5, 0.5), rows[1]
+    # k=3 retrieves page 4 at rank 3 for q2: half its pages
+    assert (rows[3]["recall_at_k"], rows[3]["hit_rate"], rows[3]["mrr"]) == (0.75, 1.0, 0.6667), rows[3]
+    assert (rows[5]["recall_at_k"], rows[5]["hit_rate"], rows[5]["mrr"]) == (1.0, 1.0, 0.6667), rows[5]
+    assert rows[1]["prompt_tokens_mean"] < rows[3]["prompt_tokens_mean"] < rows[5]["prompt_tokens_mean"]
+    assert rows[5]["baseline"] and not rows[1]["baseline"] and not rows[3]["baseline"]
+    assert rows[3]["id"].endswith("/cs800/ov100/k3/l2"), rows[3]["id"]
+    assert rows[1]["query_p95_ms"] >= 1.0
+
+def make_row(name: str, **values) -> dict:
+    row = {"id": name, "recall_at_k": 0.8, "mrr": 0.6, "query_p95_ms": 10.0, "index_bytes": 1000,
+           "prompt_tokens_mean": 500.0}
+    row.update(values)
+    return row
+
+def test_pareto_front():
+    rows = [
+        make_row("base"),
+        make_row("tie"),                                              # equal to base on every objective
+        make_row("worse", query_p95_ms=12.0),                         # dominated by base
+        make_row("recall", recall_at_k=0.9, index_bytes=4000),        # trades size for recall
+        make_row("cheap", recall_at_k=0.7, prompt_tokens_mean=200.0),  # trades recall for tokens
+        make_row("bad", recall_at_k=0.7, mrr=0.5, prompt_tokens_mean=600.0),
+    ]
+    front = [row["id"] for row in pareto_front(rows)]
+    assert front == ["recall", "base", "tie", "cheap"], front
+    assert {f for f, _ in PARETO_OBJECTIVES} <= set(rows[0])
+    assert pareto_front([]) == []
+
+def test_load_questions():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "questions.jsonl")
+        with open(path, "w") as f:
+            f.write('{"question": "What causes hyperkalemia in CKD?", "pages": [412, "413"]}\n\n')
+            f.write('{"question": "Dialysis timing?", "pages": [9]}\n')
+        questions = load_questions(path)
+        assert questions == [{"question": "What causes hyperkalemia in CKD?", "pages": {412, 413}},
+                             {"question": "Dialysis timing?", "pages": {9}}], questions
+        with open(path, "a") as f:
+            f.write('{"question": "No pages", "pages": []}\n')
+        try:
+            load_questions(path)
+            assert False, "expected ValueError"
+        except ValueError as e:
+            assert ":4:" in str(e), e
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
@@ -0,0 +1,82 @@
+import os
+import sys
+import unittest
+
+# The agent endpoints look a session up once and hand it to the worker, so a session
+# evicted by the memory budget mid-request doesn't turn into a 500, and a missing one
+# is a 404. Runs in-process with the agent flows patched; needs the backend's retrieval
+# dependencies (chromadb):
+#   python tests/test_session_lookup.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+try:
+    from backend import main
+except ImportError as e:
+    if __name__ == "__main__":
+        print(f"SKIPPED: backend dependencies not installed: {e}")
+        sys.exit(0)
+    raise unittest.SkipTest(f"backend dependencies not installed: {e}")
+from starlette.testclient import TestClient
+from backend.grok_wrapper import LLM_OK
+
+RESULT = {"answer_text": "Keep salt under 2 g a day.", "sources": [], "source_type": "KB", "llm_outcome": LLM_OK}
+
+def stream(session_id, question, patient_id, history=None, kb=None, **kwargs):
+    yield {"type": "done", **RESULT}
+
+class EvictMidRequest:
+    """
+    Patches the agent flows, and evicts the session right after the endpoint has
+    looked it up (where the rate limit is checked), before the worker runs.
+    """
+
+    def __enter__(self):
+        self.saved = (main.run_clinical_flow, main.stream_clinical_flow, main.run_receptionist_flow,
+                      main.cache_clinical_answer, main.check_rate_limit)
+        main.run_clinical_flow = lambda *args, **kwargs: dict(RESULT)
+        main.stream_clinical_flow = stream
+        main.run_receptionist_flow = lambda *args, **kwargs: {"answer_text": "Hello.", "source_type": "System"}
+        main.cache_clinical_answer = lambda *args, **kwargs: None
+        main.check_rate_limit = lambda session_id, *args: main.sessions.pop(session_id)
+        return TestClient(main.app, raise_server_exceptions=False)
+
+    def __exit__(self, *exc):
+        (main.run_clinical_flow, main.stream_clinical_flow, main.run_receptionist_flow,
+         main.cache_clinical_answer, main.check_rate_limit) = self.saved
+
+def post(client, path, **body):
+    session_id = client.post("/session/start").json()["session_id"]
+    return session_id, client.post(path, json=dict(body, session_id=session_id))
+
+def test_session_evicted_mid_request_is_not_an_error():
+    with EvictMidRequest() as client:
+        for path, body in (("/agent/clinical", {"patient_id": "p1", "question": "How much salt?"}),
+                           ("/agent/clinical/stream", {"patient_id": "p1", "question": "How much salt?"}),
+                           ("/agent/receptionist", {"message": "Hi, I'm Ana Lopez"})):
+            session_id, response = post(client, path, **body)
+            assert response.status_code == 200, (path, response.status_code, response.text)
+            assert session_id not in main.sessions
+
+def test_unknown_session_is_404():
+    client = TestClient(main.app, raise_server_exceptions=False)
+    for path, body in (("/agent/clinical", {"patient_id": "p1", "question": "How much salt?"}),
+                       ("/agent/clinical/stream", {"patient_id": "p1", "question": "How much salt?"}),
+                       ("/agent/receptionist", {"message": "Hi"})):
+        response = client.post(path, json=dict(body, session_id="no-such-session"))
+        assert response.status_code == 404, (path, response.status_code, response.text)
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
@@ -0,0 +1,140 @@
+import os
+import sys
+import unittest
+from concurrent.futures import wait
+
+# Speculative answers: which follow-up questions are served from them, and the LLM
+# budget and backlog limits on generating them. Embeddings are replaced with a fake so
+# no model is loaded, but the backend's retrieval dependencies (chromadb) must import:
+#   python tests/test_speculation.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+try:
+    from backend import speculation
+except ImportError as e:
+    if __name__ == "__main__":
+        print(f"SKIPPED: backend dependencies not installed: {e}")
+        sys.exit(0)
+    raise unittest.SkipTest(f"backend dependencies not installed: {e}")
+from backend.speculation import Speculator, TRIAGE_QUESTION
+from backend.grok_wrapper import LLM_OK, LLM_ERROR
+from backend.records import PatientRecord
+
+PATIENT = PatientRecord("p1", "Ana Lopez", "2026-03-02", "Chronic Kidney Disease",
+                        ["Furosemide 40mg"], warning_signs=["Swelling in the legs"])
+
+def same_embedding(texts):
+    # Every question embeds identically, so only the wording checks can turn a lookup away
+    return [[1.0, 0.0, 0.0] for _ in texts]
+
+def answer(question, patient):
+    return {"answer_text": f"Answer to: {question}", "source_type": "KB", "llm_outcome": LLM_OK}
+
+def run_speculator(answer_fn=answer, embed=same_embedding, **kwargs):
+    """
+    A speculator that has finished answering PATIENT's likely questions in session s1.
+    """
+    saved = (speculation.embed_texts, speculation.embed_query)
+    speculation.embed_texts = embed
+    speculation.embed_query = lambda text: embed([text])[0]
+    speculator = Speculator(workers=1, **kwargs)
+    speculator.start("s1", PATIENT, answer_fn)
+    spec = speculator._sessions.get("s1")
+    if spec is not None:
+        wait(spec.futures, timeout=10)
+    return speculator, saved
+
+def restore(saved):
+    speculation.embed_texts, speculation.embed_query = saved
+
+def lookup(speculator, question, session_id="s1", patient_id="p1"):
+    result = speculator.match(session_id, patient_id, question)
+    return result["answer_text"] if result else None
+
+def test_exact_and_paraphrased_questions_hit():
+    speculator, saved = run_speculator()
+    try:
+        assert lookup(speculator, TRIAGE_QUESTION.upper()) == f"Answer to: {TRIAGE_QUESTION}"
+        assert lookup(speculator, "What do I need to know about taking furosemide 40mg?") == \
+            "Answer to: What should I know about taking Furosemide 40mg?"
+    finally:
+        restore(saved)
+
+def test_similar_but_different_questions_miss():
+    speculator, saved = run_speculator()
+    try:
+        for question in ("Should I stop taking furosemide 40mg?",
+                         "What should I know about taking ibuprofen?",
+                         "What should I know about taking furosemide 40mg with swelling in the legs?",
+                         "Can I travel next month?"):
+            assert lookup(speculator, question) is None, question
+    finally:
+        restore(saved)
+
+def test_other_session_or_patient_misses():
+    speculator, saved = run_speculator()
+    try:
+        assert lookup(speculator, TRIAGE_QUESTION, session_id="s2") is None
+        assert lookup(speculator, TRIAGE_QUESTION, patient_id="p2") is None
+        speculator.cancel("s1")
+        assert lookup(speculator, TRIAGE_QUESTION) is None
+    finally:
+        restore(saved)
+
+def test_failed_llm_answers_not_kept():
+    fallback = lambda question, patient: dict(answer(question, patient), llm_outcome=LLM_ERROR)
+    speculator, saved = run_speculator(answer_fn=fallback)
+    try:
+        assert not speculator._sessions["s1"].answers
+        assert lookup(speculator, TRIAGE_QUESTION) is None
+    finally:
+        restore(saved)
+
+def test_llm_budget_limits_answers():
+    calls = []
+    counting = lambda question, patient: calls.append(question) or answer(question, patient)
+    speculator, saved = run_speculator(answer_fn=counting, llm_per_minute=0.001)
+    try:
+        # PATIENT has three likely questions, all within the budget's burst
+        assert len(calls) == 3, calls
+        speculator.start("s2", PATIENT, counting)
+        speculator.start("s3", PATIENT, counting)
+        wait(speculator._sessions["s2"].futures + speculator._sessions["s3"].futures, timeout=10)
+        # The budget is shared across sessions, so most of the new work is skipped
+        assert len(calls) == speculation.SPECULATION_MAX_QUESTIONS, calls
+    finally:
+        restore(saved)
+
+def test_backlog_limit_skips_session():
+    speculator, saved = run_speculator(max_pending=2)
+    try:
+        assert "s1" not in speculator._sessions
+        assert lookup(speculator, TRIAGE_QUESTION) is None
+    finally:
+        restore(saved)
+
+def test_lookup_without_sessions_skips_embedding():
+    def fail(*args):
+        raise AssertionError("embedded a question with no speculative answers held")
+    speculator, saved = run_speculator(max_pending=0)
+    speculation.embed_query = fail
+    try:
+        assert lookup(speculator, "What should I do about swelling?") is None
+    finally:
+        restore(saved)
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
@@ -0,0 +1,128 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+import contextvars
+
+# Background task queues: in-process retries, drops and context propagation, and the
+# durable queue's persistence across restarts, lease recovery and failure handling.
+# Runs in-process (no API server needed):
+#   python tests/test_tasks.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.tasks import TaskQueue, DurableTaskQueue, register_durable_handler
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+def wait_for(condition, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+def flaky(failures: int, calls: list):
+    def task():
+        calls.append(time.monotonic())
+        if len(calls) <= failures:
+            raise RuntimeError(f"attempt {len(calls)} failed")
+    return task
+
+def test_failed_task_retried_with_backoff():
+    calls = []
+    tasks = TaskQueue("test-retry", workers=1, max_attempts=3, retry_delay=0.05)
+    assert tasks.submit(flaky(2, calls))
+    assert tasks.drain(5)
+    assert len(calls) == 3, calls
+    # The second retry waits twice as long as the first
+    assert calls[1] - calls[0] >= 0.05 and calls[2] - calls[1] >= 0.1, calls
+
+def test_task_given_up_after_max_attempts():
+    calls = []
+    tasks = TaskQueue("test-give-up", workers=1, max_attempts=2, retry_delay=0.01)
+    tasks.submit(flaky(10, calls))
+    assert tasks.drain(5)
+    assert len(calls) == 2, calls
+    assert tasks.depth == 0
+
+def test_full_queue_drops_tasks():
+    release = threading.Event()
+    tasks = TaskQueue("test-full", workers=1, max_size=1)
+    assert tasks.submit(release.wait)
+    assert wait_for(lambda: tasks._queue.qsize() == 0)
+    # The worker is busy and the queue holds one task, so the next is dropped
+    assert tasks.submit(lambda: None)
+    assert not tasks.submit(lambda: None)
+    release.set()
+    assert tasks.drain(5)
+
+def test_task_runs_in_submitter_context():
+    seen = []
+    tasks = TaskQueue("test-context", workers=1)
+    token = request_id.set("req-1")
+    try:
+        tasks.submit(lambda: seen.append(request_id.get()))
+    finally:
+        request_id.reset(token)
+    assert tasks.drain(5)
+    assert seen == ["req-1"], seen
+
+def durable_queue(tmp: str, **kwargs) -> DurableTaskQueue:
+    return DurableTaskQueue(os.path.join(tmp, "tasks.db"), **kwargs)
+
+def test_durable_task_survives_restart():
+    received = []
+    register_durable_handler("test-restart", received.append)
+    with tempfile.TemporaryDirectory() as tmp:
+        # No workers: the process "dies" with the task committed but not run
+        durable_queue(tmp, workers=0).enqueue("test-restart", {"patient_id": "p1"})
+        restarted = durable_queue(tmp)
+        restarted.start()
+        assert wait_for(lambda: received)
+        assert received == [{"patient_id": "p1"}], received
+        assert wait_for(lambda: restarted.counts() == {})
+
+def test_durable_lease_recovered_after_worker_dies():
+    received = []
+    register_durable_handler("test-lease", received.append)
+    with tempfile.TemporaryDirectory() as tmp:
+        crashed = durable_queue(tmp, workers=0, lease_seconds=0.2)
+        task_id = crashed.enqueue("test-lease", {"event": "urgent"})
+        # Claimed by a worker that never finishes it
+        assert crashed._claim()[0] == task_id
+        other = durable_queue(tmp, lease_seconds=0.2)
+        assert other._claim() is None, "a leased task was claimed again before its lease lapsed"
+        other.start()
+        assert wait_for(lambda: received)
+        assert received == [{"event": "urgent"}]
+        assert wait_for(lambda: other.counts() == {})
+
+def test_durable_task_kept_as_failed():
+    def always_fails(payload):
+        raise RuntimeError("pager unavailable")
+    register_durable_handler("test-failing", always_fails)
+    with tempfile.TemporaryDirectory() as tmp:
+        tasks = durable_queue(tmp, max_attempts=2, retry_delay=0.01)
+        task_id = tasks.enqueue("test-failing", {})
+        assert wait_for(lambda: tasks.counts().get("failed") == 1)
+        with tasks._lock:
+            row = tasks._conn.execute("SELECT attempts, last_error FROM durable_tasks WHERE id = ?", (task_id,)).fetchone()
+        assert row == (2, "pager unavailable"), row
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
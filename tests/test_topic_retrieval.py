@@ -0,0 +1,138 @@
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+# Topic-scoped retrieval: diagnoses map to topics, searches are restricted to chunks
+# tagged with them, and a scope with fewer than k hits is filled from a global search
+# of the same KB (Chroma and artifact-backed KBs alike). Runs in-process (no API server
+# needed):
+#   python tests/test_topic_retrieval.py
+# The Chroma-path and clinical-path tests import the backend's retrieval module and need
+# chromadb; they are skipped without it.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend import metrics
+from backend.topics import classify_text, diagnosis_topics, topic_filter
+from backend.kb_artifact import KBArtifact, write_artifact
+
+# Chunk vectors on a line, so nearest neighbours of [x, 0] are predictable; c-1 alone is tagged ckd
+VECTORS = [[float(i), 0.0] for i in range(6)]
+METADATAS = [dict({"source": "GenAI_Intern_Assignment.pdf", "page": i + 1, "chunk_id": f"c-{i}"},
+                  **({"topic_ckd": True} if i == 1 else {}), **({"topic_dialysis": True} if i >= 3 else {}))
+             for i in range(6)]
+
+def fallbacks() -> float:
+    with metrics._lock:
+        return metrics._counters.get(("assistant_retrieval_fallbacks_total", ()), 0)
+
+def test_diagnosis_maps_to_topics():
+    assert diagnosis_topics("Chronic Kidney Disease stage 4") == ["ckd"]
+    assert set(diagnosis_topics("ESRD on hemodialysis with hypertension")) == {"dialysis", "hypertension"}
+    assert diagnosis_topics("Broken wrist") == [] and diagnosis_topics(None) == []
+    # Chunks need two keyword hits to be tagged
+    assert classify_text("One mention of dialysis.") == []
+    assert classify_text("Dialysis schedules; missed hemodialysis sessions.") == ["dialysis"]
+
+def test_topic_filter_shapes():
+    assert topic_filter([]) is None
+    assert topic_filter(["ckd"]) == {"topic_ckd": True}
+    assert topic_filter(["ckd", "aki"]) == {"$or": [{"topic_ckd": True}, {"topic_aki": True}]}
+
+def ids(chunks) -> list:
+    return [c['chunk_id'] for c in chunks]
+
+def test_artifact_scope_falls_back_to_global():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "nephrology.kbpack")
+        write_artifact(path, "nephrology", "test-model", [m["chunk_id"] for m in METADATAS],
+                       [f"Chunk {i}" for i in range(6)], METADATAS, np.asarray(VECTORS, dtype=np.float32))
+        artifact = KBArtifact(path)
+        before = fallbacks()
+        # Enough tagged chunks: no fallback
+        assert ids(artifact.search([[5.0, 0.0]], 3, ["dialysis"])[0]) == ["c-5", "c-4", "c-3"]
+        assert fallbacks() == before
+        # One tagged chunk ranks first, the rest of k comes from the global neighbours
+        assert ids(artifact.search([[5.0, 0.0]], 3, ["ckd"])[0]) == ["c-1", "c-5", "c-4"]
+        # A topic no chunk carries is a global search
+        assert ids(artifact.search([[0.0, 0.0]], 2, ["transplant"])[0]) == ["c-0", "c-1"]
+        assert fallbacks() == before + 2
+
+class FakeCollection:
+    """
+    In-memory stand-in for a Chroma collection: squared L2 search with where filters on topic_* flags.
+    """
+
+    def query(self, query_embeddings, n_results, where=None):
+        clauses = where.get("$or", [where]) if where else None
+        rows = [i for i, meta in enumerate(METADATAS)
+                if clauses is None or any(all(meta.get(k) == v for k, v in c.items()) for c in clauses)]
+        results = {"documents": [], "metadatas": [], "distances": []}
+        for q in query_embeddings:
+            ranked = sorted(rows, key=lambda i: (np.sum((np.asarray(VECTORS[i]) - q) ** 2), i))[:n_results]
+            results["documents"].append([f"Chunk {i}" for i in ranked])
+            results["metadatas"].append([METADATAS[i] for i in ranked])
+            results["distances"].append([float(np.sum((np.asarray(VECTORS[i]) - q) ** 2)) for i in ranked])
+        return results
+
+def chroma_rag():
+    try:
+        from backend import rag
+    except ImportError as e:
+        raise unittest.SkipTest(f"backend dependencies not installed: {e}")
+    return rag
+
+def test_chroma_scope_falls_back_to_global():
+    rag = chroma_rag()
+    saved = (rag.get_kb_artifact, rag.get_collection)
+    rag.get_kb_artifact = lambda kb=None: None
+    rag.get_collection = lambda kb=None: FakeCollection()
+    try:
+        before = fallbacks()
+        assert ids(rag.retrieve_by_embedding([5.0, 0.0], 3, ["dialysis"])) == ["c-5", "c-4", "c-3"]
+        assert fallbacks() == before
+        assert ids(rag.retrieve_by_embedding([5.0, 0.0], 3, ["ckd"])) == ["c-1", "c-5", "c-4"]
+        assert ids(rag.retrieve_by_embedding([5.0, 0.0], 2)) == ["c-5", "c-4"]
+        assert fallbacks() == before + 1
+    finally:
+        rag.get_kb_artifact, rag.get_collection = saved
+
+def test_clinical_path_scopes_by_diagnosis():
+    chroma_rag()
+    from backend import langgraph_agents
+    from backend.records import PatientRecord
+    calls = []
+    saved = (langgraph_agents.retrieve, langgraph_agents.get_context_bundle)
+    langgraph_agents.retrieve = lambda query, **kwargs: calls.append((query, kwargs.get("topics"))) or []
+    langgraph_agents.get_context_bundle = lambda patient_id: None
+    try:
+        patient = PatientRecord("p1", "Ana Lopez", primary_diagnosis="Chronic Kidney Disease")
+        langgraph_agents.retrieve_clinical_context("How much salt?", patient)
+        untagged = PatientRecord("p2", "Ben Okafor", primary_diagnosis="Broken wrist")
+        langgraph_agents.retrieve_clinical_context("How much salt?", untagged)
+    finally:
+        langgraph_agents.retrieve, langgraph_agents.get_context_bundle = saved
+    # The diagnosis scopes the search instead of being appended to the query text;
+    # without topics it is still appended
+    assert calls == [("How much salt?", ["ckd"]),
+                     ("How much salt? (Patient Diagnosis: Broken wrist)", None)], calls
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = skipped = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except unittest.SkipTest as e:
+            skipped += 1
+            print(f"SKIPPED: {test.__name__}: {e}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed - skipped}/{len(tests)} passed, {skipped} skipped")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)
@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import asyncio
+
+# Persistent web search cache: TTL expiry, LRU bound and query normalization.
+# Runs in-process against an in-memory SQLite cache (no API server needed):
+#   python tests/test_web_search_cache.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend import web_search
+from backend.web_search import WebSearchCache, WebSearchProvider
+
+RESULTS = [{"title": "Low-salt diet in CKD", "snippet": "Under 2 g sodium a day.", "url": "https://example.com/salt"}]
+
+class CountingProvider(WebSearchProvider):
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def search(self, query, max_results=5):
+        self.calls += 1
+        return RESULTS[:max_results]
+
+def test_entries_expire_after_ttl():
+    cache = WebSearchCache(path=":memory:", ttl=0.2)
+    cache.put("salt in kidney disease", RESULTS)
+    assert cache.get("salt in kidney disease") == RESULTS
+    time.sleep(0.25)
+    assert cache.get("salt in kidney disease") is None
+    # The expired row is deleted on read
+    assert cache._conn.execute("SELECT COUNT(*) FROM web_search_cache").fetchone()[0] == 0
+
+def test_normalized_queries_share_an_entry():
+    cache = WebSearchCache(path=":memory:")
+    cache.put("Latest dialysis guidelines?", RESULTS)
+    assert cache.get("latest  dialysis GUIDELINES") == RESULTS
+    # A different result count is a different entry
+    assert cache.get("latest dialysis guidelines", max_results=1) is None
+
+def test_least_recently_used_evicted_beyond_max_entries():
+    cache = WebSearchCache(path=":memory:", max_entries=2)
+    cache.put("first", RESULTS)
+    time.sleep(0.01)
+    cache.put("second", RESULTS)
+    time.sleep(0.01)
+    cache.get("first")
+    time.sleep(0.01)
+    cache.put("third", RESULTS)
+    assert cache.get("second") is None
+    assert cache.get("first") == RESULTS and cache.get("third") == RESULTS
+
+def test_search_hits_cache_until_expiry():
+    provider = CountingProvider()
+    saved = (web_search._provider, web_search._cache)
+    web_search.set_search_provider(provider)
+    web_search._cache = WebSearchCache(path=":memory:", ttl=0.2)
+    try:
+        web_search.search_web("fluid limit on dialysis")
+        asyncio.run(web_search.asearch_web("Fluid limit on dialysis?"))
+        assert provider.calls == 1, provider.calls
+        time.sleep(0.25)
+        web_search.search_web("fluid limit on dialysis")
+        assert provider.calls == 2, provider.calls
+    finally:
+        web_search._provider, web_search._cache = saved
+
+def run_test():
+    tests = [v for k, v in sorted(globals().items()) if k.startswith("test_") and callable(v)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"SUCCESS: {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAILED: {test.__name__}: {e}")
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    return failed
+
+if __name__ == "__main__":
+    sys.exit(1 if run_test() else 0)